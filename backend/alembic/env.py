@@ -1,6 +1,6 @@
 import asyncio
 from logging.config import fileConfig
-from sqlalchemy import pool
+from sqlalchemy import inspect, pool
 from sqlalchemy.engine import Connection
 from sqlalchemy.ext.asyncio import async_engine_from_config
 from alembic import context
@@ -11,8 +11,8 @@ import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # Import your models
-from database import Base
-from models.user import User
+from database import Base, DATABASE_URL, async_database_url
+from models.user import User, RevokedToken
 from models.nutrition import FoodItem, Meal, NutritionEntry
 from models.caffeine import CaffeineProduct, CaffeineEntry
 from models.profile import UserProfile
@@ -20,20 +20,25 @@ from models.profile import UserProfile
 # this is the Alembic Config object
 config = context.config
 
-# Interpret the config file for Python logging
-if config.config_file_name is not None:
+# Interpret the config file for Python logging (not when the app runs the migrations)
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
     fileConfig(config.config_file_name)
 
-# Set the SQLAlchemy URL from environment variable if available
-database_url = os.getenv("DATABASE_URL", "sqlite:///data/mybiotracker.db")
-if database_url.startswith("sqlite:///"):
-    # Convert to async SQLite URL
-    database_url = database_url.replace("sqlite:///", "sqlite+aiosqlite:///")
-
-config.set_main_option("sqlalchemy.url", database_url)
+# Migrate the database the app uses, unless a caller passes another one
+database_url = config.attributes.get("database_url") or async_database_url(DATABASE_URL)
+config.set_main_option("sqlalchemy.url", database_url.replace("%", "%%"))
 
 target_metadata = Base.metadata
 
+# Databases created by create_all() before migrations existed get stamped with this
+BASELINE_REVISION = "0001"
+
+def include_name(name, type_, parent_names) -> bool:
+    # The food search tables (FTS5, staging copies) are managed by services.food_search
+    if type_ == "table":
+        return name in target_metadata.tables
+    return True
+
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode."""
     url = config.get_main_option("sqlalchemy.url")
@@ -48,7 +53,22 @@ def run_migrations_offline() -> None:
         context.run_migrations()
 
 def do_run_migrations(connection: Connection) -> None:
-    context.configure(connection=connection, target_metadata=target_metadata)
+    tables = inspect(connection).get_table_names()
+    connection.commit()
+
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        include_name=include_name,
+        render_as_batch=connection.dialect.name == "sqlite",
+        # Index builds with CONCURRENTLY commit on their own; keep each migration in its own transaction
+        transaction_per_migration=True,
+    )
+
+    if "users" in tables and "alembic_version" not in tables:
+        print(f"Stamping existing schema at baseline revision {BASELINE_REVISION}")
+        context.get_context().stamp(context.script, BASELINE_REVISION)
+        connection.commit()
 
     with context.begin_transaction():
         context.run_migrations()
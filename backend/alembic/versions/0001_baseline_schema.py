@@ -0,0 +1,174 @@
+"""baseline schema
+
+The tables as create_all() made them before migrations were introduced.
+Databases created that way are stamped at this revision on startup
+instead of running it.
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-18 12:38:58.295109
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('caffeine_products',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=255), nullable=False),
+    sa.Column('category', sa.String(length=100), nullable=False),
+    sa.Column('caffeine_mg_per_serving', sa.Float(), nullable=False),
+    sa.Column('serving_size_ml', sa.Float(), nullable=True),
+    sa.Column('half_life_hours', sa.Float(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_caffeine_products_id'), 'caffeine_products', ['id'], unique=False)
+    op.create_table('food_items',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('barcode', sa.String(length=20), nullable=True),
+    sa.Column('name', sa.String(length=255), nullable=False),
+    sa.Column('brand', sa.String(length=255), nullable=True),
+    sa.Column('category', sa.String(length=100), nullable=True),
+    sa.Column('calories_per_100g', sa.Float(), nullable=False),
+    sa.Column('protein_per_100g', sa.Float(), nullable=True),
+    sa.Column('carbs_per_100g', sa.Float(), nullable=True),
+    sa.Column('fat_per_100g', sa.Float(), nullable=True),
+    sa.Column('fiber_per_100g', sa.Float(), nullable=True),
+    sa.Column('sugar_per_100g', sa.Float(), nullable=True),
+    sa.Column('sodium_per_100g', sa.Float(), nullable=True),
+    sa.Column('vitamin_a_per_100g', sa.Float(), nullable=True),
+    sa.Column('vitamin_c_per_100g', sa.Float(), nullable=True),
+    sa.Column('vitamin_d_per_100g', sa.Float(), nullable=True),
+    sa.Column('vitamin_e_per_100g', sa.Float(), nullable=True),
+    sa.Column('vitamin_k_per_100g', sa.Float(), nullable=True),
+    sa.Column('vitamin_b1_per_100g', sa.Float(), nullable=True),
+    sa.Column('vitamin_b2_per_100g', sa.Float(), nullable=True),
+    sa.Column('vitamin_b3_per_100g', sa.Float(), nullable=True),
+    sa.Column('vitamin_b6_per_100g', sa.Float(), nullable=True),
+    sa.Column('vitamin_b12_per_100g', sa.Float(), nullable=True),
+    sa.Column('folate_per_100g', sa.Float(), nullable=True),
+    sa.Column('calcium_per_100g', sa.Float(), nullable=True),
+    sa.Column('iron_per_100g', sa.Float(), nullable=True),
+    sa.Column('magnesium_per_100g', sa.Float(), nullable=True),
+    sa.Column('zinc_per_100g', sa.Float(), nullable=True),
+    sa.Column('potassium_per_100g', sa.Float(), nullable=True),
+    sa.Column('is_verified', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_food_items_barcode'), 'food_items', ['barcode'], unique=True)
+    op.create_index(op.f('ix_food_items_id'), 'food_items', ['id'], unique=False)
+    op.create_index(op.f('ix_food_items_name'), 'food_items', ['name'], unique=False)
+    op.create_table('users',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('email', sa.String(length=255), nullable=False),
+    sa.Column('hashed_password', sa.String(length=255), nullable=False),
+    sa.Column('is_active', sa.Boolean(), nullable=False),
+    sa.Column('is_admin', sa.Boolean(), nullable=False),
+    sa.Column('totp_secret', sa.String(length=32), nullable=True),
+    sa.Column('is_2fa_enabled', sa.Boolean(), nullable=False),
+    sa.Column('backup_codes', sa.Text(), nullable=True),
+    sa.Column('failed_login_attempts', sa.Integer(), nullable=False),
+    sa.Column('locked_until', sa.DateTime(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+    sa.Column('last_login', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_users_email'), 'users', ['email'], unique=True)
+    op.create_index(op.f('ix_users_id'), 'users', ['id'], unique=False)
+    op.create_table('caffeine_entries',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('consumed_at', sa.DateTime(), nullable=False),
+    sa.Column('amount_servings', sa.Float(), nullable=True),
+    sa.Column('notes', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.ForeignKeyConstraint(['product_id'], ['caffeine_products.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_caffeine_entries_id'), 'caffeine_entries', ['id'], unique=False)
+    op.create_table('meals',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=255), nullable=False),
+    sa.Column('meal_type', sa.String(length=50), nullable=False),
+    sa.Column('eaten_at', sa.DateTime(), nullable=False),
+    sa.Column('notes', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_meals_id'), 'meals', ['id'], unique=False)
+    op.create_table('user_profiles',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('age', sa.Integer(), nullable=True),
+    sa.Column('gender', sa.Enum('MALE', 'FEMALE', 'OTHER', name='gender'), nullable=True),
+    sa.Column('height_cm', sa.Float(), nullable=True),
+    sa.Column('weight_kg', sa.Float(), nullable=True),
+    sa.Column('body_fat_percentage', sa.Float(), nullable=True),
+    sa.Column('activity_level', sa.Enum('SEDENTARY', 'LIGHTLY_ACTIVE', 'MODERATELY_ACTIVE', 'VERY_ACTIVE', 'EXTREMELY_ACTIVE', name='activitylevel'), nullable=True),
+    sa.Column('primary_goal', sa.Enum('MAINTAIN', 'LOSE_WEIGHT', 'GAIN_WEIGHT', 'BUILD_MUSCLE', 'IMPROVE_HEALTH', name='goal'), nullable=True),
+    sa.Column('bmr_calories', sa.Float(), nullable=True),
+    sa.Column('tdee_calories', sa.Float(), nullable=True),
+    sa.Column('target_calories', sa.Float(), nullable=True),
+    sa.Column('target_protein_g', sa.Float(), nullable=True),
+    sa.Column('target_carbs_g', sa.Float(), nullable=True),
+    sa.Column('target_fat_g', sa.Float(), nullable=True),
+    sa.Column('metric_system', sa.String(length=20), nullable=True),
+    sa.Column('timezone', sa.String(length=50), nullable=True),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id')
+    )
+    op.create_index(op.f('ix_user_profiles_id'), 'user_profiles', ['id'], unique=False)
+    op.create_table('nutrition_entries',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('meal_id', sa.Integer(), nullable=False),
+    sa.Column('food_item_id', sa.Integer(), nullable=False),
+    sa.Column('amount_grams', sa.Float(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.ForeignKeyConstraint(['food_item_id'], ['food_items.id'], ),
+    sa.ForeignKeyConstraint(['meal_id'], ['meals.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_nutrition_entries_id'), 'nutrition_entries', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_nutrition_entries_id'), table_name='nutrition_entries')
+    op.drop_table('nutrition_entries')
+    op.drop_index(op.f('ix_user_profiles_id'), table_name='user_profiles')
+    op.drop_table('user_profiles')
+    op.drop_index(op.f('ix_meals_id'), table_name='meals')
+    op.drop_table('meals')
+    op.drop_index(op.f('ix_caffeine_entries_id'), table_name='caffeine_entries')
+    op.drop_table('caffeine_entries')
+    op.drop_index(op.f('ix_users_id'), table_name='users')
+    op.drop_index(op.f('ix_users_email'), table_name='users')
+    op.drop_table('users')
+    op.drop_index(op.f('ix_food_items_name'), table_name='food_items')
+    op.drop_index(op.f('ix_food_items_id'), table_name='food_items')
+    op.drop_index(op.f('ix_food_items_barcode'), table_name='food_items')
+    op.drop_table('food_items')
+    op.drop_index(op.f('ix_caffeine_products_id'), table_name='caffeine_products')
+    op.drop_table('caffeine_products')
@@ -0,0 +1,65 @@
+"""per-user time range indexes
+
+Composite indexes for the hot per-user queries: caffeine entries and meals
+by user and time, nutrition entries by meal and by user joined to meals.
+
+On PostgreSQL they are built with CREATE INDEX CONCURRENTLY, so the tables
+stay writable while the indexes build. A build that was interrupted leaves
+an INVALID index behind; it is dropped and built again on the next run.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 12:45:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ("ix_caffeine_entries_user_consumed", "caffeine_entries", ["user_id", "consumed_at"]),
+    ("ix_meals_user_eaten", "meals", ["user_id", "eaten_at"]),
+    ("ix_nutrition_entries_meal_id", "nutrition_entries", ["meal_id"]),
+    ("ix_nutrition_entries_user_meal", "nutrition_entries", ["user_id", "meal_id"]),
+]
+
+
+def _drop_invalid_index(name: str) -> None:
+    if op.get_context().as_sql:
+        return
+    invalid = op.get_bind().execute(sa.text(
+        "SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid "
+        "WHERE pg_class.relname = :name AND NOT pg_index.indisvalid"
+    ), {"name": name}).scalar()
+    if invalid:
+        op.drop_index(name, postgresql_concurrently=True, if_exists=True)
+
+
+def upgrade() -> None:
+    if op.get_context().dialect.name == "postgresql":
+        # CONCURRENTLY cannot run inside a transaction block
+        with op.get_context().autocommit_block():
+            for name, table, columns in INDEXES:
+                _drop_invalid_index(name)
+                op.create_index(name, table, columns, postgresql_concurrently=True, if_not_exists=True)
+    else:
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, if_not_exists=True)
+
+
+def downgrade() -> None:
+    if op.get_context().dialect.name == "postgresql":
+        with op.get_context().autocommit_block():
+            for name, table, _ in reversed(INDEXES):
+                op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+    else:
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True)
@@ -0,0 +1,81 @@
+"""local_date on meals and caffeine entries
+
+The user's calendar day of eaten_at / consumed_at in the timezone of their
+profile, set by the API on write, so reports group by a plain column
+instead of date(timestamp). Existing rows are backfilled in batches.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 14:10:00.000000
+
+"""
+from datetime import timezone
+from typing import Sequence, Union
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = [("meals", "eaten_at"), ("caffeine_entries", "consumed_at")]
+BATCH_SIZE = 5000
+
+
+def _zone(name):
+    try:
+        return ZoneInfo(name) if name else timezone.utc
+    except (ZoneInfoNotFoundError, ValueError):
+        return timezone.utc
+
+
+def _backfill(table_name: str, column_name: str, zones: dict) -> None:
+    bind = op.get_bind()
+    table = sa.table(
+        table_name, sa.column("id", sa.Integer), sa.column("user_id", sa.Integer),
+        sa.column(column_name, sa.DateTime), sa.column("local_date", sa.Date),
+    )
+    moment = table.c[column_name]
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(table.c.id, table.c.user_id, moment)
+            .where(table.c.id > last_id).order_by(table.c.id).limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        bind.execute(
+            table.update().where(table.c.id == sa.bindparam("row_id")).values(local_date=sa.bindparam("day")),
+            [
+                {"row_id": row.id, "day": row[2].replace(tzinfo=timezone.utc)
+                 .astimezone(zones.get(row.user_id, timezone.utc)).date()}
+                for row in rows
+            ],
+        )
+        last_id = rows[-1].id
+
+
+def upgrade() -> None:
+    for table_name, _ in TABLES:
+        op.add_column(table_name, sa.Column('local_date', sa.Date(), nullable=True))
+
+    if op.get_context().as_sql:
+        return
+    profiles = sa.table("user_profiles", sa.column("user_id", sa.Integer), sa.column("timezone", sa.String))
+    zones = {
+        row.user_id: _zone(row.timezone)
+        for row in op.get_bind().execute(sa.select(profiles.c.user_id, profiles.c.timezone))
+    }
+    for table_name, column_name in TABLES:
+        _backfill(table_name, column_name, zones)
+
+
+def downgrade() -> None:
+    for table_name, _ in reversed(TABLES):
+        with op.batch_alter_table(table_name) as batch_op:
+            batch_op.drop_column('local_date')
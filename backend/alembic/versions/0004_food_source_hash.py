@@ -0,0 +1,31 @@
+"""source_hash on food items
+
+Fingerprint of the imported OpenFoodFacts data of a product, compared by
+delta refreshes to skip products that have not changed. Existing rows get
+NULL and are rewritten once by the next refresh.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 16:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('food_items', sa.Column('source_hash', sa.String(length=32), nullable=True))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table('food_items') as batch_op:
+        batch_op.drop_column('source_hash')
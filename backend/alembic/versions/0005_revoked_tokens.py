@@ -0,0 +1,50 @@
+"""revoked_tokens table
+
+Revoked access/refresh token ids and token families, checked on every
+authenticated request (services.token_revocation). revoked_at is indexed
+for the incremental sync of the other workers.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 16:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    ("ix_revoked_tokens_expires_at", ["expires_at"]),
+    ("ix_revoked_tokens_revoked_at", ["revoked_at"]),
+    ("ix_revoked_tokens_user_id", ["user_id"]),
+]
+
+
+def upgrade() -> None:
+    op.create_table('revoked_tokens',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('token_id', sa.String(length=64), nullable=False),
+    sa.Column('kind', sa.String(length=10), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('reason', sa.String(length=20), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.Column('revoked_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('token_id')
+    )
+    for name, columns in INDEXES:
+        op.create_index(name, 'revoked_tokens', columns, unique=False)
+
+
+def downgrade() -> None:
+    for name, _ in reversed(INDEXES):
+        op.drop_index(name, table_name='revoked_tokens')
+    op.drop_table('revoked_tokens')
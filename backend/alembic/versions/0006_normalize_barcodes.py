@@ -0,0 +1,96 @@
+"""normalize stored barcodes
+
+Rows written before barcodes were normalized keep the form their source
+used (12-digit UPC-A, 8-digit EAN-8, 14-digit GTIN-14). They are rewritten
+to the canonical form lookups and refreshes use. Where the canonical code
+is already taken, the legacy row is a duplicate of that product: its
+nutrition entries are moved to the canonical row and it is deleted.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 17:10:00.000000
+
+"""
+import re
+from typing import Optional, Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 5000
+GTIN_LENGTHS = (8, 12, 13, 14)
+_WHITESPACE = re.compile(r"\s+")
+
+food_items = sa.table("food_items", sa.column("id", sa.Integer), sa.column("barcode", sa.String))
+nutrition_entries = sa.table("nutrition_entries", sa.column("food_item_id", sa.Integer))
+
+
+def _normalize(code: Optional[str]) -> Optional[str]:
+    # services.barcodes.normalize_barcode as of this revision
+    if code is None:
+        return None
+    code = _WHITESPACE.sub("", code)
+    if not code:
+        return None
+    if code.isascii() and code.isdigit() and len(code) in GTIN_LENGTHS:
+        if len(code) == 14:
+            return code[1:] if code[0] == "0" else code
+        return code.zfill(13)
+    return code[:20]
+
+
+def upgrade() -> None:
+    if op.get_context().as_sql:
+        return
+    bind = op.get_bind()
+    has_fts = sa.inspect(bind).has_table("food_items_fts")
+    rewritten = merged = 0
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(food_items.c.id, food_items.c.barcode)
+            .where(food_items.c.id > last_id, food_items.c.barcode.is_not(None))
+            .order_by(food_items.c.id).limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+
+        changes = [(row.id, _normalize(row.barcode)) for row in rows if _normalize(row.barcode) != row.barcode]
+        if not changes:
+            continue
+        owners = dict(bind.execute(
+            sa.select(food_items.c.barcode, food_items.c.id)
+            .where(food_items.c.barcode.in_({barcode for _, barcode in changes if barcode}))
+        ).all())
+
+        for food_id, barcode in changes:
+            owner = owners.get(barcode)
+            if barcode is None or owner is None:
+                bind.execute(food_items.update().where(food_items.c.id == food_id).values(barcode=barcode))
+                if barcode is not None:
+                    owners[barcode] = food_id
+                rewritten += 1
+                continue
+
+            bind.execute(nutrition_entries.update().where(nutrition_entries.c.food_item_id == food_id)
+                         .values(food_item_id=owner))
+            bind.execute(food_items.delete().where(food_items.c.id == food_id))
+            if has_fts:
+                bind.execute(sa.text("DELETE FROM food_items_fts WHERE rowid = :id"), {"id": food_id})
+            merged += 1
+
+    if rewritten or merged:
+        print(f"Normalized barcodes: {rewritten} rewritten, {merged} duplicates merged")
+
+
+def downgrade() -> None:
+    # The legacy forms are not kept; canonical barcodes are valid in every revision
+    pass
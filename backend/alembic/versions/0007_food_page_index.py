@@ -0,0 +1,68 @@
+"""food search page index
+
+Composite index in the order of the keyset-paginated search
+(is_verified DESC, name, id): a page is read from the index in order and
+stops after limit + 1 matches instead of sorting every match.
+
+The live catalog's index names alternate between ix_food_items_* and
+ix_food_items_alt_* with every import (services.food_staging); the index
+is named after the generation the table is in. As in 0002, PostgreSQL
+builds it CONCURRENTLY and an interrupted build is dropped and redone.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 18:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = [sa.text("is_verified DESC"), "name", "id"]
+
+
+def _index_name() -> str:
+    if not op.get_context().as_sql:
+        indexes = {index["name"] for index in sa.inspect(op.get_bind()).get_indexes("food_items")}
+        if "ix_food_items_alt_barcode" in indexes:
+            return "ix_food_items_alt_is_verified_name_id"
+    return "ix_food_items_is_verified_name_id"
+
+
+def _drop_invalid_index(name: str) -> None:
+    if op.get_context().as_sql:
+        return
+    invalid = op.get_bind().execute(sa.text(
+        "SELECT 1 FROM pg_index JOIN pg_class ON pg_class.oid = pg_index.indexrelid "
+        "WHERE pg_class.relname = :name AND NOT pg_index.indisvalid"
+    ), {"name": name}).scalar()
+    if invalid:
+        op.drop_index(name, postgresql_concurrently=True, if_exists=True)
+
+
+def upgrade() -> None:
+    name = _index_name()
+    if op.get_context().dialect.name == "postgresql":
+        # CONCURRENTLY cannot run inside a transaction block
+        with op.get_context().autocommit_block():
+            _drop_invalid_index(name)
+            op.create_index(name, "food_items", COLUMNS, postgresql_concurrently=True, if_not_exists=True)
+    else:
+        op.create_index(name, "food_items", COLUMNS)
+
+
+def downgrade() -> None:
+    name = _index_name()
+    if op.get_context().dialect.name == "postgresql":
+        with op.get_context().autocommit_block():
+            op.drop_index(name, table_name="food_items", postgresql_concurrently=True)
+    else:
+        op.drop_index(name, table_name="food_items")
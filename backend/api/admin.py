@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 
-from database import get_session
+from api.deps import get_read_session, get_write_session
 from models.user import User
 from api.auth import get_admin_user
 from schemas.auth import UserResponse
@@ -12,7 +12,7 @@ router = APIRouter()
 @router.get("/users", response_model=List[UserResponse])
 async def get_all_users(
     admin_user: User = Depends(get_admin_user),
-    db: AsyncSession = Depends(get_session)
+    db: AsyncSession = Depends(get_read_session)
 ):
     """Get all users (admin only)"""
     from services.auth_service import AuthService
@@ -24,7 +24,7 @@ async def get_all_users(
 async def toggle_user_active(
     user_id: int,
     admin_user: User = Depends(get_admin_user),
-    db: AsyncSession = Depends(get_session)
+    db: AsyncSession = Depends(get_write_session)
 ):
     """Toggle user active status (admin only)"""
     from services.auth_service import AuthService
@@ -47,7 +47,7 @@ async def toggle_user_active(
 async def delete_user(
     user_id: int,
     admin_user: User = Depends(get_admin_user),
-    db: AsyncSession = Depends(get_session)
+    db: AsyncSession = Depends(get_write_session)
 ):
     """Delete user (admin only)"""
     from services.auth_service import AuthService
@@ -67,12 +67,24 @@ async def delete_user(
 @router.get("/stats")
 async def get_admin_stats(
     admin_user: User = Depends(get_admin_user),
-    db: AsyncSession = Depends(get_session)
+    db: AsyncSession = Depends(get_read_session)
 ):
     """Get admin dashboard statistics"""
     from sqlalchemy import func, select
+    from api.deps import read_routing
+    from database import pool_stats, sqlite_write_queue
     from models.nutrition import FoodItem, Meal
     from models.caffeine import CaffeineEntry
+    from services.barcode_decoder import barcode_decoder
+    from services.food_cache import food_cache
+    from services.food_fuzzy import food_fuzzy
+    from services.food_suggest import food_suggest
+    from services.identity_cache import identity_cache
+    from services.optional_deps import optional_dependencies
+    from services.password_hasher import password_hasher
+    from services.rate_limit import rate_limit_metrics
+    from services.sql_instrumentation import sql_instrumentation
+    from services.token_revocation import token_revocations
     
     # Count users
     user_count_result = await db.execute(select(func.count(User.id)))
@@ -94,5 +106,26 @@ async def get_admin_stats(
         "users": user_count,
         "food_items": food_count,
         "meals_logged": meal_count,
-        "caffeine_entries": caffeine_count
+        "caffeine_entries": caffeine_count,
+        "food_suggest_index": food_suggest.stats(),
+        "food_fuzzy_index": food_fuzzy.stats(),
+        "food_cache": food_cache.stats(),
+        "barcode_decoder": barcode_decoder.stats(),
+        "optional_dependencies": optional_dependencies.stats(),
+        "identity_cache": identity_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "token_revocations": token_revocations.stats(),
+        "rate_limits": rate_limit_metrics.stats(),
+        "sqlite_write_queue": sqlite_write_queue.stats(),
+        "database_pools": pool_stats(),
+        "read_routing": read_routing.stats(),
+        "sql_instrumentation": sql_instrumentation.stats()
     }
+
+@router.get("/food-database/status")
+async def get_food_database_status(
+    admin_user: User = Depends(get_admin_user)
+):
+    """Get progress of the food database import or refresh"""
+    from services.import_progress import food_import_progress
+    return food_import_progress.snapshot()
@@ -1,51 +1,70 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
-from slowapi import Limiter
-from slowapi.util import get_remote_address
 from datetime import timedelta, datetime
 from typing import Annotated
 import json
 
-from database import get_session
+from api.deps import get_read_session, get_write_session
 from schemas.auth import UserCreate, UserLogin, UserResponse, Token, Setup2FA, Verify2FA, PasswordReset
-from services.auth_service import AuthService
-from models.user import User
+from services.auth_service import AuthService, REFRESH_TOKEN_EXPIRE_DAYS
+from services.identity_cache import UserSnapshot, identity_cache, identity_version
+from services.optional_deps import DependencyUnavailable
+from services.rate_limit import limiter
+from services.token_revocation import token_revocations
 
 router = APIRouter()
 auth_service = AuthService()
 security = HTTPBearer()
-limiter = Limiter(key_func=get_remote_address)
 
-async def get_current_user(
+async def get_token_payload(
     credentials: Annotated[HTTPAuthorizationCredentials, Depends(security)],
-    db: AsyncSession = Depends(get_session)
-) -> User:
+    db: AsyncSession = Depends(get_write_session)
+) -> dict:
+    """Claims of a valid, unrevoked access token"""
     token = credentials.credentials
     payload = auth_service.verify_token(token)
     
-    if payload is None:
+    if payload is None or await token_revocations.is_revoked(db, payload):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid authentication credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    
+    return payload
+
+async def get_current_user(
+    payload: dict = Depends(get_token_payload),
+    db: AsyncSession = Depends(get_write_session)
+) -> UserSnapshot:
+    """The authenticated user as a read-only snapshot, cached per worker for a few seconds"""
     email: str = payload.get("sub")
     if email is None:
         raise HTTPException(status_code=401, detail="Invalid token")
     
-    user = await auth_service.get_user_by_email(db, email)
-    if user is None:
+    user_id = payload.get("user_id")
+    version = identity_version.current()
+    found, user = identity_cache.get(user_id, version) if user_id is not None else (False, None)
+    if not found:
+        row = await auth_service.get_user_by_email(db, email)
+        user = UserSnapshot.from_user(row) if row else None
+        if user:
+            identity_cache.set(user.id, user, version)
+    
+    # Tokens are issued for an email address; they stop working if it changes
+    if user is None or user.email != email:
         raise HTTPException(status_code=401, detail="User not found")
     
+    if not user.is_active:
+        raise HTTPException(status_code=401, detail="User not found or inactive")
+    
     # Check if account is locked
     if user.locked_until and user.locked_until > datetime.utcnow():
         raise HTTPException(status_code=423, detail="Account temporarily locked")
     
     return user
 
-async def get_admin_user(current_user: User = Depends(get_current_user)) -> User:
+async def get_admin_user(current_user: UserSnapshot = Depends(get_current_user)) -> UserSnapshot:
     if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Admin access required")
     return current_user
@@ -55,7 +74,7 @@ async def get_admin_user(current_user: User = Depends(get_current_user)) -> User
 async def register(
     request: Request,
     user_data: UserCreate,
-    db: AsyncSession = Depends(get_session)
+    db: AsyncSession = Depends(get_write_session)
 ):
     # Check if user already exists
     existing_user = await auth_service.get_user_by_email(db, user_data.email)
@@ -81,7 +100,7 @@ async def register(
 async def login(
     request: Request,
     user_data: UserLogin,
-    db: AsyncSession = Depends(get_session)
+    db: AsyncSession = Depends(get_write_session)
 ):
     # Get user and check if exists
     user = await auth_service.get_user_by_email(db, user_data.email)
@@ -106,7 +125,8 @@ async def login(
         raise HTTPException(status_code=400, detail="Account is disabled")
     
     # Verify password
-    if not auth_service.verify_password(user_data.password, user.hashed_password):
+    valid, new_hash = await auth_service.verify_and_update_password(user_data.password, user.hashed_password)
+    if not valid:
         await auth_service.handle_failed_login(db, user)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -130,15 +150,20 @@ async def login(
                     detail="Invalid 2FA code"
                 )
     
+    # Hashes made with older Argon2 parameters are upgraded on login
+    if new_hash:
+        user.hashed_password = new_hash
+    
     # Successful login - clear failed attempts
     await auth_service.handle_successful_login(db, user)
     
     # Generate tokens
+    family = auth_service.new_token_family()
     access_token = auth_service.create_access_token(
-        data={"sub": user.email, "user_id": user.id}
+        data={"sub": user.email, "user_id": user.id}, family=family
     )
     refresh_token = auth_service.create_refresh_token(
-        data={"sub": user.email, "user_id": user.id}
+        data={"sub": user.email, "user_id": user.id}, family=family
     )
     
     return Token(
@@ -150,7 +175,7 @@ async def login(
 @router.post("/refresh", response_model=Token)
 async def refresh_token(
     credentials: Annotated[HTTPAuthorizationCredentials, Depends(security)],
-    db: AsyncSession = Depends(get_session)
+    db: AsyncSession = Depends(get_write_session)
 ):
     token = credentials.credentials
     payload = auth_service.verify_token(token, "refresh")
@@ -158,18 +183,27 @@ async def refresh_token(
     if payload is None:
         raise HTTPException(status_code=401, detail="Invalid refresh token")
     
+    # Refresh tokens are single use; presenting a used one means it was
+    # copied, so every token of that login is revoked
+    if await token_revocations.is_revoked(db, payload):
+        await token_revocations.revoke_family(db, payload, "reuse", timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS))
+        raise HTTPException(status_code=401, detail="Invalid refresh token")
+    
     email = payload.get("sub")
     user = await auth_service.get_user_by_email(db, email)
     
     if not user or not user.is_active:
         raise HTTPException(status_code=401, detail="User not found or inactive")
     
-    # Generate new tokens
+    await token_revocations.revoke_token(db, payload, "rotated")
+    
+    # Generate new tokens in the same family (tokens from before families get a new one)
+    family = payload.get("fam") or auth_service.new_token_family()
     access_token = auth_service.create_access_token(
-        data={"sub": user.email, "user_id": user.id}
+        data={"sub": user.email, "user_id": user.id}, family=family
     )
     refresh_token = auth_service.create_refresh_token(
-        data={"sub": user.email, "user_id": user.id}
+        data={"sub": user.email, "user_id": user.id}, family=family
     )
     
     return Token(
@@ -179,18 +213,21 @@ async def refresh_token(
     )
 
 @router.get("/me", response_model=UserResponse)
-async def get_me(current_user: User = Depends(get_current_user)):
+async def get_me(current_user: UserSnapshot = Depends(get_current_user)):
     return UserResponse.model_validate(current_user)
 
 @router.post("/setup-2fa", response_model=Setup2FA)
 async def setup_2fa(
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_session)
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_write_session)
 ):
     if current_user.is_2fa_enabled:
         raise HTTPException(status_code=400, detail="2FA is already enabled")
     
-    setup_data = auth_service.setup_2fa(current_user.email)
+    try:
+        setup_data = auth_service.setup_2fa(current_user.email)
+    except DependencyUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
     
     return Setup2FA(
         qr_code=setup_data["qr_code"],
@@ -201,8 +238,8 @@ async def setup_2fa(
 @router.post("/verify-2fa")
 async def verify_and_enable_2fa(
     verify_data: Verify2FA,
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_session)
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_write_session)
 ):
     if current_user.is_2fa_enabled:
         raise HTTPException(status_code=400, detail="2FA is already enabled")
@@ -222,23 +259,26 @@ async def verify_and_enable_2fa(
 
 @router.post("/disable-2fa")
 async def disable_2fa(
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_session)
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_write_session)
 ):
     if not current_user.is_2fa_enabled:
         raise HTTPException(status_code=400, detail="2FA is not enabled")
     
-    await auth_service.disable_2fa(db, current_user)
+    user = await auth_service.get_user_by_id(db, current_user.id)
+    await auth_service.disable_2fa(db, user)
     return {"message": "2FA disabled successfully"}
 
 @router.post("/change-password")
 async def change_password(
     password_data: PasswordReset,
-    current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_session)
+    current_user: UserSnapshot = Depends(get_current_user),
+    db: AsyncSession = Depends(get_write_session)
 ):
+    user = await auth_service.get_user_by_id(db, current_user.id)
+    
     # Verify current password
-    if not auth_service.verify_password(password_data.old_password, current_user.hashed_password):
+    if not await auth_service.verify_password(password_data.old_password, user.hashed_password):
         raise HTTPException(status_code=400, detail="Current password is incorrect")
     
     # Validate new password
@@ -255,22 +295,25 @@ async def change_password(
         )
     
     # Update password
-    await auth_service.change_password(db, current_user, password_data.new_password)
+    await auth_service.change_password(db, user, password_data.new_password)
     
     return {"message": "Password changed successfully"}
 
 @router.post("/logout")
-async def logout(current_user: User = Depends(get_current_user)):
-    # TODO: Invalidate tokens
-    # In a real implementation, you'd invalidate the tokens
-    # This requires a token blacklist in Redis or database
+async def logout(
+    payload: dict = Depends(get_token_payload),
+    db: AsyncSession = Depends(get_write_session)
+):
+    # Revokes this access token and, through its family, the refresh tokens of the same login
+    await token_revocations.revoke_token(db, payload, "logout")
+    await token_revocations.revoke_family(db, payload, "logout", timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS))
     return {"message": "Logged out successfully"}
 
 # Admin endpoints
 @router.get("/admin/users", response_model=list[UserResponse])
 async def get_all_users(
-    admin_user: User = Depends(get_admin_user),
-    db: AsyncSession = Depends(get_session)
+    admin_user: UserSnapshot = Depends(get_admin_user),
+    db: AsyncSession = Depends(get_read_session)
 ):
     users = await auth_service.get_all_users(db)
     return [UserResponse.model_validate(user) for user in users]
@@ -278,8 +321,8 @@ async def get_all_users(
 @router.post("/admin/users/{user_id}/toggle-active")
 async def toggle_user_active(
     user_id: int,
-    admin_user: User = Depends(get_admin_user),
-    db: AsyncSession = Depends(get_session)
+    admin_user: UserSnapshot = Depends(get_admin_user),
+    db: AsyncSession = Depends(get_write_session)
 ):
     user = await auth_service.get_user_by_id(db, user_id)
     if not user:
@@ -297,8 +340,8 @@ async def toggle_user_active(
 @router.delete("/admin/users/{user_id}")
 async def delete_user(
     user_id: int,
-    admin_user: User = Depends(get_admin_user),
-    db: AsyncSession = Depends(get_session)
+    admin_user: UserSnapshot = Depends(get_admin_user),
+    db: AsyncSession = Depends(get_write_session)
 ):
     user = await auth_service.get_user_by_id(db, user_id)
     if not user:
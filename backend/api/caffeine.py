@@ -1,14 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_, func, desc
+from sqlalchemy.orm import joinedload
 from datetime import datetime, timedelta
 from typing import List, Optional
 import math
 
-from database import get_session
+from api.deps import get_read_session, get_write_session
 from models.user import User
 from models.caffeine import CaffeineEntry, CaffeineProduct
 from api.auth import get_current_user
+from services.user_time import local_date, to_utc, user_timezone
 from schemas.caffeine import (
     CaffeineProductResponse, CaffeineProductCreate,
     CaffeineEntryCreate, CaffeineEntryResponse,
@@ -20,7 +22,7 @@ router = APIRouter()
 @router.get("/products", response_model=List[CaffeineProductResponse])
 async def get_caffeine_products(
     category: Optional[str] = None,
-    db: AsyncSession = Depends(get_session),
+    db: AsyncSession = Depends(get_read_session),
     current_user: User = Depends(get_current_user)
 ):
     query = select(CaffeineProduct)
@@ -38,7 +40,7 @@ async def get_caffeine_products(
 @router.post("/products", response_model=CaffeineProductResponse)
 async def create_caffeine_product(
     product_data: CaffeineProductCreate,
-    db: AsyncSession = Depends(get_session),
+    db: AsyncSession = Depends(get_write_session),
     current_user: User = Depends(get_current_user)
 ):
     product = CaffeineProduct(**product_data.model_dump())
@@ -51,7 +53,7 @@ async def create_caffeine_product(
 @router.post("/entries", response_model=CaffeineEntryResponse)
 async def create_caffeine_entry(
     entry_data: CaffeineEntryCreate,
-    db: AsyncSession = Depends(get_session),
+    db: AsyncSession = Depends(get_write_session),
     current_user: User = Depends(get_current_user)
 ):
     # Verify product exists
@@ -62,9 +64,12 @@ async def create_caffeine_entry(
     if not product:
         raise HTTPException(status_code=404, detail="Caffeine product not found")
     
+    consumed_at = to_utc(entry_data.consumed_at)
     entry = CaffeineEntry(
         user_id=current_user.id,
-        **entry_data.model_dump()
+        **entry_data.model_dump(exclude={"consumed_at"}),
+        consumed_at=consumed_at,
+        local_date=local_date(consumed_at, await user_timezone(db, current_user.id))
     )
     db.add(entry)
     await db.commit()
@@ -75,12 +80,14 @@ async def create_caffeine_entry(
 @router.get("/entries", response_model=List[CaffeineEntryResponse])
 async def get_caffeine_entries(
     hours_back: int = Query(24, le=168),  # Max 1 week
-    db: AsyncSession = Depends(get_session),
+    db: AsyncSession = Depends(get_read_session),
     current_user: User = Depends(get_current_user)
 ):
     cutoff_time = datetime.utcnow() - timedelta(hours=hours_back)
     
-    query = select(CaffeineEntry).where(
+    # The response includes each entry's product; load them with the entries
+    # (async sessions cannot lazy load, and one query per entry would be N+1)
+    query = select(CaffeineEntry).options(joinedload(CaffeineEntry.product)).where(
         and_(
             CaffeineEntry.user_id == current_user.id,
             CaffeineEntry.consumed_at >= cutoff_time
@@ -94,7 +101,7 @@ async def get_caffeine_entries(
 
 @router.get("/current-level", response_model=CaffeineLevelResponse)
 async def get_current_caffeine_level(
-    db: AsyncSession = Depends(get_session),
+    db: AsyncSession = Depends(get_read_session),
     current_user: User = Depends(get_current_user)
 ):
     """Calculate current caffeine level based on half-life decay"""
@@ -146,7 +153,7 @@ async def get_current_caffeine_level(
 async def get_caffeine_curve(
     hours_back: int = Query(12, le=24),
     hours_forward: int = Query(12, le=24),
-    db: AsyncSession = Depends(get_session),
+    db: AsyncSession = Depends(get_read_session),
     current_user: User = Depends(get_current_user)
 ):
     """Generate caffeine curve showing past and predicted future levels"""
@@ -201,7 +208,7 @@ async def get_caffeine_curve(
 @router.delete("/entries/{entry_id}")
 async def delete_caffeine_entry(
     entry_id: int,
-    db: AsyncSession = Depends(get_session),
+    db: AsyncSession = Depends(get_write_session),
     current_user: User = Depends(get_current_user)
 ):
     result = await db.execute(
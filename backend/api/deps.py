@@ -0,0 +1,63 @@
+"""Database sessions for the API routers, routed per client.
+
+Read-only endpoints use get_read_session, which reads from the read engine
+unless the client wrote within READ_YOUR_WRITES_SECONDS. Endpoints that
+write use get_write_session; ReadYourWritesMiddleware marks their client
+before the response goes out, so its next reads stay on the primary.
+"""
+from fastapi import Request
+from limits.storage import storage_from_string
+
+import database
+from database import ReadRouting, SessionLocal
+from services.rate_limit import default_storage_uri, rate_limit_key
+
+# The marks are kept in the store the rate limits use, which every worker sees
+read_routing = ReadRouting(storage_from_string(default_storage_uri()))
+
+
+def client_key(request: Request) -> str:
+    """Clients are identified like the rate limits: user, or IP without a token"""
+    return rate_limit_key(request)
+
+
+async def get_write_session(request: Request):
+    """Session on the primary, for endpoints that write"""
+    info = {}
+    if database.replica_lags:
+        info["on_write_commit"] = lambda: setattr(request.state, "wrote", True)
+    async with SessionLocal(info=info) as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
+async def get_read_session(request: Request):
+    """Session for endpoints that only read, routed by read_routing"""
+    sessionmaker = await read_routing.sessionmaker(lambda: client_key(request))
+    async with sessionmaker() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
+class ReadYourWritesMiddleware:
+    """ASGI middleware marking clients whose request committed a write, before
+    the response starts and the client can read again"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        async def send_after_mark(message):
+            if message["type"] == "http.response.start" and scope["state"].pop("wrote", False):
+                await read_routing.mark_write(client_key(Request(scope)))
+            await send(message)
+
+        scope.setdefault("state", {})
+        await self.app(scope, receive, send_after_mark)
@@ -1,56 +1,182 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Form
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, func, desc
+from sqlalchemy import select, and_, desc
 from datetime import datetime, date
-from typing import List, Optional
-import cv2
-import numpy as np
-from pyzbar.pyzbar import decode
-import io
-from PIL import Image
-
-from database import get_session
+from typing import Dict, List, Optional
+import asyncio
+from concurrent.futures.process import BrokenProcessPool
+
+from api.deps import get_read_session, get_write_session
 from models.user import User
 from models.nutrition import FoodItem, Meal, NutritionEntry
 from api.auth import get_current_user
+from services.barcode_decoder import DecodeTimeout, DecoderBusy, barcode_decoder
+from services.barcodes import normalize_barcode
+from services.food_cache import MISSING, catalog_version, food_cache
+from services.food_fuzzy import food_fuzzy
+from services.food_search import decode_cursor, encode_cursor, food_search
+from services.food_suggest import food_suggest
+from services.optional_deps import DependencyUnavailable
+from services.user_time import day_range, local_date, to_utc, user_timezone
 from schemas.nutrition import (
-    FoodItemResponse, FoodItemCreate, MealCreate, MealResponse,
-    NutritionEntryCreate, NutritionEntryResponse, DailyNutritionSummary
+    BarcodeLookupResponse, BarcodeMatch, ScannedImage, FacetCount, FoodItemResponse, FoodItemCreate, FoodSearchFacets, FoodSearchPage, FoodSuggestion,
+    MealCreate, MealResponse, NutritionEntryCreate, NutritionEntryResponse, DailyNutritionSummary
 )
 
 router = APIRouter()
 
+MAX_BATCH_IMAGES = 10
+MAX_BATCH_CODES = 50
+MIN_SEARCH_LENGTH = 2
+
+async def _lookup_barcodes(db: AsyncSession, barcodes: List[str]) -> Dict[str, object]:
+    """Canonical barcode -> FoodItemResponse (or MISSING), with one query for all cache misses"""
+    found_foods = {}
+    uncached = []
+    version = catalog_version.current()
+    for barcode in barcodes:
+        found, cached = food_cache.get(("barcode", barcode), version)
+        if found:
+            found_foods[barcode] = cached
+        elif barcode not in uncached:
+            uncached.append(barcode)
+    
+    if uncached:
+        result = await db.execute(select(FoodItem).where(FoodItem.barcode.in_(uncached)))
+        foods = {food.barcode: food for food in result.scalars()}
+        
+        for barcode in uncached:
+            food = foods.get(barcode)
+            # Unknown barcodes are cached too, scanners retry the same code
+            cached = FoodItemResponse.model_validate(food) if food else MISSING
+            food_cache.set(("barcode", barcode), cached, version)
+            found_foods[barcode] = cached
+    
+    return found_foods
+
+def _search_text(q: str, min_length: int) -> str:
+    """q with whitespace runs collapsed; 422 when fewer than min_length characters are left"""
+    q = " ".join(q.split())
+    if len(q) < min_length:
+        raise HTTPException(status_code=422, detail=f"Search text must be at least {min_length} characters long")
+    return q
+
+async def _decode_upload(file: UploadFile) -> List[str]:
+    if not file.content_type or not file.content_type.startswith("image/"):
+        raise ValueError("File must be an image")
+    
+    contents = await file.read()
+    try:
+        return await barcode_decoder.decode(contents)
+    except (DecoderBusy, BrokenProcessPool):
+        raise HTTPException(status_code=503, detail="Barcode scanner is busy, please try again",
+                            headers={"Retry-After": "1"})
+    except DependencyUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
 @router.get("/foods/search", response_model=List[FoodItemResponse])
 async def search_foods(
-    q: str = Query(..., min_length=2),
+    q: str = Query(..., min_length=MIN_SEARCH_LENGTH),
     limit: int = Query(20, le=100),
-    db: AsyncSession = Depends(get_session),
+    mode: str = Query("substring", pattern="^(substring|fuzzy)$"),
+    db: AsyncSession = Depends(get_read_session),
     current_user: User = Depends(get_current_user)
 ):
-    query = select(FoodItem).where(
-        FoodItem.name.ilike(f"%{q}%")
-    ).order_by(FoodItem.is_verified.desc(), FoodItem.name).limit(limit)
+    q = _search_text(q, MIN_SEARCH_LENGTH)
+    fuzzy = mode == "fuzzy" and food_fuzzy.ready
+    cache_key = ("search", fuzzy, q.lower(), limit)
+    version = catalog_version.current()
+    found, cached = food_cache.get(cache_key, version)
+    if found:
+        return cached
     
-    result = await db.execute(query)
+    if fuzzy:
+        ids = [food_id for food_id, _ in food_fuzzy.search(q, limit)]
+        result = await db.execute(select(FoodItem).where(FoodItem.id.in_(ids)))
+        by_id = {food.id: food for food in result.scalars()}
+        foods = [by_id[food_id] for food_id in ids if food_id in by_id]
+    else:
+        query = food_search.search_query(q).limit(limit)
+        
+        result = await db.execute(query)
+        foods = result.scalars().all()
+    
+    response = [FoodItemResponse.model_validate(food) for food in foods]
+    food_cache.set(cache_key, response, version)
+    return response
+
+@router.get("/foods/search/page", response_model=FoodSearchPage)
+async def search_foods_page(
+    q: str = Query(..., min_length=MIN_SEARCH_LENGTH),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    brand: Optional[str] = None,
+    category: Optional[str] = None,
+    facets: bool = False,
+    db: AsyncSession = Depends(get_read_session),
+    current_user: User = Depends(get_current_user)
+):
+    """Page through search results with a cursor; facets are returned on request for the first page"""
+    q = _search_text(q, MIN_SEARCH_LENGTH)
+    cache_key = ("search_page", q.lower(), limit, cursor, brand, category, facets)
+    version = catalog_version.current()
+    found, cached = food_cache.get(cache_key, version)
+    if found:
+        return cached
+    
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    # One extra row tells whether there is a next page
+    result = await db.execute(food_search.page_query(q, brand, category, after).limit(limit + 1))
     foods = result.scalars().all()
     
-    return [FoodItemResponse.model_validate(food) for food in foods]
+    page = FoodSearchPage(
+        items=[FoodItemResponse.model_validate(food) for food in foods[:limit]],
+        next_cursor=encode_cursor(foods[limit - 1]) if len(foods) > limit else None,
+    )
+    
+    if facets and not cursor:
+        brands = await db.execute(food_search.facet_query(q, FoodItem.brand, brand, category))
+        categories = await db.execute(food_search.facet_query(q, FoodItem.category, brand, category))
+        page.facets = FoodSearchFacets(
+            brands=[FacetCount(value=row.value, count=row.count) for row in brands],
+            categories=[FacetCount(value=row.value, count=row.count) for row in categories],
+        )
+    
+    food_cache.set(cache_key, page, version)
+    return page
+
+@router.get("/foods/suggest", response_model=List[FoodSuggestion])
+async def suggest_foods(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(10, le=20),
+    db: AsyncSession = Depends(get_read_session),
+    current_user: User = Depends(get_current_user)
+):
+    q = _search_text(q, 1)
+    if food_suggest.ready:
+        return food_suggest.suggest(q, limit)
+    
+    # Index still loading after startup, answer from the database
+    result = await db.execute(food_search.search_query(q).limit(limit))
+    return [FoodSuggestion.model_validate(food, from_attributes=True) for food in result.scalars()]
 
 @router.get("/foods/barcode/{barcode}", response_model=FoodItemResponse)
 async def get_food_by_barcode(
     barcode: str,
-    db: AsyncSession = Depends(get_session),
+    db: AsyncSession = Depends(get_read_session),
     current_user: User = Depends(get_current_user)
 ):
-    result = await db.execute(
-        select(FoodItem).where(FoodItem.barcode == barcode)
-    )
-    food = result.scalar_one_or_none()
+    barcode = normalize_barcode(barcode)
+    cached = (await _lookup_barcodes(db, [barcode]))[barcode] if barcode else MISSING
     
-    if not food:
+    if cached is MISSING:
         raise HTTPException(status_code=404, detail="Food item not found")
     
-    return FoodItemResponse.model_validate(food)
+    return cached
 
 @router.post("/foods/scan-barcode")
 async def scan_barcode(
@@ -60,55 +186,109 @@ async def scan_barcode(
     if not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="File must be an image")
     
+    contents = await file.read()
     try:
-        # Read image
-        contents = await file.read()
-        nparr = np.frombuffer(contents, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        
-        # Decode barcodes
-        barcodes = decode(img)
-        
-        if not barcodes:
-            raise HTTPException(status_code=404, detail="No barcode found in image")
-        
-        # Return first barcode found
-        barcode_data = barcodes[0].data.decode('utf-8')
-        return {"barcode": barcode_data}
-        
+        barcodes = await barcode_decoder.decode(contents)
+    except (DecoderBusy, BrokenProcessPool):
+        raise HTTPException(status_code=503, detail="Barcode scanner is busy, please try again",
+                            headers={"Retry-After": "1"})
+    except DependencyUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except DecodeTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error processing image: {str(e)}")
+    
+    if not barcodes:
+        raise HTTPException(status_code=404, detail="No barcode found in image")
+    
+    # Return first barcode found
+    return {"barcode": barcodes[0]}
+
+@router.post("/foods/scan-barcodes", response_model=BarcodeLookupResponse)
+async def scan_and_lookup_barcodes(
+    files: List[UploadFile] = File([]),
+    codes: List[str] = Form([]),
+    db: AsyncSession = Depends(get_read_session),
+    current_user: User = Depends(get_current_user)
+):
+    """Decode several images and/or take several codes, and return each barcode with its food item"""
+    if not files and not codes:
+        raise HTTPException(status_code=400, detail="Provide at least one image or barcode")
+    if len(files) > MAX_BATCH_IMAGES or len(codes) > MAX_BATCH_CODES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_IMAGES} images and {MAX_BATCH_CODES} barcodes per request")
+    
+    # One image per decoder process at a time, so a batch does not fill the decoder queue alone
+    slots = asyncio.Semaphore(barcode_decoder.workers)
+    
+    async def scan(file: UploadFile) -> ScannedImage:
+        async with slots:
+            try:
+                decoded = await _decode_upload(file)
+            except (DecodeTimeout, ValueError) as e:
+                return ScannedImage(filename=file.filename, barcodes=[], error=str(e))
+            except HTTPException:
+                raise
+            except Exception as e:
+                return ScannedImage(filename=file.filename, barcodes=[], error=f"Error processing image: {str(e)}")
+        barcodes = [barcode for barcode in map(normalize_barcode, decoded) if barcode]
+        return ScannedImage(filename=file.filename, barcodes=barcodes,
+                            error=None if barcodes else "No barcode found in image")
+    
+    images = list(await asyncio.gather(*(scan(file) for file in files)))
+    
+    barcodes = []
+    for barcode in [barcode for image in images for barcode in image.barcodes] + [normalize_barcode(code) for code in codes]:
+        if barcode and barcode not in barcodes:
+            barcodes.append(barcode)
+    
+    foods = await _lookup_barcodes(db, barcodes)
+    return BarcodeLookupResponse(
+        items=[BarcodeMatch(barcode=barcode, food=None if foods[barcode] is MISSING else foods[barcode])
+               for barcode in barcodes],
+        images=images,
+    )
 
 @router.post("/foods", response_model=FoodItemResponse)
 async def create_food_item(
     food_data: FoodItemCreate,
-    db: AsyncSession = Depends(get_session),
+    db: AsyncSession = Depends(get_write_session),
     current_user: User = Depends(get_current_user)
 ):
+    food_data.barcode = normalize_barcode(food_data.barcode)
+    
     # Check if barcode already exists
     if food_data.barcode:
         existing = await db.execute(
             select(FoodItem).where(FoodItem.barcode == food_data.barcode)
         )
-        if existing.scalar_one_or_none():
+        if existing.scalars().first():
             raise HTTPException(status_code=400, detail="Barcode already exists")
     
     food_item = FoodItem(**food_data.model_dump())
     db.add(food_item)
+    await db.flush()
+    await food_search.index_food(db, food_item)
     await db.commit()
     await db.refresh(food_item)
+    catalog_version.bump()
+    food_suggest.add(food_item)
+    food_fuzzy.add(food_item)
     
     return FoodItemResponse.model_validate(food_item)
 
 @router.post("/meals", response_model=MealResponse)
 async def create_meal(
     meal_data: MealCreate,
-    db: AsyncSession = Depends(get_session),
+    db: AsyncSession = Depends(get_write_session),
     current_user: User = Depends(get_current_user)
 ):
+    eaten_at = to_utc(meal_data.eaten_at)
     meal = Meal(
         user_id=current_user.id,
-        **meal_data.model_dump()
+        **meal_data.model_dump(exclude={"eaten_at"}),
+        eaten_at=eaten_at,
+        local_date=local_date(eaten_at, await user_timezone(db, current_user.id))
     )
     db.add(meal)
     await db.commit()
@@ -120,15 +300,18 @@ async def create_meal(
 async def get_meals(
     date_from: Optional[date] = None,
     date_to: Optional[date] = None,
-    db: AsyncSession = Depends(get_session),
+    db: AsyncSession = Depends(get_read_session),
     current_user: User = Depends(get_current_user)
 ):
     query = select(Meal).where(Meal.user_id == current_user.id)
     
-    if date_from:
-        query = query.where(func.date(Meal.eaten_at) >= date_from)
-    if date_to:
-        query = query.where(func.date(Meal.eaten_at) <= date_to)
+    # Local days as half-open UTC ranges, so the (user_id, eaten_at) index applies
+    if date_from or date_to:
+        tz = await user_timezone(db, current_user.id)
+        if date_from:
+            query = query.where(Meal.eaten_at >= day_range(date_from, date_from, tz)[0])
+        if date_to:
+            query = query.where(Meal.eaten_at < day_range(date_to, date_to, tz)[1])
     
     query = query.order_by(desc(Meal.eaten_at))
     
@@ -140,7 +323,7 @@ async def get_meals(
 @router.post("/entries", response_model=NutritionEntryResponse)
 async def create_nutrition_entry(
     entry_data: NutritionEntryCreate,
-    db: AsyncSession = Depends(get_session),
+    db: AsyncSession = Depends(get_write_session),
     current_user: User = Depends(get_current_user)
 ):
     # Verify meal belongs to current user
@@ -174,10 +357,11 @@ async def create_nutrition_entry(
 @router.get("/summary/{target_date}", response_model=DailyNutritionSummary)
 async def get_daily_nutrition_summary(
     target_date: date,
-    db: AsyncSession = Depends(get_session),
+    db: AsyncSession = Depends(get_read_session),
     current_user: User = Depends(get_current_user)
 ):
-    # Get all entries for the date
+    # Get all entries for the user's local day
+    start, end = day_range(target_date, target_date, await user_timezone(db, current_user.id))
     query = select(NutritionEntry, FoodItem).join(
         FoodItem, NutritionEntry.food_item_id == FoodItem.id
     ).join(
@@ -185,7 +369,9 @@ async def get_daily_nutrition_summary(
     ).where(
         and_(
             NutritionEntry.user_id == current_user.id,
-            func.date(Meal.eaten_at) == target_date
+            Meal.user_id == current_user.id,
+            Meal.eaten_at >= start,
+            Meal.eaten_at < end
         )
     )
     
@@ -2,11 +2,12 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
-from database import get_session
+from api.deps import get_write_session
 from models.user import User
 from models.profile import UserProfile
 from api.auth import get_current_user
 from schemas.profile import ProfileCreate, ProfileUpdate, ProfileResponse
+from services.user_time import invalidate_user_timezones, relocalize_user_days, zone
 
 router = APIRouter()
 
@@ -14,7 +15,7 @@ router = APIRouter()
 @router.get("/", response_model=ProfileResponse)
 async def get_profile(
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_session)
+    db: AsyncSession = Depends(get_write_session)
 ):
     """Get user profile"""
     result = await db.execute(
@@ -36,7 +37,7 @@ async def get_profile(
 async def create_or_update_profile(
     profile_data: ProfileCreate,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_session)
+    db: AsyncSession = Depends(get_write_session)
 ):
     """Create or update user profile"""
     result = await db.execute(
@@ -44,6 +45,7 @@ async def create_or_update_profile(
     )
     profile = result.scalar_one_or_none()
     
+    timezone_before = profile.timezone if profile else None
     if profile:
         # Update existing profile
         for field, value in profile_data.model_dump(exclude_unset=True).items():
@@ -59,8 +61,15 @@ async def create_or_update_profile(
     # Calculate nutritional targets
     profile = calculate_nutrition_targets(profile)
     
+    timezone_changed = profile.timezone != timezone_before
+    if timezone_changed:
+        # Reports group by the stored local day; move every row to the new zone's days
+        await relocalize_user_days(db, current_user.id, zone(profile.timezone))
+    
     await db.commit()
     await db.refresh(profile)
+    if timezone_changed:
+        invalidate_user_timezones()
     
     return ProfileResponse.model_validate(profile)
 
@@ -69,7 +78,7 @@ async def create_or_update_profile(
 async def update_profile(
     profile_data: ProfileUpdate,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_session)
+    db: AsyncSession = Depends(get_write_session)
 ):
     """Update user profile"""
     result = await db.execute(
@@ -80,6 +89,8 @@ async def update_profile(
     if not profile:
         raise HTTPException(status_code=404, detail="Profile not found")
     
+    timezone_before = profile.timezone
+    
     # Update profile fields
     for field, value in profile_data.model_dump(exclude_unset=True).items():
         setattr(profile, field, value)
@@ -87,8 +98,15 @@ async def update_profile(
     # Recalculate nutritional targets
     profile = calculate_nutrition_targets(profile)
     
+    timezone_changed = profile.timezone != timezone_before
+    if timezone_changed:
+        # Reports group by the stored local day; move every row to the new zone's days
+        await relocalize_user_days(db, current_user.id, zone(profile.timezone))
+    
     await db.commit()
     await db.refresh(profile)
+    if timezone_changed:
+        invalidate_user_timezones()
     
     return ProfileResponse.model_validate(profile)
 
@@ -8,11 +8,12 @@ import json
 import csv
 import io
 
-from database import get_session
+from api.deps import get_read_session
 from models.user import User
 from models.nutrition import Meal, NutritionEntry, FoodItem
 from models.caffeine import CaffeineEntry, CaffeineProduct
 from api.auth import get_current_user
+from services.user_time import day_range, local_today, user_timezone
 
 router = APIRouter()
 
@@ -20,15 +21,17 @@ router = APIRouter()
 async def get_weekly_nutrition_report(
     weeks_back: int = Query(4, ge=1, le=12),
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_session)
+    db: AsyncSession = Depends(get_read_session)
 ):
     """Get weekly nutrition statistics"""
-    end_date = datetime.utcnow().date()
+    tz = await user_timezone(db, current_user.id)
+    end_date = local_today(tz)
     start_date = end_date - timedelta(weeks=weeks_back)
+    start, end = day_range(start_date, end_date, tz)
     
-    # Get nutrition data
+    # Get nutrition data, a range scan on meals grouped by the stored local day
     query = select(
-        func.date(Meal.eaten_at).label('date'),
+        Meal.local_date.label('date'),
         func.sum(FoodItem.calories_per_100g * NutritionEntry.amount_grams / 100).label('calories'),
         func.sum(FoodItem.protein_per_100g * NutritionEntry.amount_grams / 100).label('protein'),
         func.sum(FoodItem.carbs_per_100g * NutritionEntry.amount_grams / 100).label('carbs'),
@@ -38,10 +41,11 @@ async def get_weekly_nutrition_report(
     ).where(
         and_(
             NutritionEntry.user_id == current_user.id,
-            func.date(Meal.eaten_at) >= start_date,
-            func.date(Meal.eaten_at) <= end_date
+            Meal.user_id == current_user.id,
+            Meal.eaten_at >= start,
+            Meal.eaten_at < end
         )
-    ).group_by(func.date(Meal.eaten_at))
+    ).group_by(Meal.local_date)
     
     result = await db.execute(query)
     daily_data = result.all()
@@ -82,15 +86,16 @@ async def get_weekly_nutrition_report(
 async def get_caffeine_trends(
     days_back: int = Query(30, ge=1, le=90),
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_session)
+    db: AsyncSession = Depends(get_read_session)
 ):
     """Get caffeine consumption trends"""
-    end_date = datetime.utcnow()
-    start_date = end_date - timedelta(days=days_back)
+    tz = await user_timezone(db, current_user.id)
+    end_date = local_today(tz)
+    start, end = day_range(end_date - timedelta(days=days_back), end_date, tz)
     
-    # Get caffeine data
+    # Get caffeine data, grouped by the stored local day
     query = select(
-        func.date(CaffeineEntry.consumed_at).label('date'),
+        CaffeineEntry.local_date.label('date'),
         func.count(CaffeineEntry.id).label('entries'),
         func.sum(CaffeineProduct.caffeine_mg_per_serving * CaffeineEntry.amount_servings).label('total_caffeine'),
         func.avg(CaffeineProduct.caffeine_mg_per_serving * CaffeineEntry.amount_servings).label('avg_per_entry')
@@ -99,10 +104,10 @@ async def get_caffeine_trends(
     ).where(
         and_(
             CaffeineEntry.user_id == current_user.id,
-            CaffeineEntry.consumed_at >= start_date,
-            CaffeineEntry.consumed_at <= end_date
+            CaffeineEntry.consumed_at >= start,
+            CaffeineEntry.consumed_at < end
         )
-    ).group_by(func.date(CaffeineEntry.consumed_at))
+    ).group_by(CaffeineEntry.local_date)
     
     result = await db.execute(query)
     daily_data = result.all()
@@ -124,7 +129,7 @@ async def export_nutrition_data(
     format: str = Query("csv", regex="^(csv|json)$"),
     days_back: int = Query(30, ge=1, le=365),
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_session)
+    db: AsyncSession = Depends(get_read_session)
 ):
     """Export nutrition data"""
     end_date = datetime.utcnow()
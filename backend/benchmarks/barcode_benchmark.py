@@ -0,0 +1,162 @@
+"""Barcode scan latency and success rate per preprocessing stage.
+
+Renders a corpus of synthetic EAN-13 photos (large and clean, small in a
+big frame, rotated, blurred with low contrast) and decodes each one with
+the old single full-resolution pass and with the preprocessing ladder.
+
+    cd backend
+    python -m benchmarks.barcode_benchmark --images 20
+
+--decoder opencv uses OpenCV's own barcode reader instead of zbar, for
+machines without the zbar shared library.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from collections import Counter, defaultdict
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.barcode_preprocess import STAGES, decode_barcodes, zbar_decode
+
+L_CODES = ["0001101", "0011001", "0010011", "0111101", "0100011",
+           "0110001", "0101111", "0111011", "0110111", "0001011"]
+G_CODES = ["0100111", "0110011", "0011011", "0100001", "0011101",
+           "0111001", "0000101", "0010001", "0001001", "0010111"]
+R_CODES = ["1110010", "1100110", "1101100", "1000010", "1011100",
+           "1001110", "1010000", "1000100", "1001000", "1110100"]
+PARITY = ["LLLLLL", "LLGLGG", "LLGGLG", "LLGGGL", "LGLLGG",
+          "LGGLLG", "LGGGLL", "LGLGLG", "LGLGGL", "LGGLGL"]
+
+KINDS = ("clean", "small", "rotated", "blurry")
+
+
+def ean13(digits12: str) -> str:
+    total = sum(int(d) * (3 if i % 2 else 1) for i, d in enumerate(digits12))
+    return digits12 + str((10 - total % 10) % 10)
+
+
+def ean13_modules(code: str) -> str:
+    parity = PARITY[int(code[0])]
+    left = "".join((L_CODES if p == "L" else G_CODES)[int(d)] for p, d in zip(parity, code[1:7]))
+    right = "".join(R_CODES[int(d)] for d in code[7:])
+    return "101" + left + "01010" + right + "101"
+
+
+def render_barcode(code: str, module_px: int) -> np.ndarray:
+    modules = ean13_modules(code)
+    quiet = 11
+    width = (len(modules) + 2 * quiet) * module_px
+    height = int(width * 0.6)
+    image = np.full((height, width), 255, np.uint8)
+    for i, bit in enumerate(modules):
+        if bit == "1":
+            x = (quiet + i) * module_px
+            image[module_px * 4:height - module_px * 4, x:x + module_px] = 0
+    return image
+
+
+def photo(code: str, kind: str, rng: random.Random) -> bytes:
+    """A 12 MP phone-sized JPEG with the barcode somewhere in it"""
+    height, width = 3000, 4000
+    background = np.linspace(90, 200, width, dtype=np.float32)[None, :].repeat(height, axis=0)
+    background += np.random.default_rng(rng.randrange(2**32)).normal(0, 12, (height, width))
+    canvas = np.clip(background, 0, 255).astype(np.uint8)
+
+    module_px = {"clean": 12, "small": 2, "rotated": 8, "blurry": 10}[kind]
+    barcode = render_barcode(code, module_px)
+    if kind == "rotated":
+        angle = rng.choice([-1, 1]) * rng.uniform(35, 55)
+        h, w = barcode.shape
+        matrix = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+        size = int(np.hypot(w, h))
+        matrix[0, 2] += size / 2 - w / 2
+        matrix[1, 2] += size / 2 - h / 2
+        mask = cv2.warpAffine(np.full_like(barcode, 255), matrix, (size, size))
+        barcode = cv2.warpAffine(barcode, matrix, (size, size), borderValue=255)
+    else:
+        mask = np.full_like(barcode, 255)
+
+    h, w = barcode.shape
+    y, x = rng.randrange(0, height - h), rng.randrange(0, width - w)
+    region = canvas[y:y + h, x:x + w]
+    canvas[y:y + h, x:x + w] = np.where(mask > 0, barcode, region)
+
+    if kind == "blurry":
+        canvas = cv2.GaussianBlur(canvas, (0, 0), 4)
+        canvas = cv2.convertScaleAbs(canvas, alpha=0.4, beta=90)
+
+    ok, encoded = cv2.imencode(".jpg", cv2.cvtColor(canvas, cv2.COLOR_GRAY2BGR), [cv2.IMWRITE_JPEG_QUALITY, 90])
+    return encoded.tobytes()
+
+
+def opencv_decode(gray):
+    if gray.ndim == 2:
+        gray = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+    ok, decoded, _, _ = cv2.barcode.BarcodeDetector().detectAndDecodeMulti(gray)
+    return [code for code in decoded if code] if ok else []
+
+
+def contains(codes, code: str) -> bool:
+    # EAN-13 codes starting with 0 are reported as 12-digit UPC-A
+    return any(found.zfill(13) == code for found in codes)
+
+
+def single_pass(contents: bytes, decoder):
+    """The scan endpoint before the ladder: one decode of the full color image"""
+    image = cv2.imdecode(np.frombuffer(contents, np.uint8), cv2.IMREAD_COLOR)
+    return decoder(image)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", type=int, default=20, help="images per kind")
+    parser.add_argument("--decoder", choices=("zbar", "opencv"), default="zbar")
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    decoder = zbar_decode if args.decoder == "zbar" else opencv_decode
+    rng = random.Random(args.seed)
+
+    print(f"{'kind':<8} | {'single pass':>22} | {'ladder':>22} | found by stage")
+    for kind in KINDS:
+        baseline_hits, baseline_ms = 0, []
+        ladder_hits, ladder_ms = 0, []
+        stages = Counter()
+        stage_ms = defaultdict(list)
+
+        for _ in range(args.images):
+            code = ean13("".join(str(rng.randrange(10)) for _ in range(12)))
+            contents = photo(code, kind, rng)
+
+            started = time.perf_counter()
+            baseline_hits += contains(single_pass(contents, decoder), code)
+            baseline_ms.append((time.perf_counter() - started) * 1000)
+
+            started = time.perf_counter()
+            codes, stage = decode_barcodes(contents, decoder)
+            elapsed = (time.perf_counter() - started) * 1000
+            ladder_ms.append(elapsed)
+            if contains(codes, code):
+                ladder_hits += 1
+                stages[stage] += 1
+                stage_ms[stage].append(elapsed)
+
+        found = ", ".join(
+            f"{stage} {stages[stage]} ({statistics.median(stage_ms[stage]):.0f} ms)"
+            for stage in STAGES if stages[stage]
+        )
+        print(
+            f"{kind:<8} | {baseline_hits / args.images:5.0%} {statistics.median(baseline_ms):7.0f} ms p50 | "
+            f"{ladder_hits / args.images:5.0%} {statistics.median(ladder_ms):7.0f} ms p50 | {found or '-'}"
+        )
+
+
+if __name__ == "__main__":
+    main()
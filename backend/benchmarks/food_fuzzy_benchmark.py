@@ -0,0 +1,102 @@
+"""Fuzzy food search recall and latency against a synthetic misspelling set.
+
+Builds the trigram index over synthetic catalogs of each size, then queries
+it with misspelled product words (dropped, doubled, swapped or replaced
+letters). A query counts as recalled when one of the top results contains
+the word it was derived from.
+
+    cd backend
+    python -m benchmarks.food_fuzzy_benchmark --sizes 100000 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from collections import namedtuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.food_search_benchmark import COMMON_WORDS, synthetic_rows
+from services.food_fuzzy import FoodFuzzyIndex
+from services.food_import import FOOD_IMPORT_COLUMNS
+
+Row = namedtuple("Row", "id name is_verified")
+NAME = FOOD_IMPORT_COLUMNS.index("name")
+VERIFIED = FOOD_IMPORT_COLUMNS.index("is_verified")
+LETTERS = "abcdefghijklmnopqrstuvwxyz"
+
+
+def misspell(word: str, rng: random.Random) -> str:
+    i = rng.randrange(len(word))
+    kind = rng.choice(("drop", "double", "swap", "replace"))
+    if kind == "drop" and len(word) > 4:
+        return word[:i] + word[i + 1:]
+    if kind == "double":
+        return word[:i] + word[i] + word[i:]
+    if kind == "swap" and i < len(word) - 1:
+        return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    return word[:i] + rng.choice(LETTERS) + word[i + 1:]
+
+
+def misspelling_set(names, count: int, seed: int = 11):
+    rng = random.Random(seed)
+    queries = []
+    while len(queries) < count:
+        word = rng.choice(rng.choice(names).split()).lower()
+        if len(word) < 5:
+            continue
+        typo = misspell(word, rng)
+        if typo != word:
+            queries.append((typo, word))
+    return queries
+
+
+def run_size(size: int, queries: int, limit: int):
+    rows = [
+        Row(i + 1, row[NAME], row[VERIFIED])
+        for i, row in enumerate(row for batch in synthetic_rows(size) for row in batch)
+    ]
+    names = {row.id: row.name.lower() for row in rows}
+
+    index = FoodFuzzyIndex()
+    started = time.perf_counter()
+    index.load(rows)
+    build_seconds = time.perf_counter() - started
+
+    test_set = misspelling_set([row.name for row in rows], queries)
+    # Common words also appear in the long tail of names; check them separately
+    common = [(typo, word) for typo, word in test_set if word in COMMON_WORDS]
+
+    latencies, hits, common_hits = [], 0, 0
+    for typo, word in test_set:
+        started = time.perf_counter()
+        results = index.search(typo, limit)
+        latencies.append((time.perf_counter() - started) * 1000)
+        if any(word in names[food_id].split() for food_id, _ in results):
+            hits += 1
+            common_hits += word in COMMON_WORDS
+
+    latencies.sort()
+    stats = index.stats()
+    print(
+        f"{size:>9,} items | recall@{limit} {hits / len(test_set):6.1%} "
+        f"(common words {common_hits / max(1, len(common)):6.1%}) | "
+        f"p50 {latencies[len(latencies) // 2]:7.2f} ms  p99 {latencies[int(len(latencies) * 0.99)]:7.2f} ms | "
+        f"build {build_seconds:.1f}s, {stats['memory_bytes'] / 2**20:.0f} MiB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        run_size(size, args.queries, args.limit)
+
+
+if __name__ == "__main__":
+    main()
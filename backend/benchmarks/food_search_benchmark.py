@@ -0,0 +1,142 @@
+"""Food search latency: indexed search backend vs. the old name ILIKE query.
+
+Seeds a throwaway catalog of synthetic foods at each size and reports p50/p99
+latency of both queries for the same set of search terms.
+
+    cd backend
+    python -m benchmarks.food_search_benchmark --sizes 10000 100000 1000000
+
+--database-url points the benchmark at another (empty) database, e.g. a
+scratch PostgreSQL instance with pg_trgm available.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from database import Base
+from models.user import User  # noqa: F401 - registers the tables FoodItem's neighbours refer to
+from models.nutrition import FoodItem
+from models.caffeine import CaffeineEntry  # noqa: F401
+from services.food_import import FoodBulkLoader, food_row
+from services.food_search import get_search_backend
+
+COMMON_WORDS = (
+    "apple banana cherry chocolate yogurt cheese chicken turkey salmon tuna rice pasta bread "
+    "oat almond peanut butter milk cream honey tomato potato spinach broccoli carrot lentil bean "
+    "organic classic light original natural crunchy smoked roasted salted sweet spicy vanilla"
+).split()
+SYLLABLES = "ba ko ri ten sal mu pe lo vin dra ka sor fi ne tus gra mel chi po zan".split()
+# Product names mix common words with a long tail of rarer ones, like the real catalog
+WORDS = COMMON_WORDS + sorted({
+    "".join(random.Random(i).choice(SYLLABLES) for _ in range(random.Random(-i).randint(2, 4)))
+    for i in range(5000)
+})
+BRANDS = ["Alpro", "Barilla", "Danone", "Ferrero", "Kellogg", "Lindt", "Nestle", "Oatly", "Generic"]
+CATEGORIES = ["Dairy", "Snacks", "Beverages", "Cereals", "Meat", "Fish", "Fruits", "Vegetables"]
+
+
+def synthetic_rows(count: int, seed: int = 42):
+    rng = random.Random(seed)
+    batch = []
+    for i in range(count):
+        batch.append(food_row({
+            "barcode": f"{i:013d}",
+            "name": " ".join(rng.choice(WORDS).capitalize() for _ in range(rng.randint(2, 4))),
+            "brand": rng.choice(BRANDS),
+            "category": rng.choice(CATEGORIES),
+            "calories_per_100g": rng.uniform(0, 900),
+            "is_verified": rng.random() < 0.05,
+        }))
+        if len(batch) == 50000:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def search_terms(count: int, seed: int = 7):
+    rng = random.Random(seed)
+    terms = []
+    for _ in range(count):
+        word = rng.choice(WORDS + [brand.lower() for brand in BRANDS])
+        start = rng.randint(0, max(0, len(word) - 3))
+        terms.append(word[start:start + rng.randint(3, 6)])
+    return terms
+
+
+def legacy_query(q: str):
+    return select(FoodItem).where(
+        FoodItem.name.ilike(f"%{q}%")
+    ).order_by(FoodItem.is_verified.desc(), FoodItem.name)
+
+
+async def time_queries(engine, build_query, terms, limit: int):
+    latencies = []
+    async with engine.connect() as conn:
+        for q in terms:
+            started = time.perf_counter()
+            result = await conn.execute(build_query(q).limit(limit))
+            result.all()
+            latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    return statistics.median(latencies), latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+
+
+async def run_size(database_url: str, size: int, terms, limit: int):
+    engine = create_async_engine(database_url)
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+            if engine.dialect.name == "sqlite":
+                await conn.execute(text("DROP TABLE IF EXISTS food_items_fts"))
+
+        await FoodBulkLoader(engine=engine).load_batches(synthetic_rows(size))
+
+        search = get_search_backend(engine)
+        started = time.perf_counter()
+        await search.ensure_index()
+        index_seconds = time.perf_counter() - started
+
+        # Warm the page cache for both queries before measuring
+        await time_queries(engine, legacy_query, terms[:5], limit)
+        await time_queries(engine, search.search_query, terms[:5], limit)
+
+        legacy = await time_queries(engine, legacy_query, terms, limit)
+        indexed = await time_queries(engine, search.search_query, terms, limit)
+        print(
+            f"{size:>9,} items | ilike p50 {legacy[0]:8.2f} ms  p99 {legacy[1]:8.2f} ms | "
+            f"{search.name} p50 {indexed[0]:8.2f} ms  p99 {indexed[1]:8.2f} ms | "
+            f"index build {index_seconds:.1f}s"
+        )
+    finally:
+        await engine.dispose()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--database-url", help="empty database to use instead of a temporary SQLite file")
+    args = parser.parse_args()
+
+    terms = search_terms(args.queries)
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            database_url = args.database_url or f"sqlite+aiosqlite:///{os.path.join(tmp, f'bench_{size}.db')}"
+            await run_size(database_url, size, terms, args.limit)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
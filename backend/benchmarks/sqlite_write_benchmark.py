@@ -0,0 +1,199 @@
+"""Concurrent writes to SQLite: the default engine vs. the tuned SQLite profile.
+
+Several processes (like gunicorn workers) each run many concurrent tasks
+that log meals and caffeine entries the way create_meal and
+create_caffeine_entry do, optionally next to an importer writing food
+batches. Each profile gets a fresh database file and reports write
+throughput, latency and the share of writes that failed (mostly
+"database is locked").
+
+- default: create_async_engine() and plain sessions, as before
+- tuned: create_database_engine() and create_sessionmaker() from database.py
+  (WAL, synchronous=NORMAL, busy_timeout, ... and the per-worker write queue)
+
+    cd backend
+    python -m benchmarks.sqlite_write_benchmark --workers 4 --tasks 32 --seconds 10
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, BACKEND_DIR)
+
+PROFILES = ("default", "tuned")
+
+
+def _engine_and_sessions(url: str, profile: str):
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+    from database import SQLiteWriteQueue, create_database_engine, create_sessionmaker
+
+    if profile == "tuned":
+        engine = create_database_engine(url)
+        return engine, create_sessionmaker(engine, SQLiteWriteQueue())
+    engine = create_async_engine(url, echo=False)
+    return engine, async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+async def _setup(url: str):
+    from database import Base
+    from models.user import User
+    from models.caffeine import CaffeineProduct
+    import models.nutrition  # noqa: F401
+
+    engine, sessions = _engine_and_sessions(url, "default")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with sessions() as db:
+        db.add(User(email="bench@example.com", hashed_password="-"))
+        db.add(CaffeineProduct(name="Espresso", category="coffee", caffeine_mg_per_serving=63))
+        await db.commit()
+    await engine.dispose()
+
+
+async def _write_requests(url: str, profile: str, tasks: int, seconds: float) -> dict:
+    from sqlalchemy import select
+    from models.caffeine import CaffeineEntry, CaffeineProduct
+    from models.nutrition import Meal
+    import models.user  # noqa: F401
+
+    engine, sessions = _engine_and_sessions(url, profile)
+    latencies, errors = [], {}
+    deadline = time.perf_counter() + seconds
+
+    async def create_meal(db):
+        meal = Meal(user_id=1, name="Benchmark meal", meal_type="lunch", eaten_at=datetime.utcnow())
+        db.add(meal)
+        await db.commit()
+        await db.refresh(meal)
+
+    async def create_caffeine_entry(db):
+        product = (await db.execute(select(CaffeineProduct).where(CaffeineProduct.id == 1))).scalar_one()
+        entry = CaffeineEntry(user_id=1, product_id=product.id, consumed_at=datetime.utcnow())
+        db.add(entry)
+        await db.commit()
+        await db.refresh(entry)
+
+    async def client(number: int):
+        request = create_meal if number % 2 else create_caffeine_entry
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                async with sessions() as db:
+                    await request(db)
+                latencies.append(time.perf_counter() - started)
+            except Exception as e:
+                error = str(getattr(e, "orig", e)).splitlines()[0][:60]
+                errors[error] = errors.get(error, 0) + 1
+
+    await asyncio.gather(*(client(number) for number in range(tasks)))
+    await engine.dispose()
+    return {"latencies": latencies, "errors": errors}
+
+
+async def _import_batches(url: str, profile: str, seconds: float, batch_size: int, worker: int) -> dict:
+    from services.food_import import FoodBulkLoader, food_row
+    import models.user  # noqa: F401
+
+    engine, _ = _engine_and_sessions(url, profile)
+    loader = FoodBulkLoader(engine=engine, batch_size=batch_size, progress_every=10 ** 12)
+    deadline = time.perf_counter() + seconds
+    batches = errors = 0
+    while time.perf_counter() < deadline:
+        batch = [food_row({"barcode": f"9{worker:03d}{batches:06d}{i:05d}", "name": f"Imported food {i}",
+                           "calories_per_100g": 100}) for i in range(batch_size)]
+        try:
+            await loader.load_batches([batch])
+            batches += 1
+        except Exception:
+            errors += 1
+    await engine.dispose()
+    return {"batches": batches, "errors": errors}
+
+
+def _run_worker(role: str, url: str, profile: str, options: dict, worker: int, results):
+    # Keep the loader's progress output out of the report
+    sys.stdout = open(os.devnull, "w")
+    if role == "importer":
+        result = asyncio.run(_import_batches(url, profile, options["seconds"], options["batch_size"], worker))
+    else:
+        result = asyncio.run(_write_requests(url, profile, options["tasks"], options["seconds"]))
+    results.put((role, result))
+
+
+def run_profile(profile: str, args) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        url = f"sqlite+aiosqlite:///{os.path.join(directory, 'bench.db')}"
+        asyncio.run(_setup(url))
+
+        context = multiprocessing.get_context("spawn")
+        results = context.Queue()
+        options = {"tasks": args.tasks, "seconds": args.seconds, "batch_size": args.import_batch_size}
+        roles = ["requests"] * args.workers + ["importer"] * (1 if args.importer else 0)
+        processes = [
+            context.Process(target=_run_worker, args=(role, url, profile, options, worker, results))
+            for worker, role in enumerate(roles)
+        ]
+        for process in processes:
+            process.start()
+        reports = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+    latencies, errors, imported, import_errors = [], {}, 0, 0
+    for role, report in reports:
+        if role == "importer":
+            imported += report["batches"]
+            import_errors += report["errors"]
+            continue
+        latencies += report["latencies"]
+        for error, count in report["errors"].items():
+            errors[error] = errors.get(error, 0) + count
+
+    failed = sum(errors.values())
+    latencies.sort()
+    return {
+        "writes": len(latencies),
+        "writes_per_sec": len(latencies) / args.seconds,
+        "error_rate": failed / max(1, failed + len(latencies)),
+        "errors": errors,
+        "p50_ms": statistics.median(latencies) * 1000 if latencies else None,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1000 if latencies else None,
+        "import_batches": imported,
+        "import_errors": import_errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4, help="processes writing like gunicorn workers")
+    parser.add_argument("--tasks", type=int, default=32, help="concurrent requests per worker")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--importer", action=argparse.BooleanOptionalAction, default=True,
+                        help="run a food importer process alongside")
+    parser.add_argument("--import-batch-size", type=int, default=5000)
+    parser.add_argument("--profiles", nargs="+", choices=PROFILES, default=list(PROFILES))
+    args = parser.parse_args()
+
+    print(f"{args.workers} workers x {args.tasks} concurrent writers for {args.seconds:.0f}s"
+          f"{', with importer' if args.importer else ''}")
+    print(f"{'profile':<8} {'writes/s':>9} {'errors':>8} {'p50 ms':>8} {'p99 ms':>9} {'import batches':>15}")
+    for profile in args.profiles:
+        report = run_profile(profile, args)
+        p50 = f"{report['p50_ms']:.1f}" if report["p50_ms"] is not None else "-"
+        p99 = f"{report['p99_ms']:.1f}" if report["p99_ms"] is not None else "-"
+        print(f"{profile:<8} {report['writes_per_sec']:9.0f} {report['error_rate']:8.1%} {p50:>8} {p99:>9} "
+              f"{report['import_batches']:>8} ({report['import_errors']} failed)")
+        for error, count in sorted(report["errors"].items(), key=lambda item: -item[1]):
+            print(f"           {count:6d} x {error}")
+
+
+if __name__ == "__main__":
+    main()
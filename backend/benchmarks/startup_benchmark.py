@@ -0,0 +1,146 @@
+"""Worker startup cost: import time and resident memory of the app module.
+
+Every gunicorn worker imports main on its own, so each one pays this. The
+benchmark runs fresh interpreters that `import main` and reports:
+
+- total import time from `python -X importtime`, with the slowest packages
+- resident memory (VmRSS) of a worker right after the import
+- the extra import time and memory of each optional module on first use
+
+    cd backend
+    python -m benchmarks.startup_benchmark --runs 5
+
+--max-import-ms and --max-rss-mb make it exit non-zero when a limit is
+exceeded, so it can guard against regressions in CI.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, BACKEND_DIR)
+
+# Runs in the child interpreter; prints RSS in KiB after importing the app,
+# and the import time and RSS growth of the optional module named in argv
+PROBE = """
+import json, sys, time
+
+def rss_kib():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+
+import main
+from services.optional_deps import optional_dependencies
+
+report = {"rss_kib": rss_kib(), "preloaded": sorted(
+    name for name in optional_dependencies.modules if name in sys.modules
+), "modules": sorted(optional_dependencies.modules)}
+if len(sys.argv) > 1:
+    before = rss_kib()
+    started = time.perf_counter()
+    try:
+        optional_dependencies.modules[sys.argv[1]].load()
+        report["import_ms"] = (time.perf_counter() - started) * 1000
+        report["rss_growth_kib"] = rss_kib() - before
+    except ImportError as e:
+        report["error"] = str(e)
+print(json.dumps(report))
+"""
+
+
+def child_env(data_dir: str) -> dict:
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{os.path.join(data_dir, 'startup.db')}")
+    return env
+
+
+def import_times(env: dict):
+    """(total ms, [(cumulative ms, top-level package)]) from one -X importtime run"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    total, packages = 0.0, []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        # Nesting is shown as two spaces per level; only direct imports of
+        # main are listed, nested ones are in their parent's total
+        name = name[1:]
+        if name.startswith("  ") and not name.startswith("   "):
+            packages.append((int(cumulative) / 1000, name.strip()))
+        elif name.strip() == "main":
+            total = int(cumulative) / 1000
+    return total, packages
+
+
+def probe(env: dict, optional_module: str = None) -> dict:
+    # A fresh interpreter per module, so modules shared by several (numpy)
+    # are not hidden behind the one that happened to load them first
+    args = [sys.executable, "-c", PROBE] + ([optional_module] if optional_module else [])
+    result = subprocess.run(args, cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=12, help="slowest imports to list")
+    parser.add_argument("--max-import-ms", type=float, default=None)
+    parser.add_argument("--max-rss-mb", type=float, default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        env = child_env(data_dir)
+        # The first run warms the bytecode cache, it is not counted
+        import_times(env)
+
+        totals, rss = [], []
+        slowest = None
+        for _ in range(args.runs):
+            total, packages = import_times(env)
+            totals.append(total)
+            slowest = slowest or sorted(packages, reverse=True)[:args.top]
+            report = probe(env)
+            rss.append(report["rss_kib"] / 1024)
+        optional = {name: probe(env, name) for name in report["modules"]}
+
+    import_ms = statistics.median(totals)
+    rss_mb = statistics.median(rss)
+    print(f"import main: {import_ms:.0f} ms p50 (min {min(totals):.0f}, max {max(totals):.0f}) over {args.runs} runs")
+    print(f"worker RSS after import: {rss_mb:.1f} MB p50")
+    print(f"optional modules imported at startup: {', '.join(report['preloaded']) or 'none'}")
+
+    print("\nslowest imports (cumulative):")
+    for ms, name in slowest:
+        print(f"  {ms:8.1f} ms  {name}")
+
+    print("\noptional modules on first use:")
+    for name, cost in optional.items():
+        if "error" in cost:
+            print(f"  {name:<16} unavailable: {cost['error']}")
+        else:
+            print(f"  {name:<16} +{cost['import_ms']:6.1f} ms  +{cost['rss_growth_kib'] / 1024:5.1f} MB")
+
+    failed = False
+    if args.max_import_ms is not None and import_ms > args.max_import_ms:
+        print(f"\nFAIL: import time {import_ms:.0f} ms exceeds {args.max_import_ms:.0f} ms")
+        failed = True
+    if args.max_rss_mb is not None and rss_mb > args.max_rss_mb:
+        print(f"\nFAIL: worker RSS {rss_mb:.1f} MB exceeds {args.max_rss_mb:.1f} MB")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,20 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession, async_sessionmaker
+from sqlalchemy.orm import DeclarativeBase, Session
+import asyncio
+import contextlib
+import logging
 import os
+import time
+from typing import Callable
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    fcntl = None
+
+logger = logging.getLogger(__name__)
 
 # Use SQLite for local development, PostgreSQL for production
 if os.getenv("ENVIRONMENT") == "production":
@@ -9,26 +23,408 @@ else:
     # Local development with SQLite
     DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./mybiotracker.db")
 
-engine = create_async_engine(DATABASE_URL, echo=False)
-SessionLocal = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+# SQLite profile, applied to every new connection
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "30000"))
+SQLITE_MMAP_SIZE_MB = int(os.getenv("SQLITE_MMAP_SIZE_MB", "256"))
+SQLITE_CACHE_SIZE_MB = int(os.getenv("SQLITE_CACHE_SIZE_MB", "64"))
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "5"))
+SQLITE_MAX_OVERFLOW = int(os.getenv("SQLITE_MAX_OVERFLOW", "10"))
+
+# Optional read replica for read-only endpoints (PostgreSQL streaming replica)
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL", "")
+# After a write, the writer's reads stay on the primary this long (replication lag)
+READ_YOUR_WRITES_SECONDS = int(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+
+
+def async_database_url(url: str) -> str:
+    """Use the async driver for plain sqlite:// URLs (as in docker-compose.yml)"""
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    return url
+
+
+def sqlite_pragmas(read_only: bool = False) -> list:
+    pragmas = [
+        # Readers no longer block the writer and vice versa
+        "PRAGMA journal_mode=WAL",
+        # Durable at each checkpoint instead of each commit; safe in WAL mode
+        "PRAGMA synchronous=NORMAL",
+        # Wait for another worker's write lock instead of failing with "database is locked"
+        f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+        f"PRAGMA mmap_size={SQLITE_MMAP_SIZE_MB * 1024 * 1024}",
+        f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_MB * 1024}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+    if read_only:
+        # Any write on a read connection fails instead of taking the write lock
+        pragmas.append("PRAGMA query_only=ON")
+    return pragmas
+
+
+class SQLiteWriteQueue:
+    """Lets one session per worker write at a time, in arrival order.
+
+    SQLite allows a single writer per database. Without the queue, every
+    session of a worker that wants to write polls the busy handler for the
+    lock; with it, they wait in line here and the lock is handed on as soon
+    as the previous transaction ends. Other workers are still serialized by
+    SQLite itself through busy_timeout.
+
+    Reentrant per task, so a task writing through a second session does not
+    wait on itself.
+    """
+
+    def __init__(self):
+        self._lock = None
+        self._loop = None
+        self._owner = None
+        self._depth = 0
+
+        self.writes = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.max_hold_seconds = 0.0
+        self._held_since = 0.0
+
+    def _get_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._lock, self._loop = asyncio.Lock(), loop
+        return self._lock
+
+    async def acquire(self):
+        task = asyncio.current_task()
+        if self._owner is task:
+            self._depth += 1
+            return
+
+        lock = self._get_lock()
+        if lock.locked():
+            self.waits += 1
+            started = time.perf_counter()
+            await lock.acquire()
+            waited = time.perf_counter() - started
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        else:
+            await lock.acquire()
+        self._owner, self._depth = task, 1
+        self._held_since = time.perf_counter()
+        self.writes += 1
+
+    def release(self):
+        self._depth -= 1
+        if self._depth:
+            return
+        self.max_hold_seconds = max(self.max_hold_seconds, time.perf_counter() - self._held_since)
+        self._owner = None
+        self._lock.release()
+
+    def __call__(self):
+        return _QueuedWrite(self)
+
+    def stats(self) -> dict:
+        return {
+            "writes": self.writes,
+            "waits": self.waits,
+            "mean_wait_ms": round(self.wait_seconds / self.waits * 1000, 2) if self.waits else None,
+            "max_wait_ms": round(self.max_wait_seconds * 1000, 2),
+            "max_hold_ms": round(self.max_hold_seconds * 1000, 2),
+        }
+
+
+class _QueuedWrite:
+    def __init__(self, queue: SQLiteWriteQueue):
+        self.queue = queue
+
+    async def __aenter__(self):
+        await self.queue.acquire()
+
+    async def __aexit__(self, *exc_info):
+        self.queue.release()
+
+
+class QueuedWriteSession(AsyncSession):
+    """AsyncSession that takes its place in the write queue before its first write
+    (flush or DML statement) and leaves it when the transaction ends"""
+
+    write_queue: SQLiteWriteQueue = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._queued = False
+
+    async def _enter_queue(self):
+        if not self._queued:
+            # Connection first: a session holding the queue must never wait for the pool
+            # while sessions holding the pool's connections wait for the queue
+            await self.connection()
+            await self.write_queue.acquire()
+            self._queued = True
+
+    def _leave_queue(self):
+        if self._queued:
+            self._queued = False
+            self.write_queue.release()
+
+    def _has_changes(self) -> bool:
+        return bool(self.sync_session.new or self.sync_session.dirty or self.sync_session.deleted)
+
+    async def _before_statement(self, statement=None):
+        # DML writes, and so does the autoflush of pending changes before a query
+        if getattr(statement, "is_dml", False) or (self.autoflush and self._has_changes()):
+            await self._enter_queue()
+
+    async def execute(self, statement, *args, **kwargs):
+        await self._before_statement(statement)
+        return await super().execute(statement, *args, **kwargs)
+
+    async def scalar(self, statement, *args, **kwargs):
+        await self._before_statement(statement)
+        return await super().scalar(statement, *args, **kwargs)
+
+    async def get(self, *args, **kwargs):
+        await self._before_statement()
+        return await super().get(*args, **kwargs)
+
+    async def flush(self, objects=None):
+        if self._has_changes():
+            await self._enter_queue()
+        return await super().flush(objects)
+
+    async def commit(self):
+        if self._has_changes():
+            await self._enter_queue()
+        try:
+            return await super().commit()
+        finally:
+            self._leave_queue()
+
+    async def rollback(self):
+        try:
+            return await super().rollback()
+        finally:
+            self._leave_queue()
+
+    async def close(self):
+        try:
+            return await super().close()
+        finally:
+            self._leave_queue()
+
+
+sqlite_write_queue = SQLiteWriteQueue()
+
+
+def create_database_engine(url: str = DATABASE_URL, read_only: bool = False, **kwargs) -> AsyncEngine:
+    """Async engine for url; SQLite connections get the pragmas above"""
+    url = async_database_url(url)
+    if url.startswith("sqlite") and ":memory:" not in url:
+        # aiosqlite defaults to NullPool, which opens a connection (and a thread) per session
+        kwargs.setdefault("poolclass", AsyncAdaptedQueuePool)
+        kwargs.setdefault("pool_size", SQLITE_POOL_SIZE)
+        kwargs.setdefault("max_overflow", SQLITE_MAX_OVERFLOW)
+    engine = create_async_engine(url, echo=False, **kwargs)
+    if engine.dialect.name == "sqlite":
+        pragmas = sqlite_pragmas(read_only)
+
+        @event.listens_for(engine.sync_engine, "connect")
+        def apply_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for pragma in pragmas:
+                cursor.execute(pragma)
+            cursor.close()
+    return engine
+
+
+def create_sessionmaker(engine: AsyncEngine, write_queue: SQLiteWriteQueue = sqlite_write_queue) -> async_sessionmaker:
+    if engine.dialect.name != "sqlite":
+        return async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    session_class = type("QueuedWriteSession", (QueuedWriteSession,), {"write_queue": write_queue})
+    return async_sessionmaker(engine, class_=session_class, expire_on_commit=False)
+
+
+def sqlite_writer(bind: AsyncEngine = None):
+    """Queue a write made outside of a session on SQLite; enter it after checking
+    out the connection (inside engine.begin()), as sessions do"""
+    if (bind or engine).dialect.name == "sqlite":
+        return sqlite_write_queue()
+    return contextlib.nullcontext()
+
+
+def create_read_engine(primary: AsyncEngine, read_url: str = DATABASE_READ_URL) -> AsyncEngine:
+    """Engine for read-only endpoints: the replica at read_url when set; on a SQLite
+    file, a pool of its own over the same file whose connections refuse writes
+    (in WAL mode they never wait for the writer); the primary otherwise"""
+    if read_url:
+        return create_database_engine(read_url, read_only=True)
+    if primary.dialect.name == "sqlite" and primary.url.database not in (None, "", ":memory:"):
+        return create_database_engine(primary.url.render_as_string(hide_password=False), read_only=True)
+    return primary
+
+
+engine = create_database_engine(DATABASE_URL)
+SessionLocal = create_sessionmaker(engine)
+read_engine = create_read_engine(engine)
+ReadSessionLocal = async_sessionmaker(read_engine, class_=AsyncSession, expire_on_commit=False)
+# Reads from a replica may lag behind the primary; a SQLite read pool sees every commit
+replica_lags = bool(DATABASE_READ_URL)
 
 class Base(DeclarativeBase):
     pass
 
+
+class ReadRouting:
+    """Sends reads to the read engine, except those of a client that wrote within
+    READ_YOUR_WRITES_SECONDS, which stay on the primary.
+
+    Clients are identified by the caller (api.deps uses the rate limit key).
+    The marks live in `storage`, a limits storage every worker sees; its
+    calls run in a thread, off the event loop.
+    """
+
+    def __init__(self, storage, window_seconds: int = READ_YOUR_WRITES_SECONDS):
+        self.storage = storage
+        self.window_seconds = window_seconds
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self.pinned_writes = 0
+        self.mark_errors = 0
+
+    @staticmethod
+    def _key(client: str) -> str:
+        return f"mybiotracker/primary/{client}"
+
+    async def mark_write(self, client: str):
+        try:
+            await asyncio.to_thread(self.storage.incr, self._key(client), self.window_seconds)
+            self.pinned_writes += 1
+        except Exception as e:
+            # Without the mark the client may briefly read its old data, nothing worse
+            self.mark_errors += 1
+            logger.warning(f"Could not pin reads to the primary: {e}")
+
+    async def wrote_recently(self, client: str) -> bool:
+        try:
+            return await asyncio.to_thread(self.storage.get, self._key(client)) > 0
+        except Exception:
+            return True
+
+    async def sessionmaker(self, client: Callable[[], str]) -> async_sessionmaker:
+        """client() gives the client's key; it is only called when reads may lag"""
+        if replica_lags and await self.wrote_recently(client()):
+            self.primary_reads += 1
+            return SessionLocal
+        self.replica_reads += 1
+        return ReadSessionLocal
+
+    def stats(self) -> dict:
+        return {
+            "read_engine": "replica" if DATABASE_READ_URL else ("primary" if read_engine is engine else "read_pool"),
+            "read_your_writes_seconds": self.window_seconds if replica_lags else 0,
+            "read_engine_reads": self.replica_reads,
+            "pinned_primary_reads": self.primary_reads,
+            "pinned_writes": self.pinned_writes,
+            "pin_errors": self.mark_errors,
+        }
+
+
+
+
+@event.listens_for(Session, "after_flush")
+def _flag_write(session, flush_context):
+    session.info["wrote"] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _flag_dml(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["wrote"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _after_write_commit(session):
+    # Sessions opened with info={"on_write_commit": callback} hear about committed writes
+    callback = session.info.get("on_write_commit")
+    if session.info.pop("wrote", False) and callback is not None:
+        callback()
+
+
+@event.listens_for(Session, "after_rollback")
+def _clear_write(session):
+    session.info.pop("wrote", None)
+
+
 async def get_session():
+    """Session on the primary; the request-aware dependencies are in api.deps"""
     async with SessionLocal() as session:
         try:
             yield session
         finally:
             await session.close()
 
+
 # Alias for compatibility with existing code
 get_db = get_session
 
+
+def _pool_stats(pool) -> dict:
+    stats = {"pool": type(pool).__name__}
+    # NullPool and StaticPool keep no counts
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        if hasattr(pool, name):
+            stats[name] = getattr(pool, name)()
+    return stats
+
+
+def pool_stats() -> dict:
+    stats = {"primary": _pool_stats(engine.pool)}
+    if read_engine is not engine:
+        stats["read"] = _pool_stats(read_engine.pool)
+    return stats
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini")
+
+
+def alembic_config(url: str = DATABASE_URL):
+    from alembic.config import Config
+
+    config = Config(ALEMBIC_INI)
+    config.set_main_option("script_location", os.path.join(os.path.dirname(ALEMBIC_INI), "alembic"))
+    config.attributes["database_url"] = async_database_url(url)
+    config.attributes["configure_logger"] = False
+    return config
+
+
+def upgrade_database(url: str = DATABASE_URL, revision: str = "head"):
+    """Run the Alembic migrations up to revision; workers starting together take turns"""
+    from alembic import command
+
+    config = alembic_config(url)
+    os.makedirs("data", exist_ok=True)
+    with open(os.path.join("data", "migrations.lock"), "w") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        command.upgrade(config, revision)
+
+
 async def create_tables():
-    from models.user import User
-    from models.nutrition import FoodItem, NutritionEntry, Meal
-    from models.caffeine import CaffeineEntry, CaffeineProduct
-    
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    # env.py runs its own event loop, so the migrations run in a thread
+    await asyncio.to_thread(upgrade_database)
+    await refresh_statistics()
+
+
+async def refresh_statistics():
+    """Refresh SQLite's planner statistics (PostgreSQL's autovacuum does this on its own).
+
+    Without them SQLite may drive a day's query from all of a user's
+    nutrition entries instead of the range scan on their meals.
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    async with engine.connect() as conn, sqlite_writer():
+        # Sampled, so it stays fast on a large food catalog
+        await conn.exec_driver_sql("PRAGMA analysis_limit=1000")
+        await conn.exec_driver_sql("ANALYZE")
+        await conn.commit()
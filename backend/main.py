@@ -1,56 +1,97 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 import asyncio
+import logging
 import os
 from contextlib import asynccontextmanager
 
-from database import create_tables, get_session
+from database import create_tables, get_session, replica_lags
+from api.deps import ReadYourWritesMiddleware
 from api.auth import router as auth_router
 from api.nutrition import router as nutrition_router
 from api.caffeine import router as caffeine_router
 from api.admin import router as admin_router
 from api.profile import router as profile_router
 from api.reports import router as reports_router
+from services.barcode_decoder import barcode_decoder
 from services.food_db_service import FoodDatabaseService
+from services.food_search import food_search
+from services.food_fuzzy import food_fuzzy
+from services.food_suggest import food_suggest
+from services.import_progress import food_import_progress
+from services.password_hasher import HasherBusy, password_hasher
+from services.rate_limit import limiter, rate_limit_exceeded_handler
 from services.scheduler import start_scheduler
+from services.sql_instrumentation import SQL_INSTRUMENTATION, SQLInstrumentationMiddleware, sql_instrumentation
+from services.token_revocation import token_revocations
 
-limiter = Limiter(key_func=get_remote_address)
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+)
+logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    print("🚀 Starting MyBioTracker...")
+    logger.info("🚀 Starting MyBioTracker...")
     
     try:
         # Initialize database
         await create_tables()
-        print("✅ Database tables created")
+        logger.info("✅ Database tables created")
+        
+        await token_revocations.load()
+        logger.info(f"✅ Token revocation list loaded ({token_revocations.bloom.count} entries)")
+        
+        await food_search.ensure_index()
+        logger.info(f"✅ Food search index ready ({food_search.name})")
+        
+        # Tunes the Argon2 parameters on first start, before the first login waits for it
+        await password_hasher.warm_up()
         
-        # Initialize food database
+        # Initialize food database in the background, the API does not need it to serve traffic
         food_service = FoodDatabaseService()
-        await food_service.initialize_food_database()
-        print("✅ Food database initialized")
+        app.state.food_import_task = asyncio.create_task(initialize_food_database(food_service))
+        logger.info("✅ Food database initialization started")
         
         # Start background scheduler
         start_scheduler()
-        print("✅ Background scheduler started")
+        logger.info("✅ Background scheduler started")
         
-        print("🎉 MyBioTracker started successfully!")
+        app.state.ready = True
+        logger.info("🎉 MyBioTracker started successfully!")
         
     except Exception as e:
-        print(f"❌ Startup error: {e}")
+        logger.exception(f"❌ Startup error: {e}")
         raise
     
     yield
     
     # Shutdown
-    print("Shutting down MyBioTracker...")
+    logger.info("Shutting down MyBioTracker...")
+    app.state.ready = False
+    app.state.food_import_task.cancel()
+    barcode_decoder.shutdown()
+    password_hasher.shutdown()
+
+async def initialize_food_database(food_service: FoodDatabaseService):
+    try:
+        await food_service.initialize_food_database()
+        logger.info("✅ Food database initialized")
+        
+        # Imports rebuild them themselves; a worker that found the catalog ready needs a first
+        # build. Later changes, also those of other workers, are followed by the scheduler
+        await food_suggest.update()
+        await food_fuzzy.update()
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.exception(f"❌ Food database initialization failed: {e}")
 
 app = FastAPI(
     title="MyBioTracker",
@@ -60,7 +101,13 @@ app = FastAPI(
 )
 
 app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+app.state.ready = False
+app.add_exception_handler(RateLimitExceeded, rate_limit_exceeded_handler)
+
+@app.exception_handler(HasherBusy)
+async def password_hasher_busy(request, exc: HasherBusy):
+    return JSONResponse(status_code=503, content={"detail": "Too many login attempts in progress, please try again"},
+                        headers={"Retry-After": "1"})
 
 app.add_middleware(
     CORSMiddleware,
@@ -77,6 +124,15 @@ if os.getenv("ENVIRONMENT") != "development":
         allowed_hosts=["yourdomain.com", "www.yourdomain.com"]
     )
 
+# With a lagging replica, a client that wrote keeps reading from the primary for a while
+if replica_lags:
+    app.add_middleware(ReadYourWritesMiddleware)
+
+# Statement counts and database time per request (Server-Timing header and log line)
+if SQL_INSTRUMENTATION:
+    sql_instrumentation.install()
+    app.add_middleware(SQLInstrumentationMiddleware)
+
 # Include all API routers first
 app.include_router(auth_router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(nutrition_router, prefix="/api/nutrition", tags=["Nutrition"])
@@ -89,6 +145,17 @@ app.include_router(reports_router, prefix="/api/reports", tags=["Reports"])
 async def health_check():
     return {"status": "healthy", "version": "1.0.0"}
 
+@app.get("/api/ready")
+async def readiness_check():
+    """Readiness probe: the API is serving, the food database may still be importing"""
+    food_database = food_import_progress.snapshot()["state"]
+    if not app.state.ready:
+        return JSONResponse(
+            status_code=503,
+            content={"status": "starting", "food_database": food_database}
+        )
+    return {"status": "ready", "food_database": food_database}
+
 @app.get("/api/")
 async def root():
     return {"message": "MyBioTracker API", "version": "1.0.0"}
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, Text, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from database import Base
@@ -22,12 +22,17 @@ class CaffeineProduct(Base):
 
 class CaffeineEntry(Base):
     __tablename__ = "caffeine_entries"
+    __table_args__ = (
+        # Entries are always read per user and time range (see alembic/versions)
+        Index("ix_caffeine_entries_user_consumed", "user_id", "consumed_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     product_id = Column(Integer, ForeignKey("caffeine_products.id"), nullable=False)
     
     consumed_at = Column(DateTime, nullable=False)
+    local_date = Column(Date, nullable=True)  # User's calendar day of consumed_at, set on write
     amount_servings = Column(Float, default=1.0)
     notes = Column(Text, nullable=True)
     
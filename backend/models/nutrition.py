@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Text, DateTime, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, Float, Text, Date, DateTime, ForeignKey, Boolean, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from database import Base
@@ -41,17 +41,27 @@ class FoodItem(Base):
     
     # Meta
     is_verified = Column(Boolean, default=False)
+    source_hash = Column(String(32), nullable=True)  # Fingerprint of imported source data
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
+    __table_args__ = (
+        # Keyset pages of search results, in their ORDER BY (food_search.page_query)
+        Index("ix_food_items_is_verified_name_id", is_verified.desc(), name, id),
+    )
+
 class Meal(Base):
     __tablename__ = "meals"
+    __table_args__ = (
+        Index("ix_meals_user_eaten", "user_id", "eaten_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     name = Column(String(255), nullable=False)
     meal_type = Column(String(50), nullable=False)  # breakfast, lunch, dinner, snack
     eaten_at = Column(DateTime, nullable=False)
+    local_date = Column(Date, nullable=True)  # User's calendar day of eaten_at, set on write
     notes = Column(Text, nullable=True)
     
     created_at = Column(DateTime, server_default=func.now())
@@ -64,6 +74,11 @@ class Meal(Base):
 
 class NutritionEntry(Base):
     __tablename__ = "nutrition_entries"
+    __table_args__ = (
+        # Loading a meal's entries, and a user's entries joined to their meals
+        Index("ix_nutrition_entries_meal_id", "meal_id"),
+        Index("ix_nutrition_entries_user_meal", "user_id", "meal_id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
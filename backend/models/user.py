@@ -26,4 +26,16 @@ class User(Base):
     last_login = Column(DateTime, nullable=True, default=None)
     
     def __repr__(self):
-        return f"<User(id={self.id}, email={self.email}, is_admin={self.is_admin})>"
\ No newline at end of file
+        return f"<User(id={self.id}, email={self.email}, is_admin={self.is_admin})>"
+
+class RevokedToken(Base):
+    """A revoked token (jti) or token family (fam), kept until the tokens it covers expire"""
+    __tablename__ = "revoked_tokens"
+    
+    id = Column(Integer, primary_key=True)
+    token_id = Column(String(64), unique=True, nullable=False)
+    kind = Column(String(10), nullable=False)  # token, family
+    user_id = Column(Integer, nullable=True, index=True)
+    reason = Column(String(20), nullable=False)  # logout, rotated, reuse
+    expires_at = Column(DateTime, nullable=False, index=True)
+    revoked_at = Column(DateTime, server_default=func.now(), nullable=False, index=True)
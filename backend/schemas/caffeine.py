@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
-from datetime import datetime
+from datetime import datetime, date
 
 class CaffeineProductCreate(BaseModel):
     name: str
@@ -31,6 +31,7 @@ class CaffeineEntryResponse(BaseModel):
     id: int
     product_id: int
     consumed_at: datetime
+    local_date: Optional[date] = None
     amount_servings: float
     notes: Optional[str]
     created_at: datetime
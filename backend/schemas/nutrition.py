@@ -34,6 +34,38 @@ class FoodItemResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class FoodSuggestion(BaseModel):
+    id: int
+    name: str
+    brand: Optional[str]
+    is_verified: bool
+
+class FacetCount(BaseModel):
+    value: str
+    count: int
+
+class FoodSearchFacets(BaseModel):
+    brands: List[FacetCount]
+    categories: List[FacetCount]
+
+class FoodSearchPage(BaseModel):
+    items: List[FoodItemResponse]
+    next_cursor: Optional[str] = None
+    facets: Optional[FoodSearchFacets] = None
+
+class BarcodeMatch(BaseModel):
+    barcode: str
+    food: Optional[FoodItemResponse] = None
+
+class ScannedImage(BaseModel):
+    filename: Optional[str]
+    barcodes: List[str]
+    error: Optional[str] = None
+
+class BarcodeLookupResponse(BaseModel):
+    items: List[BarcodeMatch]
+    images: List[ScannedImage]
+
 class MealCreate(BaseModel):
     name: str
     meal_type: str  # breakfast, lunch, dinner, snack
@@ -45,6 +77,7 @@ class MealResponse(BaseModel):
     name: str
     meal_type: str
     eaten_at: datetime
+    local_date: Optional[date] = None
     notes: Optional[str]
     created_at: datetime
     
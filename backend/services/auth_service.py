@@ -2,42 +2,55 @@ from datetime import datetime, timedelta
 from typing import Optional, List
 import json
 import secrets
+import uuid
 import asyncio
-from passlib.context import CryptContext
 from jose import JWTError, jwt
-import pyotp
-import qrcode
 from io import BytesIO
 import base64
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from models.user import User
+from services.identity_cache import identity_cache, invalidate_identities
+from services.optional_deps import optional_module
+from services.password_hasher import password_hasher
 import os
 
+pyotp = optional_module("pyotp", "Two-factor authentication")
+qrcode = optional_module("qrcode", "Two-factor setup", "qrcode[pil]")
+
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key")
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "jwt-secret-key")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 REFRESH_TOKEN_EXPIRE_DAYS = 7
 
-pwd_context = CryptContext(schemes=["argon2"], deprecated="auto")
-
 class AuthService:
     def __init__(self):
-        self.pwd_context = pwd_context
+        self.password_hasher = password_hasher
+    
+    async def verify_password(self, plain_password: str, hashed_password: str) -> bool:
+        return await self.password_hasher.verify(plain_password, hashed_password)
     
-    def verify_password(self, plain_password: str, hashed_password: str) -> bool:
-        return self.pwd_context.verify(plain_password, hashed_password)
+    async def verify_and_update_password(self, plain_password: str, hashed_password: str):
+        """(valid, new hash if the stored one was made with outdated Argon2 parameters)"""
+        return await self.password_hasher.verify_and_update(plain_password, hashed_password)
     
-    def get_password_hash(self, password: str) -> str:
-        return self.pwd_context.hash(password)
+    async def get_password_hash(self, password: str) -> str:
+        return await self.password_hasher.hash(password)
     
     async def get_user_by_email(self, db: AsyncSession, email: str) -> Optional[User]:
         result = await db.execute(select(User).where(User.email == email))
         return result.scalar_one_or_none()
     
+    async def get_user_by_id(self, db: AsyncSession, user_id: int) -> Optional[User]:
+        return await db.get(User, user_id)
+    
+    async def get_all_users(self, db: AsyncSession) -> List[User]:
+        result = await db.execute(select(User).order_by(User.id))
+        return list(result.scalars())
+    
     async def create_user(self, db: AsyncSession, email: str, password: str, is_admin: bool = False) -> User:
-        hashed_password = self.get_password_hash(password)
+        hashed_password = await self.get_password_hash(password)
         user = User(
             email=email,
             hashed_password=hashed_password,
@@ -48,9 +61,25 @@ class AuthService:
         await db.refresh(user)
         return user
     
+    async def change_password(self, db: AsyncSession, user: User, new_password: str):
+        user.hashed_password = await self.get_password_hash(new_password)
+        await db.commit()
+        invalidate_identities()
+    
+    async def toggle_user_active(self, db: AsyncSession, user: User):
+        user.is_active = not user.is_active
+        await db.commit()
+        await db.refresh(user)
+        invalidate_identities()
+    
+    async def delete_user(self, db: AsyncSession, user: User):
+        await db.delete(user)
+        await db.commit()
+        invalidate_identities()
+    
     async def authenticate_user(self, db: AsyncSession, email: str, password: str, totp_code: Optional[str] = None) -> Optional[User]:
         user = await self.get_user_by_email(db, email)
-        if not user or not self.verify_password(password, user.hashed_password):
+        if not user or not await self.verify_password(password, user.hashed_password):
             return None
         
         if user.is_2fa_enabled and user.totp_secret:
@@ -66,21 +95,29 @@ class AuthService:
         
         return user
     
-    def create_access_token(self, data: dict, expires_delta: Optional[timedelta] = None):
+    def new_token_family(self) -> str:
+        """Id shared by the tokens of one login and their refreshed successors"""
+        return uuid.uuid4().hex
+    
+    def create_access_token(self, data: dict, expires_delta: Optional[timedelta] = None, family: Optional[str] = None):
         to_encode = data.copy()
         if expires_delta:
             expire = datetime.utcnow() + expires_delta
         else:
             expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         
-        to_encode.update({"exp": expire, "type": "access"})
+        to_encode.update({"exp": expire, "type": "access", "jti": uuid.uuid4().hex})
+        if family:
+            to_encode["fam"] = family
         encoded_jwt = jwt.encode(to_encode, JWT_SECRET_KEY, algorithm=ALGORITHM)
         return encoded_jwt
     
-    def create_refresh_token(self, data: dict):
+    def create_refresh_token(self, data: dict, family: Optional[str] = None):
         to_encode = data.copy()
         expire = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
-        to_encode.update({"exp": expire, "type": "refresh"})
+        to_encode.update({"exp": expire, "type": "refresh", "jti": uuid.uuid4().hex})
+        if family:
+            to_encode["fam"] = family
         encoded_jwt = jwt.encode(to_encode, JWT_SECRET_KEY, algorithm=ALGORITHM)
         return encoded_jwt
     
@@ -146,6 +183,7 @@ class AuthService:
         user.backup_codes = json.dumps(backup_codes)
         await db.commit()
         await db.refresh(user)
+        invalidate_identities()
     
     async def disable_2fa(self, db: AsyncSession, user: User):
         user.totp_secret = None
@@ -153,67 +191,28 @@ class AuthService:
         user.backup_codes = None
         await db.commit()
         await db.refresh(user)
+        invalidate_identities()
     
     async def handle_failed_login(self, db: AsyncSession, user: User):
         user.failed_login_attempts += 1
         
         # Lock account after 5 failed attempts
-        if user.failed_login_attempts >= 5:
+        locked = user.failed_login_attempts >= 5
+        if locked:
             user.locked_until = datetime.utcnow() + timedelta(minutes=15)
         
         await db.commit()
+        if locked:
+            invalidate_identities()
     
     async def handle_successful_login(self, db: AsyncSession, user: User):
         user.failed_login_attempts = 0
         user.locked_until = None
         user.last_login = datetime.utcnow()
         await db.commit()
+        # Only last_login changed; other workers may show the old one until the TTL
+        identity_cache.discard(user.id)
     
     async def simulate_auth_delay(self):
         # Simulate authentication delay to prevent timing attacks
         await asyncio.sleep(0.5)
-
-# FastAPI Dependencies
-from fastapi import Depends, HTTPException, status
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from database import get_session
-
-security = HTTPBearer()
-auth_service = AuthService()
-
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: AsyncSession = Depends(get_session)
-) -> User:
-    """Get current authenticated user from JWT token"""
-    token = credentials.credentials
-    
-    # Verify token
-    payload = auth_service.verify_token(token, "access")
-    if not payload:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid authentication credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
-    # Get user email from token (consistent with login endpoint)
-    user_email = payload.get("sub")
-    if not user_email:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid authentication credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
-    # Get user by email (consistent with how token was created)
-    user = await auth_service.get_user_by_email(db, user_email)
-    
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
-    return user
@@ -0,0 +1,171 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+
+from services.barcode_preprocess import STAGES, decode_barcodes
+
+# Decoder processes (0 = one per CPU, at most 4)
+BARCODE_DECODE_WORKERS = int(os.getenv("BARCODE_DECODE_WORKERS", "0"))
+# Jobs waiting or running before new scans are turned away (0 = 4 per worker)
+BARCODE_DECODE_QUEUE = int(os.getenv("BARCODE_DECODE_QUEUE", "0"))
+BARCODE_DECODE_TIMEOUT = float(os.getenv("BARCODE_DECODE_TIMEOUT", "5"))
+
+# Recent decode times kept for the percentiles in stats()
+LATENCY_SAMPLES = 500
+
+
+class DecoderBusy(Exception):
+    pass
+
+
+class DecodeTimeout(Exception):
+    pass
+
+
+def decode_image(contents: bytes) -> Tuple[List[str], Optional[str], float]:
+    """Decode all barcodes in an encoded image (runs in a worker process)"""
+    started = time.perf_counter()
+    codes, stage = decode_barcodes(contents)
+    return codes, stage, time.perf_counter() - started
+
+
+class BarcodeDecoderPool:
+    """Runs barcode decoding in a bounded process pool, off the event loop.
+
+    At most `max_pending` jobs are queued or running; further calls raise
+    DecoderBusy right away instead of making every request wait longer. Jobs
+    wait for a free decoder process before they are submitted, so `timeout`
+    only counts the decoding itself. A job that exceeds it raises
+    DecodeTimeout and new jobs go to a fresh pool; the old pool's processes
+    are stopped once the other jobs running in it have finished, so a stuck
+    decoder neither keeps holding a worker nor takes those jobs down with it.
+    """
+
+    def __init__(self, workers: int = BARCODE_DECODE_WORKERS, max_pending: int = BARCODE_DECODE_QUEUE,
+                 timeout: float = BARCODE_DECODE_TIMEOUT):
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.max_pending = max_pending or self.workers * 4
+        self.timeout = timeout
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # One job per decoder process; the rest wait here, outside the timeout
+        self._slots = asyncio.Semaphore(self.workers)
+        # Jobs running per pool, including pools that were replaced
+        self._running: Dict[ProcessPoolExecutor, int] = {}
+
+        self.pending = 0
+        self.max_pending_seen = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.found_by_stage = dict.fromkeys(STAGES + ("none",), 0)
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._decode_seconds = deque(maxlen=LATENCY_SAMPLES)
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    async def decode(self, contents: bytes) -> List[str]:
+        """Barcodes found in the image, in the order the decoder reports them"""
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise DecoderBusy(f"{self.pending} barcode scans already queued")
+
+        self.pending += 1
+        self.max_pending_seen = max(self.max_pending_seen, self.pending)
+        started = time.perf_counter()
+        try:
+            async with self._slots:
+                codes, stage, decode_seconds = await self._run(contents)
+        except DecodeTimeout:
+            self.timeouts += 1
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.pending -= 1
+
+        self.completed += 1
+        self.found_by_stage[stage or "none"] += 1
+        self._latencies.append(time.perf_counter() - started)
+        self._decode_seconds.append(decode_seconds)
+        return codes
+
+    async def _run(self, contents: bytes) -> Tuple[List[str], Optional[str], float]:
+        executor = self._pool()
+        self._running[executor] = self._running.get(executor, 0) + 1
+        try:
+            future = asyncio.get_running_loop().run_in_executor(executor, decode_image, contents)
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            # The job is abandoned; its process is stopped with the pool
+            self._retire(executor)
+            raise DecodeTimeout(f"Barcode decoding took longer than {self.timeout:g}s")
+        except BrokenProcessPool:
+            # A decoder process died, the pool's other jobs failed with it
+            self._retire(executor)
+            raise
+        finally:
+            self._running[executor] -= 1
+            if not self._running[executor]:
+                del self._running[executor]
+                if executor is not self._executor:
+                    _terminate(executor)
+
+    def _retire(self, executor: ProcessPoolExecutor):
+        """Send new jobs to a fresh pool; the old one is stopped when its last job is done"""
+        if self._executor is executor:
+            self._executor = None
+
+    def shutdown(self):
+        for executor in {self._executor, *self._running} - {None}:
+            _terminate(executor)
+        self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queue_depth": self.pending,
+            "max_queue": self.max_pending,
+            "max_queue_seen": self.max_pending_seen,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "retired_pools": len(set(self._running) - {self._executor}),
+            "found_by_stage": self.found_by_stage,
+            "latency_ms": _percentiles(self._latencies),
+            "decode_ms": _percentiles(self._decode_seconds),
+        }
+
+
+def _terminate(executor: ProcessPoolExecutor):
+    # Processes still running a job (a stuck decoder) are stopped so they
+    # do not keep competing for CPU
+    for process in list((getattr(executor, "_processes", None) or {}).values()):
+        process.terminate()
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _percentiles(samples) -> dict:
+    if not samples:
+        return {"p50": None, "p95": None, "max": None}
+    ordered = sorted(samples)
+    return {
+        "p50": round(ordered[len(ordered) // 2] * 1000, 1),
+        "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 1),
+        "max": round(ordered[-1] * 1000, 1),
+    }
+
+
+barcode_decoder = BarcodeDecoderPool()
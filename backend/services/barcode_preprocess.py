@@ -0,0 +1,164 @@
+"""Preprocessing ladder for barcode photos (runs in the decoder processes).
+
+Cheap steps go first and the ladder stops at the first step that finds a
+barcode:
+
+1. reduced   - grayscale decoded at reduced scale, capped at SCAN_MAX_SIDE
+2. regions   - full-resolution crops of the areas that look like barcodes
+3. enhanced  - binarized and rotated variants of those crops
+
+OpenCV, numpy and zbar are imported on first use, so importing this module
+stays cheap for the web workers; only the decoder processes load them.
+"""
+import os
+from typing import Callable, List, Optional, Tuple
+
+from services.optional_deps import optional_module
+
+cv2 = optional_module("cv2", "Barcode scanning", "opencv-python-headless")
+np = optional_module("numpy", "Barcode scanning")
+pyzbar = optional_module("pyzbar.pyzbar", "Barcode scanning", "pyzbar and the zbar library")
+
+# Longest side of the image handed to the first decode attempt
+SCAN_MAX_SIDE = int(os.getenv("BARCODE_SCAN_MAX_SIDE", "1600"))
+# Candidate regions tried per image
+MAX_REGIONS = 3
+# Angles (degrees) tried on the enhanced crops; zbar reads bars up to about
+# 30 degrees off horizontal or vertical
+ROTATIONS = (45, -45)
+
+STAGES = ("reduced", "regions", "enhanced")
+
+Decoder = Callable[[object], List[str]]
+
+
+def zbar_decode(gray) -> List[str]:
+    return [barcode.data.decode("utf-8") for barcode in pyzbar.decode(gray)]
+
+
+def decode_barcodes(contents: bytes, decoder: Optional[Decoder] = None) -> Tuple[List[str], Optional[str]]:
+    """(barcodes, stage that found them); ([], None) when the ladder runs out"""
+    decoder = decoder or zbar_decode
+    buffer = np.frombuffer(contents, np.uint8)
+
+    reduced = _decode_reduced(buffer)
+    if reduced is None:
+        raise ValueError("Unsupported or corrupt image")
+
+    codes = decoder(reduced)
+    if codes:
+        return codes, "reduced"
+
+    regions = _candidate_regions(reduced)
+    crops = []
+    if regions:
+        full = cv2.imdecode(buffer, cv2.IMREAD_GRAYSCALE)
+        scale = full.shape[1] / reduced.shape[1]
+        for region in regions:
+            crop = _crop(full, region, scale)
+            codes = decoder(crop)
+            if codes:
+                return codes, "regions"
+            crops.append(crop)
+
+    for image in crops + [reduced]:
+        for variant in _enhanced_variants(image):
+            codes = decoder(variant)
+            if codes:
+                return codes, "enhanced"
+
+    return [], None
+
+
+def _decode_reduced(buffer):
+    # JPEG decoders scale down while decoding; the file size is a cheap
+    # stand-in for the resolution, which is unknown until decoded
+    if len(buffer) > 2 * 1024 * 1024:
+        flag = cv2.IMREAD_REDUCED_GRAYSCALE_4
+    elif len(buffer) > 512 * 1024:
+        flag = cv2.IMREAD_REDUCED_GRAYSCALE_2
+    else:
+        flag = cv2.IMREAD_GRAYSCALE
+
+    gray = cv2.imdecode(buffer, flag)
+    if gray is None:
+        return None
+
+    longest = max(gray.shape)
+    if longest > SCAN_MAX_SIDE:
+        ratio = SCAN_MAX_SIDE / longest
+        gray = cv2.resize(gray, None, fx=ratio, fy=ratio, interpolation=cv2.INTER_AREA)
+    return gray
+
+
+def _candidate_regions(gray):
+    """Rotated rectangles around areas with strong one-directional gradients"""
+    # Bars give a strong gradient across them and almost none along them
+    grad_x = cv2.Scharr(gray, cv2.CV_32F, 1, 0)
+    grad_y = cv2.Scharr(gray, cv2.CV_32F, 0, 1)
+    gradient = cv2.convertScaleAbs(np.abs(np.abs(grad_x) - np.abs(grad_y)))
+
+    gradient = cv2.blur(gradient, (9, 9))
+    _, mask = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+
+    size = max(9, min(gray.shape) // 40)
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (size, size))
+    mask = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
+    mask = cv2.erode(mask, None, iterations=4)
+    mask = cv2.dilate(mask, None, iterations=4)
+
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    min_area = gray.shape[0] * gray.shape[1] * 0.001
+    contours = [contour for contour in contours if cv2.contourArea(contour) >= min_area]
+    contours.sort(key=cv2.contourArea, reverse=True)
+    return [cv2.minAreaRect(contour) for contour in contours[:MAX_REGIONS]]
+
+
+def _crop(full, region, scale: float):
+    """Upright crop of a rotated rectangle (given in reduced coordinates) from the full image"""
+    (cx, cy), (width, height), angle = region
+    # Pad so the quiet zone around the bars is kept
+    size = (width * scale * 1.3 + 20, height * scale * 1.3 + 20)
+    box = cv2.boxPoints(((cx * scale, cy * scale), size, angle))
+
+    # Only the bounding box of the region is rotated, not the whole photo
+    x0, y0 = np.maximum(np.floor(box.min(axis=0)).astype(int), 0)
+    x1, y1 = np.ceil(box.max(axis=0)).astype(int)
+    area = full[y0:y1, x0:x1]
+    center = (cx * scale - x0, cy * scale - y0)
+
+    matrix = cv2.getRotationMatrix2D(center, angle, 1.0)
+    rotated = cv2.warpAffine(area, matrix, (area.shape[1], area.shape[0]), borderMode=cv2.BORDER_REPLICATE)
+    crop = cv2.getRectSubPix(rotated, (int(size[0]), int(size[1])), center)
+
+    longest = max(crop.shape)
+    if longest > SCAN_MAX_SIDE:
+        ratio = SCAN_MAX_SIDE / longest
+        crop = cv2.resize(crop, None, fx=ratio, fy=ratio, interpolation=cv2.INTER_AREA)
+    return crop
+
+
+def _rotate(image, angle: float):
+    """Rotate on a canvas large enough to keep the corners"""
+    height, width = image.shape
+    matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    cos, sin = abs(matrix[0, 0]), abs(matrix[0, 1])
+    new_width, new_height = int(height * sin + width * cos), int(height * cos + width * sin)
+    matrix[0, 2] += new_width / 2 - width / 2
+    matrix[1, 2] += new_height / 2 - height / 2
+    return cv2.warpAffine(image, matrix, (new_width, new_height), borderValue=255)
+
+
+def _enhanced_variants(gray):
+    """Binarized, sharpened and rotated versions of an image, cheapest first"""
+    _, otsu = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    yield otsu
+
+    blurred = cv2.GaussianBlur(gray, (0, 0), 3)
+    sharpened = cv2.addWeighted(gray, 1.8, blurred, -0.8, 0)
+    yield sharpened
+
+    yield cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 10)
+
+    for angle in ROTATIONS:
+        yield _rotate(otsu, angle)
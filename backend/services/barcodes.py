@@ -0,0 +1,29 @@
+import re
+from typing import Optional
+
+# Numeric retail barcodes: EAN-8, UPC-A, EAN-13 and GTIN-14
+GTIN_LENGTHS = (8, 12, 13, 14)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_barcode(code: Optional[str]) -> Optional[str]:
+    """Canonical form of a barcode, used for storing and looking it up.
+
+    EAN-8, UPC-A and EAN-13 are the same GTIN-13 number with a different
+    amount of leading zeros, so they are zero padded to 13 digits. GTIN-14
+    codes with packaging indicator 0 are shortened to 13 digits. Anything
+    else (QR payloads, internal codes) is only stripped of whitespace.
+    """
+    if code is None:
+        return None
+    code = _WHITESPACE.sub("", code)
+    if not code:
+        return None
+
+    if code.isascii() and code.isdigit() and len(code) in GTIN_LENGTHS:
+        if len(code) == 14:
+            return code[1:] if code[0] == "0" else code
+        return code.zfill(13)
+    return code[:20]
+
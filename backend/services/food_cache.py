@@ -0,0 +1,140 @@
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+from services.import_progress import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+FOOD_CACHE_MAX_ENTRIES = int(os.getenv("FOOD_CACHE_MAX_ENTRIES", "5000"))
+FOOD_CACHE_TTL_SECONDS = float(os.getenv("FOOD_CACHE_TTL_SECONDS", "300"))
+
+# How often a worker looks at the shared version file for bumps made by others
+VERSION_CHECK_INTERVAL = 1.0
+
+# Cached in place of a value to remember that a lookup found nothing
+MISSING = object()
+
+
+class CatalogVersion:
+    """Version number of the food catalog (or another shared dataset), shared by all workers.
+
+    bump() writes a new version into data/catalog.version; other workers
+    notice it within VERSION_CHECK_INTERVAL by checking the file's mtime.
+    """
+
+    def __init__(self, path: str = os.path.join(DATA_DIR, "catalog.version")):
+        self.path = path
+        self.value = 0
+        self._mtime = None
+        self._checked_at = 0.0
+
+    def current(self) -> int:
+        now = time.monotonic()
+        if now - self._checked_at >= VERSION_CHECK_INTERVAL:
+            self._checked_at = now
+            self._reload()
+        return self.value
+
+    def bump(self) -> int:
+        self.value = max(self.value + 1, time.time_ns())
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write(str(self.value))
+            os.replace(tmp_path, self.path)
+            self._mtime = os.stat(self.path).st_mtime_ns
+        except OSError as e:
+            logger.warning(f"Could not write catalog version: {e}")
+        return self.value
+
+    def _reload(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            if mtime == self._mtime:
+                return
+            with open(self.path) as f:
+                self.value = int(f.read().strip() or 0)
+            self._mtime = mtime
+        except (OSError, ValueError):
+            pass
+
+
+class VersionedLRUCache:
+    """Bounded LRU cache with a TTL whose keys include the catalog version.
+
+    Bumping the version makes every existing entry unreachable at once; the
+    stale entries are then pushed out by normal LRU eviction.
+    """
+
+    def __init__(self, version: CatalogVersion, max_entries: int = FOOD_CACHE_MAX_ENTRIES,
+                 ttl: float = FOOD_CACHE_TTL_SECONDS):
+        self.version = version
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, version: Optional[int] = None) -> Tuple[bool, Optional[Any]]:
+        """(found, value); value is MISSING for a cached negative result.
+
+        A lookup that loads and set()s the value on a miss reads the version
+        once before get() and passes it to both: a bump in between then leaves
+        the loaded value under the old version instead of the new one.
+        """
+        versioned_key = (self.version.current() if version is None else version, key)
+        entry = self._entries.get(versioned_key)
+        if entry is None:
+            self.misses += 1
+            return False, None
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[versioned_key]
+            self.expirations += 1
+            self.misses += 1
+            return False, None
+
+        self._entries.move_to_end(versioned_key)
+        self.hits += 1
+        if value is MISSING:
+            self.negative_hits += 1
+        return True, value
+
+    def set(self, key: Hashable, value: Any, version: Optional[int] = None):
+        versioned_key = (self.version.current() if version is None else version, key)
+        self._entries[versioned_key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(versioned_key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def discard(self, key: Hashable):
+        """Drop one entry in this worker only; bump the version to reach all workers"""
+        self._entries.pop((self.version.current(), key), None)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "catalog_version": self.version.value,
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+        }
+
+
+catalog_version = CatalogVersion()
+food_cache = VersionedLRUCache(catalog_version)
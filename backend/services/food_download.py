@@ -0,0 +1,253 @@
+import asyncio
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+import aiofiles
+import httpx
+
+# Downloaded data is written in blocks of this size
+DOWNLOAD_BUFFER_SIZE = int(os.getenv("FOOD_DOWNLOAD_BUFFER_SIZE", str(4 * 1024 * 1024)))
+DOWNLOAD_TIMEOUT = float(os.getenv("FOOD_DOWNLOAD_TIMEOUT", "30"))
+
+ProgressCallback = Callable[[int, Optional[int]], None]
+
+
+class DownloadError(Exception):
+    pass
+
+
+@dataclass
+class DownloadResult:
+    """Outcome of FoodDumpDownloader.download"""
+    path: str
+    not_modified: bool
+    size: int
+    sha256: Optional[str] = None
+    resumed_from: int = 0
+
+
+class FoodDumpDownloader:
+    """Async, resumable downloader for the OpenFoodFacts dump.
+
+    The response is streamed into `<dest>.part` and moved over `dest` with an
+    atomic rename once the size and checksum check out. Validators of the
+    finished download are kept in `<dest>.meta.json`, so an unchanged dump is
+    answered with 304 instead of being fetched again, and the validators of
+    an interrupted download in `<dest>.part.json`, so it resumes with an HTTP
+    Range request guarded by If-Range. A 416 answer means the partial file
+    already holds the whole dump (the process stopped before the rename): it
+    is moved into place when it checks out, removed and fetched again if not.
+
+    Pass `transport` (e.g. httpx.MockTransport) to run against a local
+    stand-in instead of the real server.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        dest: str,
+        expected_sha256: Optional[str] = None,
+        checksum_url: Optional[str] = None,
+        buffer_size: int = DOWNLOAD_BUFFER_SIZE,
+        timeout: float = DOWNLOAD_TIMEOUT,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.url = url
+        self.dest = dest
+        self.part_path = f"{dest}.part"
+        self.meta_path = f"{dest}.meta.json"
+        self.part_meta_path = f"{dest}.part.json"
+        self.expected_sha256 = expected_sha256.lower() if expected_sha256 else None
+        self.checksum_url = checksum_url
+        self.buffer_size = buffer_size
+        self.timeout = httpx.Timeout(timeout, read=timeout * 4)
+        self.transport = transport
+
+    async def download(self, progress: Optional[ProgressCallback] = None) -> DownloadResult:
+        os.makedirs(os.path.dirname(self.dest) or ".", exist_ok=True)
+
+        async with httpx.AsyncClient(
+            timeout=self.timeout, transport=self.transport, follow_redirects=True
+        ) as client:
+            expected_sha256 = self.expected_sha256 or await self._fetch_checksum(client)
+            result = await self._download(client, expected_sha256, progress)
+            if result is None:
+                # The partial file was unusable and is gone: fetch the whole dump
+                result = await self._download(client, expected_sha256, progress)
+        if result is None:
+            raise DownloadError("Server rejected the download range")
+        return result
+
+    async def _download(self, client, expected_sha256, progress) -> Optional[DownloadResult]:
+        """One request; None when a partial file was rejected and removed"""
+        offset, headers = self._request_headers()
+
+        async with client.stream("GET", self.url, headers=headers) as response:
+            if response.status_code == 304:
+                meta = _read_json(self.meta_path)
+                return DownloadResult(
+                    self.dest, True, os.path.getsize(self.dest), meta.get("sha256")
+                )
+
+            if response.status_code == 416 and offset:
+                # Nothing past the partial file: it is complete (the process stopped
+                # before the rename) or no longer matches the dump
+                return await self._complete_part(offset, _content_range_total(response), expected_sha256)
+
+            if response.status_code == 206:
+                total = _content_range_total(response)
+            elif response.status_code == 200:
+                # Server ignored the Range (or the validator changed): start over
+                offset = 0
+                total = _int_or_none(response.headers.get("content-length"))
+            else:
+                response.raise_for_status()
+                raise DownloadError(f"Unexpected status {response.status_code}")
+
+            validators = {
+                "etag": response.headers.get("etag"),
+                "last_modified": response.headers.get("last-modified"),
+            }
+            _write_json(self.part_meta_path, validators)
+
+            digest = await self._hash_existing(offset)
+            size = await self._stream_to_part(response, offset, total, digest, progress)
+
+        if total is not None and size != total:
+            raise DownloadError(f"Incomplete download: {size} of {total} bytes")
+
+        sha256 = digest.hexdigest()
+        if expected_sha256 and sha256 != expected_sha256:
+            # A corrupt partial file must not be resumed
+            _remove(self.part_path, self.part_meta_path)
+            raise DownloadError(f"Checksum mismatch: expected {expected_sha256}, got {sha256}")
+
+        self._promote(validators, sha256, size)
+        return DownloadResult(self.dest, False, size, sha256, resumed_from=offset)
+
+    async def _complete_part(self, size: int, total: Optional[int],
+                             expected_sha256: Optional[str]) -> Optional[DownloadResult]:
+        """Promote a partial file the server says is whole; remove it otherwise"""
+        validators = _read_json(self.part_meta_path)
+        if total == size:
+            sha256 = (await self._hash_existing(size)).hexdigest()
+            if not expected_sha256 or sha256 == expected_sha256:
+                self._promote(validators, sha256, size)
+                return DownloadResult(self.dest, False, size, sha256, resumed_from=size)
+        _remove(self.part_path, self.part_meta_path)
+        return None
+
+    def _promote(self, validators: dict, sha256: str, size: int):
+        os.replace(self.part_path, self.dest)
+        _write_json(self.meta_path, {**validators, "sha256": sha256, "size": size, "url": self.url})
+        _remove(self.part_meta_path)
+
+    def _request_headers(self):
+        headers = {}
+
+        part_meta = _read_json(self.part_meta_path)
+        validator = part_meta.get("etag") or part_meta.get("last_modified")
+        if os.path.exists(self.part_path) and validator:
+            offset = os.path.getsize(self.part_path)
+            headers["Range"] = f"bytes={offset}-"
+            headers["If-Range"] = validator
+            return offset, headers
+
+        meta = _read_json(self.meta_path)
+        if os.path.exists(self.dest) and meta.get("url") == self.url:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+        return 0, headers
+
+    async def _fetch_checksum(self, client: httpx.AsyncClient) -> Optional[str]:
+        if not self.checksum_url:
+            return None
+        response = await client.get(self.checksum_url)
+        response.raise_for_status()
+        # sha256sum format: "<hex digest>  <file name>"
+        return response.text.split()[0].lower()
+
+    async def _hash_existing(self, offset: int):
+        digest = hashlib.sha256()
+        if offset:
+            await asyncio.to_thread(_hash_file_prefix, self.part_path, offset, digest)
+        return digest
+
+    async def _stream_to_part(self, response, offset, total, digest, progress) -> int:
+        size = offset
+        buffer = bytearray()
+
+        async with aiofiles.open(self.part_path, "ab" if offset else "wb") as f:
+            async for chunk in response.aiter_bytes():
+                buffer += chunk
+                if len(buffer) >= self.buffer_size:
+                    size += await self._flush(f, buffer, digest)
+                    if progress:
+                        progress(size, total)
+
+            size += await self._flush(f, buffer, digest)
+        if progress:
+            progress(size, total)
+        return size
+
+    @staticmethod
+    async def _flush(f, buffer: bytearray, digest) -> int:
+        if not buffer:
+            return 0
+        data = bytes(buffer)
+        buffer.clear()
+        digest.update(data)
+        await f.write(data)
+        return len(data)
+
+
+def _hash_file_prefix(path: str, length: int, digest):
+    with open(path, "rb") as f:
+        remaining = length
+        while remaining:
+            data = f.read(min(remaining, DOWNLOAD_BUFFER_SIZE))
+            if not data:
+                raise DownloadError("Partial download is shorter than expected")
+            digest.update(data)
+            remaining -= len(data)
+
+
+def _content_range_total(response: httpx.Response) -> Optional[int]:
+    # Content-Range: bytes 100-999/1000
+    content_range = response.headers.get("content-range", "")
+    return _int_or_none(content_range.rpartition("/")[2])
+
+
+def _int_or_none(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _read_json(path: str) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_json(path: str, data: dict):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _remove(*paths: str):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
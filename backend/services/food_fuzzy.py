@@ -0,0 +1,220 @@
+import asyncio
+import math
+import os
+import sys
+import time
+from array import array
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+
+from models.nutrition import FoodItem
+from services.food_cache import CatalogVersion
+from services.food_index import CatalogIndex
+from services.food_suggest import normalize
+from services.optional_deps import optional_module
+
+np = optional_module("numpy", "Fuzzy food search")
+
+# Minimum share of the query's trigrams a name must contain to be returned
+FUZZY_THRESHOLD = float(os.getenv("FOOD_FUZZY_THRESHOLD", "0.5"))
+
+# Upper bound on stored postings (4 bytes each); rebuilds load verified foods first
+FUZZY_MAX_POSTINGS = int(os.getenv("FOOD_FUZZY_MAX_POSTINGS", "25000000"))
+
+# Postings read per query while collecting candidates, keeps the worst case bounded
+FUZZY_SCAN_BUDGET = 300000
+
+# Candidates per requested result that get the exact similarity score
+CANDIDATE_FACTOR = 5
+
+FUZZY_LOAD_BATCH_SIZE = 50000
+# Changed foods added per event loop turn by updates
+FUZZY_APPLY_BATCH_SIZE = 1000
+
+
+def trigrams(value: str) -> Set[str]:
+    """pg_trgm style trigrams: each word padded with two spaces in front and one behind"""
+    grams = set()
+    for word in value.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class FoodFuzzyIndex(CatalogIndex):
+    """Trigram inverted index over normalized food names for typo-tolerant search.
+
+    Each trigram maps to an array of food slots. A name matches when it
+    contains at least FUZZY_THRESHOLD of the query's trigrams; the posting
+    lists of the query are counted rarest first within a fixed budget of
+    postings, which bounds the work per query regardless of catalog size.
+
+    Updates add changed foods in new slots and mark their old slots with
+    food id 0; the postings of those stay until the next rebuild.
+    """
+
+    name = "fuzzy"
+
+    def __init__(self, threshold: float = FUZZY_THRESHOLD, max_postings: int = FUZZY_MAX_POSTINGS,
+                 version: Optional[CatalogVersion] = None):
+        self.threshold = threshold
+        self.max_postings = max_postings
+        super().__init__(version)
+
+    @staticmethod
+    def _empty():
+        # postings, food ids, trigram count per name, verified flags, posting total
+        return {}, array("I"), array("H"), bytearray(), [0]
+
+    @staticmethod
+    def _food_ids(data):
+        return data[1]
+
+    def search(self, q: str, limit: int = 20) -> List[Tuple[int, float]]:
+        """(food id, score) of the best near-matches for q, best first"""
+        postings, food_ids, gram_counts, verified, _ = self._data
+        grams = trigrams(normalize(q))
+        if not grams:
+            return []
+
+        lists = sorted((postings[gram] for gram in grams if gram in postings), key=len)
+        needed = max(1, math.ceil(self.threshold * len(grams)))
+
+        # Count shared trigrams per name, rarest trigrams first. Lists that do
+        # not fit the scan budget are skipped and treated as possible matches,
+        # so very common trigrams cannot make a query slow
+        scanned = []
+        budget = FUZZY_SCAN_BUDGET
+        for postings_list in lists:
+            if len(postings_list) > budget:
+                break
+            scanned.append(np.frombuffer(postings_list, dtype=np.uint32))
+            budget -= len(postings_list)
+        if not scanned:
+            return []
+        # Trigrams nobody has do not count towards `unscanned`
+        unscanned = len(lists) - len(scanned)
+
+        counts = np.bincount(np.concatenate(scanned))
+        candidates = np.flatnonzero(counts >= needed - unscanned)
+        keep = limit * CANDIDATE_FACTOR
+        if len(candidates) > keep:
+            candidates = candidates[np.argpartition(counts[candidates], -keep)[-keep:]]
+
+        scored = []
+        for slot in candidates.tolist():
+            if not food_ids[slot]:
+                continue
+            count = int(counts[slot])
+            # Share of the query found in the name, ties broken by overall
+            # similarity so shorter names win
+            similarity = count / (len(grams) + gram_counts[slot] - count)
+            scored.append((count / len(grams), similarity, verified[slot], slot))
+
+        scored.sort(reverse=True)
+        return [(food_ids[slot], round(score, 3)) for score, _, _, slot in scored[:limit]]
+
+    def add(self, food: FoodItem):
+        """Add a newly created food; ignored once the index is full"""
+        if self._lock.locked():
+            # Replayed on top of the rebuilt index
+            self._pending.append(food)
+        if not self._add(self._data, food.id, food.name, food.is_verified):
+            self.skipped += 1
+
+    def _add(self, data, food_id: int, name: str, is_verified: bool) -> bool:
+        postings, food_ids, gram_counts, verified, total = data
+        grams = trigrams(normalize(name))
+        if not grams:
+            return True
+        if total[0] + len(grams) > self.max_postings:
+            return False
+
+        slot = len(food_ids)
+        food_ids.append(food_id)
+        gram_counts.append(min(len(grams), 0xFFFF))
+        verified.append(bool(is_verified))
+        for gram in grams:
+            postings_list = postings.get(gram)
+            if postings_list is None:
+                postings[gram] = postings_list = array("I")
+            postings_list.append(slot)
+        total[0] += len(grams)
+        return True
+
+    def _add_batch(self, data, rows: Iterable) -> int:
+        added = 0
+        for row in rows:
+            if self._add(data, row.id, row.name, row.is_verified):
+                added += 1
+        return added
+
+    async def _load(self, db):
+        """All foods up to max_postings, verified foods first"""
+        data = self._empty()
+        loaded = 0
+        for is_verified in (True, False):
+            last_id = 0
+            while data[4][0] < self.max_postings:
+                result = await db.execute(
+                    select(*self.columns)
+                    .where(FoodItem.is_verified == is_verified, FoodItem.id > last_id)
+                    .order_by(FoodItem.id)
+                    .limit(FUZZY_LOAD_BATCH_SIZE)
+                )
+                batch = result.all()
+                if not batch:
+                    break
+                last_id = batch[-1].id
+                loaded += await asyncio.to_thread(self._add_batch, data, batch)
+        return data, loaded
+
+    async def _apply(self, rows):
+        # In place on the event loop: search() reads the posting arrays through
+        # numpy buffers, which arrays growing in another thread would break
+        food_ids = self._data[1]
+        changed = {row.id for row in rows}
+        for slot, food_id in enumerate(food_ids):
+            if food_id in changed:
+                food_ids[slot] = 0
+                self.dropped += 1
+        await asyncio.sleep(0)
+
+        for start in range(0, len(rows), FUZZY_APPLY_BATCH_SIZE):
+            batch = rows[start:start + FUZZY_APPLY_BATCH_SIZE]
+            self.skipped += len(batch) - self._add_batch(self._data, batch)
+            await asyncio.sleep(0)
+
+    def load(self, rows: Iterable):
+        """Build the index from (id, name, is_verified) rows already in memory"""
+        data = self._empty()
+        self._add_batch(data, rows)
+        self._set_data(*data)
+        self.built_at = time.time()
+
+    def memory_bytes(self) -> int:
+        """Approximate size of the index data"""
+        postings, food_ids, gram_counts, verified, _ = self._data
+        total = sys.getsizeof(postings) + len(verified)
+        total += food_ids.itemsize * len(food_ids) + gram_counts.itemsize * len(gram_counts)
+        total += sum(sys.getsizeof(gram) + sys.getsizeof(p) for gram, p in postings.items())
+        return total
+
+    def stats(self) -> Dict:
+        postings, _, _, _, total = self._data
+        return {
+            "foods": self.foods,
+            "trigrams": len(postings),
+            "postings": total[0],
+            "max_postings": self.max_postings,
+            "skipped_foods": self.skipped,
+            "dropped_slots": self.dropped,
+            "memory_bytes": self.memory_bytes(),
+            "build_seconds": round(self.build_seconds, 2),
+            "built_at": self.built_at,
+            "updated_at": self.updated_at,
+        }
+
+
+food_fuzzy = FoodFuzzyIndex()
@@ -0,0 +1,347 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import AsyncIterable, Callable, Iterable, List, Optional, Tuple, Union
+
+from sqlalchemy import Table, func, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from database import engine as default_engine, sqlite_writer
+from models.nutrition import FoodItem
+from services.barcodes import normalize_barcode
+
+logger = logging.getLogger(__name__)
+
+FOOD_IMPORT_BATCH_SIZE = int(os.getenv("FOOD_IMPORT_BATCH_SIZE", "5000"))
+
+# Column order of the compact row tuples produced by the parsers and consumed
+# by FoodBulkLoader. Every nutrient column is listed explicitly so COPY (which
+# skips Python-side column defaults) writes the same values as insert().
+FOOD_IMPORT_COLUMNS = (
+    "barcode", "name", "brand", "category",
+    "calories_per_100g", "protein_per_100g", "carbs_per_100g", "fat_per_100g",
+    "fiber_per_100g", "sugar_per_100g", "sodium_per_100g",
+    "vitamin_a_per_100g", "vitamin_c_per_100g", "vitamin_d_per_100g",
+    "vitamin_e_per_100g", "vitamin_k_per_100g", "vitamin_b1_per_100g",
+    "vitamin_b2_per_100g", "vitamin_b3_per_100g", "vitamin_b6_per_100g",
+    "vitamin_b12_per_100g", "folate_per_100g", "calcium_per_100g",
+    "iron_per_100g", "magnesium_per_100g", "zinc_per_100g", "potassium_per_100g",
+    "is_verified", "source_hash",
+)
+BARCODE_INDEX = FOOD_IMPORT_COLUMNS.index("barcode")
+SOURCE_HASH_INDEX = FOOD_IMPORT_COLUMNS.index("source_hash")
+
+# OpenFoodFacts nutriment keys for the columns we import from the dump
+OFF_NUTRIMENT_KEYS = {
+    "calories_per_100g": "energy-kcal_100g",
+    "protein_per_100g": "proteins_100g",
+    "carbs_per_100g": "carbohydrates_100g",
+    "fat_per_100g": "fat_100g",
+    "fiber_per_100g": "fiber_100g",
+    "sugar_per_100g": "sugars_100g",
+    "sodium_per_100g": "sodium_100g",
+    "vitamin_c_per_100g": "vitamin-c_100g",
+    "calcium_per_100g": "calcium_100g",
+    "iron_per_100g": "iron_100g",
+}
+
+FoodRow = Tuple
+
+# Default SQLite limit on bound parameters per statement (raised in 3.32)
+SQLITE_MAX_VARIABLES = 32766 if sqlite3.sqlite_version_info >= (3, 32, 0) else 999
+
+
+def is_valid_product(product: dict) -> bool:
+    """Check if product has required nutritional data"""
+    nutriments = product.get('nutriments') or {}
+    energy = nutriments.get('energy-kcal_100g')
+
+    try:
+        return bool(product.get('product_name')) and energy is not None and float(energy) > 0
+    except (ValueError, TypeError):
+        return False
+
+
+def product_to_row(product: dict) -> Optional[FoodRow]:
+    """Convert an OpenFoodFacts product into a FOOD_IMPORT_COLUMNS tuple"""
+    try:
+        nutriments = product.get('nutriments') or {}
+        categories = product.get('categories_tags')
+
+        values = {
+            "barcode": normalize_barcode(product.get('code')),
+            "name": product.get('product_name', '').strip()[:255],
+            "brand": product.get('brands', '').strip()[:255] if product.get('brands') else None,
+            "category": categories[0].replace('en:', '').strip()[:100] if categories else None,
+            "is_verified": False,
+        }
+        for column, key in OFF_NUTRIMENT_KEYS.items():
+            values[column] = float(nutriments.get(key, 0) or 0)
+
+        return food_row(values)
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+
+def food_row(values: dict) -> FoodRow:
+    """Build a row tuple from a column -> value mapping, defaulting nutrients to 0.
+
+    The last element is a fingerprint of the other values, used by delta
+    refreshes to skip products whose content has not changed.
+    """
+    row = tuple(
+        values.get(column, None if column in ("barcode", "brand", "category") else 0)
+        for column in FOOD_IMPORT_COLUMNS[:SOURCE_HASH_INDEX]
+    )
+    return row + (hashlib.blake2b(repr(row).encode(), digest_size=16).hexdigest(),)
+
+
+@dataclass
+class ImportStats:
+    """Counters reported by FoodBulkLoader"""
+    rows: int = 0
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    batches: int = 0
+    write_seconds: float = 0.0
+    started_at: float = field(default_factory=time.perf_counter)
+    finished_at: Optional[float] = None
+
+    @property
+    def skipped(self) -> int:
+        return self.rows - self.inserted - self.updated - self.unchanged
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished_at or time.perf_counter()) - self.started_at
+
+    @property
+    def rows_per_sec(self) -> float:
+        elapsed = self.elapsed
+        return self.rows / elapsed if elapsed > 0 else 0.0
+
+    def summary(self) -> str:
+        return (
+            f"{self.inserted} inserted, {self.updated} updated, {self.unchanged} unchanged, "
+            f"{self.skipped} skipped of {self.rows} rows "
+            f"in {self.batches} batches, {self.elapsed:.1f}s ({self.rows_per_sec:.0f} rows/sec)"
+        )
+
+
+class FoodBulkLoader:
+    """Set-based bulk writer for food_items (or its staging copy).
+
+    Rows are FOOD_IMPORT_COLUMNS tuples. On PostgreSQL (asyncpg) each batch is
+    streamed with COPY into a temporary table and merged with a single
+    INSERT ... SELECT; on SQLite batches are written as multi-row INSERT
+    statements. A row whose barcode already exists updates that product when
+    its source_hash differs, keeping the product's id.
+
+    Each batch is committed on its own so the write lock is only held
+    briefly; imports write into a staging table (see CatalogStaging), which
+    makes the load as a whole atomic for readers.
+
+    With upsert=True the loader performs a delta refresh instead: rows are
+    compared against the stored source_hash of their barcode, unchanged ones
+    are skipped and only new or changed products are written with
+    INSERT ... ON CONFLICT (barcode) DO UPDATE.
+    """
+
+    def __init__(
+        self,
+        engine: Optional[AsyncEngine] = None,
+        batch_size: int = FOOD_IMPORT_BATCH_SIZE,
+        progress_every: int = 50000,
+        upsert: bool = False,
+        on_batch: Optional[Callable[[ImportStats], None]] = None,
+        table: Optional[Table] = None,
+    ):
+        self.engine = engine or default_engine
+        self.upsert = upsert
+        self.on_batch = on_batch
+        self.batch_size = batch_size
+        self.progress_every = progress_every
+        self.table = table if table is not None else FoodItem.__table__
+        self.dialect = self.engine.dialect.name
+        self.driver = self.engine.dialect.driver
+
+    async def load(self, rows: Union[Iterable[FoodRow], AsyncIterable[FoodRow]]) -> ImportStats:
+        """Load a stream of row tuples, batching them by batch_size"""
+        return await self.load_batches(self._batched(rows))
+
+    async def load_batches(
+        self, batches: Union[Iterable[List[FoodRow]], AsyncIterable[List[FoodRow]]]
+    ) -> ImportStats:
+        """Load an already batched stream of row tuples"""
+        stats = ImportStats()
+        next_report = self.progress_every
+
+        async for batch in _aiter(batches):
+            if not batch:
+                continue
+
+            write_started = time.perf_counter()
+            # Queued with the worker's other writers; requests get the lock between batches
+            async with self.engine.begin() as conn, sqlite_writer(self.engine):
+                if self.upsert:
+                    await self._upsert_batch(conn, batch, stats)
+                else:
+                    stats.inserted += await self._write_batch(conn, batch)
+            stats.write_seconds += time.perf_counter() - write_started
+            stats.rows += len(batch)
+            stats.batches += 1
+            if self.on_batch:
+                self.on_batch(stats)
+
+            if stats.rows >= next_report:
+                logger.info(f"Imported {stats.rows} rows ({stats.rows_per_sec:.0f} rows/sec)...")
+                next_report += self.progress_every
+
+        stats.finished_at = time.perf_counter()
+        logger.info(f"Bulk load finished: {stats.summary()}")
+        return stats
+
+    async def _batched(self, rows):
+        batch = []
+        async for row in _aiter(rows):
+            if row is None:
+                continue
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    @property
+    def _uses_copy(self) -> bool:
+        return self.dialect == "postgresql" and self.driver == "asyncpg"
+
+    async def _write_batch(self, conn: AsyncConnection, batch: List[FoodRow]) -> int:
+        if self._uses_copy:
+            return await self._copy_batch(conn, batch)
+        if self.dialect == "sqlite":
+            return await self._multirow_insert(conn, batch)
+        return await self._executemany_insert(conn, batch)
+
+    async def _copy_batch(self, conn: AsyncConnection, batch: List[FoodRow]) -> int:
+        columns = ", ".join(FOOD_IMPORT_COLUMNS)
+        raw = await conn.get_raw_connection()
+
+        # Only the imported columns, without defaults: LIKE ... INCLUDING DEFAULTS
+        # would copy id's nextval() and draw a sequence value for every row
+        await conn.execute(text(
+            "CREATE TEMPORARY TABLE food_items_import ON COMMIT DROP AS "
+            f"SELECT {columns} FROM {self.table.name} WITH NO DATA"
+        ))
+        await raw.driver_connection.copy_records_to_table(
+            "food_items_import", records=batch, columns=list(FOOD_IMPORT_COLUMNS)
+        )
+        result = await conn.execute(text(
+            f"INSERT INTO {self.table.name} ({columns}) "
+            f"SELECT {columns} FROM food_items_import "
+            f"{_on_barcode_conflict(self.table.name, 'EXCLUDED', 'IS DISTINCT FROM')}"
+        ))
+        return result.rowcount
+
+    async def _multirow_insert(self, conn: AsyncConnection, batch: List[FoodRow]) -> int:
+        rows_per_statement = max(1, SQLITE_MAX_VARIABLES // len(FOOD_IMPORT_COLUMNS))
+        inserted = 0
+
+        for start in range(0, len(batch), rows_per_statement):
+            chunk = batch[start:start + rows_per_statement]
+            result = await conn.exec_driver_sql(
+                _sqlite_multirow_insert(self.table.name, len(chunk)),
+                tuple(value for row in chunk for value in row),
+            )
+            inserted += result.rowcount
+        return inserted
+
+    async def _upsert_batch(self, conn: AsyncConnection, batch: List[FoodRow], stats: ImportStats):
+        # Products without a barcode cannot be matched and are skipped
+        incoming = {row[BARCODE_INDEX]: row for row in batch if row[BARCODE_INDEX]}
+        if not incoming:
+            return
+
+        existing = {}
+        barcodes = list(incoming)
+        for start in range(0, len(barcodes), SQLITE_MAX_VARIABLES):
+            result = await conn.execute(
+                select(self.table.c.barcode, self.table.c.source_hash)
+                .where(self.table.c.barcode.in_(barcodes[start:start + SQLITE_MAX_VARIABLES]))
+            )
+            existing.update(result.all())
+
+        changed = []
+        for barcode, row in incoming.items():
+            if barcode not in existing:
+                stats.inserted += 1
+            elif existing[barcode] != row[SOURCE_HASH_INDEX]:
+                stats.updated += 1
+            else:
+                stats.unchanged += 1
+                continue
+            changed.append(dict(zip(FOOD_IMPORT_COLUMNS, row)))
+
+        if changed:
+            await conn.execute(self._upsert_statement(), changed)
+
+    def _upsert_statement(self):
+        if self.dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+
+        stmt = dialect_insert(self.table)
+        return stmt.on_conflict_do_update(
+            index_elements=[self.table.c.barcode],
+            set_={
+                **{column: stmt.excluded[column] for column in FOOD_IMPORT_COLUMNS if column != "barcode"},
+                "updated_at": func.now(),
+            },
+            where=self.table.c.source_hash.is_distinct_from(stmt.excluded.source_hash),
+        )
+
+    async def _executemany_insert(self, conn: AsyncConnection, batch: List[FoodRow]) -> int:
+        result = await conn.execute(
+            self._upsert_statement(),
+            [dict(zip(FOOD_IMPORT_COLUMNS, row)) for row in batch],
+        )
+        return max(result.rowcount, 0)
+
+
+def _on_barcode_conflict(table_name: str, excluded: str, distinct: str) -> str:
+    """Upsert clause updating a product whose imported source_hash changed"""
+    assignments = ", ".join(
+        f"{column} = {excluded}.{column}" for column in FOOD_IMPORT_COLUMNS if column != "barcode"
+    )
+    return (
+        f"ON CONFLICT (barcode) DO UPDATE SET {assignments}, updated_at = CURRENT_TIMESTAMP "
+        f"WHERE {table_name}.source_hash {distinct} {excluded}.source_hash"
+    )
+
+
+@lru_cache(maxsize=8)
+def _sqlite_multirow_insert(table_name: str, row_count: int) -> str:
+    """Multi-row upsert with row_count VALUES groups, cached per size"""
+    placeholders = "(" + ", ".join("?" * len(FOOD_IMPORT_COLUMNS)) + ")"
+    return (
+        f"INSERT INTO {table_name} ({', '.join(FOOD_IMPORT_COLUMNS)}) "
+        f"VALUES {', '.join([placeholders] * row_count)} "
+        f"{_on_barcode_conflict(table_name, 'excluded', 'IS NOT')}"
+    )
+
+
+async def _aiter(iterable):
+    """Iterate a sync or async iterable from async code"""
+    if hasattr(iterable, "__aiter__"):
+        async for item in iterable:
+            yield item
+    else:
+        for item in iterable:
+            yield item
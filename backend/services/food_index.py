@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, select
+
+from database import SessionLocal
+from models.nutrition import FoodItem
+from services.food_cache import CatalogVersion, catalog_version
+
+logger = logging.getLogger(__name__)
+
+# Foods updated this long before the newest one an index has seen are read
+# again on every update: updated_at is the start of the writing transaction,
+# so one that commits late shows up behind rows already loaded
+FOOD_INDEX_SYNC_OVERLAP = timedelta(seconds=int(os.getenv("FOOD_INDEX_SYNC_OVERLAP_SECONDS", "60")))
+
+# Share of the indexed foods that may change (or be dropped) before an
+# update rebuilds the index instead of patching it
+FOOD_INDEX_REBUILD_RATIO = 0.2
+
+
+class CatalogIndex:
+    """Base of the in-memory food indexes every worker keeps.
+
+    Any worker can change the catalog (imports, refreshes, new foods) and
+    bumps catalog_version when it has. update() notices the new version
+    and loads only the foods updated since the newest updated_at the index
+    has seen; their old slots are dropped and they are added again. A full
+    import, or more changes than FOOD_INDEX_REBUILD_RATIO of the index,
+    rebuilds it instead.
+
+    Subclasses keep their data in one tuple swapped in by _set_data and
+    implement _empty, _food_ids, _load and _apply.
+    """
+
+    # FoodItem columns the index is built from
+    columns = (FoodItem.id, FoodItem.name, FoodItem.is_verified)
+    name = "food"
+
+    def __init__(self, version: Optional[CatalogVersion] = None):
+        self.version = version or catalog_version
+        self.built_version: Optional[int] = None
+        self.built_at: Optional[float] = None
+        self.updated_at: Optional[float] = None
+        self.build_seconds = 0.0
+        self.skipped = 0
+        self.dropped = 0
+        self._synced_at: Optional[datetime] = None
+        # Foods applied by updates within the overlap window, by updated_at
+        self._applied: Dict[int, datetime] = {}
+        self._lock = asyncio.Lock()
+        self._pending: List[FoodItem] = []
+        self._set_data(*self._empty())
+
+    def _set_data(self, *data):
+        self._data = data
+
+    @property
+    def foods(self) -> int:
+        return len(self._food_ids(self._data)) - self.dropped
+
+    @property
+    def ready(self) -> bool:
+        # Built from an empty catalog (an import still running elsewhere)
+        # the index is not used; update() fills it once the import is done
+        return self.built_at is not None and self.foods > 0
+
+    @property
+    def current(self) -> bool:
+        return self.built_version is not None and self.built_version == self.version.current()
+
+    async def update(self):
+        """Catch up with catalog changes made by any worker since the last update"""
+        if self.current:
+            return
+        async with self._lock:
+            version = self.version.current()
+            if version == self.built_version:
+                return
+            if not self.ready or not await self._catch_up():
+                await self._rebuild()
+            self.built_version = version
+
+    async def rebuild(self):
+        """Reload the index from the catalog"""
+        async with self._lock:
+            version = self.version.current()
+            await self._rebuild()
+            self.built_version = version
+
+    async def _rebuild(self):
+        started = time.perf_counter()
+        async with SessionLocal() as db:
+            synced_at = await db.scalar(select(func.max(FoodItem.updated_at)))
+            total = (await db.execute(select(func.count(FoodItem.id)))).scalar()
+            # Foods in the overlap window are loaded now; read before the load,
+            # so changes made meanwhile still count as changes
+            applied = await self._overlapping(db, synced_at, max(1000, int(total * FOOD_INDEX_REBUILD_RATIO)))
+            data, loaded = await self._load(db)
+
+        self._set_data(*data)
+        self.skipped = total - loaded
+        self.dropped = 0
+        self._synced_at = synced_at
+        self._applied = applied
+        self._replay_pending()
+        self.built_at = self.updated_at = time.time()
+        self.build_seconds = time.perf_counter() - started
+        logger.info(f"Food {self.name} index built: {self.stats()}")
+
+    @staticmethod
+    async def _overlapping(db, synced_at: Optional[datetime], limit: int) -> Dict[int, datetime]:
+        if synced_at is None:
+            return {}
+        result = await db.execute(
+            select(FoodItem.id, FoodItem.updated_at)
+            .where(FoodItem.updated_at >= synced_at - FOOD_INDEX_SYNC_OVERLAP).limit(limit + 1)
+        )
+        rows = result.all()
+        # Too many to remember; the next update rebuilds instead
+        return dict(rows) if len(rows) <= limit else {}
+
+    async def _catch_up(self) -> bool:
+        """Apply the foods changed since the last sync; False when a rebuild is due instead"""
+        limit = max(1000, int(self.foods * FOOD_INDEX_REBUILD_RATIO))
+        query = select(FoodItem.updated_at, *self.columns).order_by(FoodItem.updated_at).limit(limit + 1)
+        if self._synced_at is not None:
+            query = query.where(FoodItem.updated_at >= self._synced_at - FOOD_INDEX_SYNC_OVERLAP)
+        async with SessionLocal() as db:
+            rows = (await db.execute(query)).all()
+        if len(rows) > limit:
+            return False
+
+        changed = [row for row in rows if row.updated_at is not None and self._applied.get(row.id) != row.updated_at]
+        if changed:
+            await self._apply(changed)
+            newest = changed[-1].updated_at
+            if self._synced_at is None or newest > self._synced_at:
+                self._synced_at = newest
+            self._applied.update((row.id, row.updated_at) for row in changed)
+            horizon = self._synced_at - FOOD_INDEX_SYNC_OVERLAP
+            self._applied = {food_id: at for food_id, at in self._applied.items() if at >= horizon}
+            self.updated_at = time.time()
+            logger.info(f"Food {self.name} index updated with {len(changed)} changed foods")
+
+        self._replay_pending()
+        return self.dropped <= len(self._food_ids(self._data)) * FOOD_INDEX_REBUILD_RATIO
+
+    def _replay_pending(self):
+        # Foods add()ed while the index was rebuilt or updated, missing from the new data
+        pending, self._pending = self._pending, []
+        if pending:
+            indexed = set(self._food_ids(self._data))
+            for food in pending:
+                if food.id not in indexed:
+                    self.add(food)
+
+    def add(self, food: FoodItem):
+        """Add a food created by this worker right away"""
+        raise NotImplementedError
+
+    def _empty(self) -> tuple:
+        raise NotImplementedError
+
+    def _food_ids(self, data):
+        raise NotImplementedError
+
+    async def _load(self, db):
+        """Build the data from the whole catalog; returns (data, foods loaded)"""
+        raise NotImplementedError
+
+    async def _apply(self, rows):
+        """Replace the changed foods in the live data"""
+        raise NotImplementedError
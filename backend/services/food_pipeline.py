@@ -0,0 +1,163 @@
+import asyncio
+import gzip
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import AsyncIterator, List, Optional, Tuple
+
+from services.food_import import FoodRow, ImportStats, is_valid_product, product_to_row
+
+# Parser processes (0 = one per CPU, leaving one for the event loop and writer)
+FOOD_IMPORT_WORKERS = int(os.getenv("FOOD_IMPORT_WORKERS", "0"))
+# Decompressed bytes handed to a parser process per task
+FOOD_IMPORT_CHUNK_BYTES = int(os.getenv("FOOD_IMPORT_CHUNK_BYTES", str(16 * 1024 * 1024)))
+
+
+def parse_chunk(data: bytes) -> Tuple[List[FoodRow], int, float]:
+    """Decode and validate a block of JSONL lines (runs in a worker process)"""
+    started = time.perf_counter()
+    rows = []
+    lines = data.splitlines()
+
+    for line in lines:
+        try:
+            product = json.loads(line)
+        except ValueError:
+            continue
+
+        if not isinstance(product, dict) or not is_valid_product(product):
+            continue
+
+        row = product_to_row(product)
+        if row:
+            rows.append(row)
+
+    return rows, len(lines), time.perf_counter() - started
+
+
+@dataclass
+class PipelineStats:
+    """Per-stage counters for the parse pipeline.
+
+    *_seconds are busy times: decompression runs in one thread, parsing is
+    summed across worker processes and writer_wait is how long the writer sat
+    idle waiting for parsed chunks (high = parsing/decompression bound).
+    """
+    workers: int = 1
+    compressed_bytes: int = 0
+    decompressed_bytes: int = 0
+    decompress_seconds: float = 0.0
+    lines: int = 0
+    rows: int = 0
+    chunks: int = 0
+    parse_seconds: float = 0.0
+    writer_wait_seconds: float = 0.0
+    started_at: float = field(default_factory=time.perf_counter)
+    write: Optional[ImportStats] = None
+
+    @staticmethod
+    def _rate(amount: float, seconds: float) -> float:
+        return amount / seconds if seconds > 0 else 0.0
+
+    def summary(self) -> str:
+        elapsed = time.perf_counter() - self.started_at
+        parts = [
+            f"decompress {self._rate(self.decompressed_bytes, self.decompress_seconds) / 1e6:.1f} MB/s "
+            f"(busy {self.decompress_seconds:.1f}s)",
+            f"parse {self._rate(self.lines, self.parse_seconds / self.workers):.0f} lines/s "
+            f"on {self.workers} workers (busy {self.parse_seconds:.1f}s)",
+        ]
+        if self.write:
+            parts.append(
+                f"write {self._rate(self.write.rows, self.write.write_seconds):.0f} rows/s "
+                f"(busy {self.write.write_seconds:.1f}s)"
+            )
+        parts.append(f"writer waited {self.writer_wait_seconds:.1f}s")
+        return f"{self.lines} lines -> {self.rows} rows in {elapsed:.1f}s: " + ", ".join(parts)
+
+
+class FoodParsePipeline:
+    """Parallel parser for the gzipped OpenFoodFacts JSONL dump.
+
+    A thread decompresses the file into line-aligned blocks, a process pool
+    decodes and validates them, and the resulting row tuples are yielded in
+    file order to a single writer. At most two blocks per worker are in
+    flight, so a slow writer throttles decompression instead of buffering
+    the dump in memory.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        workers: int = FOOD_IMPORT_WORKERS,
+        chunk_bytes: int = FOOD_IMPORT_CHUNK_BYTES,
+        limit: int = 0,
+    ):
+        self.path = path
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.chunk_bytes = chunk_bytes
+        self.limit = limit
+        self.stats = PipelineStats(workers=self.workers)
+        self.total_bytes = os.path.getsize(path)
+
+    @property
+    def progress(self) -> float:
+        """Fraction of the compressed file read so far"""
+        if not self.total_bytes:
+            return 0.0
+        return min(1.0, self.stats.compressed_bytes / self.total_bytes)
+
+    def _read_block(self, f) -> bytes:
+        started = time.perf_counter()
+        data = f.read(self.chunk_bytes)
+        if data and not data.endswith(b"\n"):
+            data += f.readline()
+
+        self.stats.decompress_seconds += time.perf_counter() - started
+        self.stats.decompressed_bytes += len(data)
+        self.stats.compressed_bytes = f.fileobj.tell()
+        return data
+
+    async def batches(self) -> AsyncIterator[List[FoodRow]]:
+        """Yield parsed row batches in file order"""
+        loop = asyncio.get_running_loop()
+        pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        pending = deque()
+        exhausted = False
+
+        try:
+            with gzip.open(self.path, "rb") as f:
+                while True:
+                    while not exhausted and len(pending) < self.workers * 2:
+                        data = await loop.run_in_executor(None, self._read_block, f)
+                        if not data:
+                            exhausted = True
+                            break
+                        pending.append(loop.run_in_executor(pool, parse_chunk, data))
+
+                    if not pending:
+                        break
+
+                    waited = time.perf_counter()
+                    rows, lines, seconds = await pending.popleft()
+                    self.stats.writer_wait_seconds += time.perf_counter() - waited
+                    self.stats.chunks += 1
+                    self.stats.lines += lines
+                    self.stats.parse_seconds += seconds
+
+                    if self.limit:
+                        rows = rows[:self.limit - self.stats.rows]
+                    self.stats.rows += len(rows)
+
+                    if rows:
+                        yield rows
+                    if self.limit and self.stats.rows >= self.limit:
+                        break
+        finally:
+            for future in pending:
+                future.cancel()
+            pool.shutdown(wait=False, cancel_futures=True)
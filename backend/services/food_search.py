@@ -0,0 +1,300 @@
+import base64
+import json
+import logging
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy import Select, column, func, literal_column, select, table, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
+
+from database import engine as default_engine
+from models.nutrition import FoodItem
+
+logger = logging.getLogger(__name__)
+
+# Staging/retired names mirror CatalogStaging's table names
+FTS_TABLE = "food_items_fts"
+FTS_STAGING_TABLE = "food_items_fts_staging"
+FTS_RETIRED_TABLE = "food_items_fts_retired"
+
+# Searchable text shared by the PostgreSQL trigram index and its queries; it
+# must stay textually identical for the planner to use the index
+PG_SEARCH_EXPRESSION = (
+    "(coalesce({table}.name, '') || ' ' || coalesce({table}.brand, '') || ' ' || "
+    "coalesce({table}.category, ''))"
+)
+
+# Trigram indexes cannot answer shorter queries
+MIN_INDEXED_QUERY_LENGTH = 3
+
+# Rows per transaction while filling the staging FTS table
+FTS_BUILD_BATCH_SIZE = 50000
+
+# Values returned per facet
+FACET_LIMIT = 10
+
+
+def encode_cursor(food: FoodItem) -> str:
+    """Opaque cursor pointing just after food in (is_verified desc, name, id) order"""
+    payload = json.dumps([bool(food.is_verified), food.name, food.id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[bool, str, int]:
+    """Inverse of encode_cursor; raises ValueError for anything it did not produce"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        is_verified, name, food_id = json.loads(base64.urlsafe_b64decode(padded))
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(is_verified, bool) or not isinstance(name, str) or not isinstance(food_id, int):
+        raise ValueError("Invalid cursor")
+    return is_verified, name, food_id
+
+
+def _facet_filters(brand: Optional[str], category: Optional[str]) -> list:
+    filters = []
+    if brand:
+        filters.append(FoodItem.brand == brand)
+    if category:
+        filters.append(FoodItem.category == category)
+    return filters
+
+
+class FoodSearchBackend:
+    """Substring search over food name, brand and category.
+
+    The base class is the unindexed ILIKE fallback used for dialects without
+    a dedicated backend and for queries too short for trigram matching.
+    """
+
+    name = "ilike"
+
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+
+    def match_clause(self, q: str):
+        """WHERE clause selecting the foods that contain q"""
+        pattern = f"%{q}%"
+        return FoodItem.name.ilike(pattern) | FoodItem.brand.ilike(pattern) | FoodItem.category.ilike(pattern)
+
+    def relevance(self, q: str) -> list:
+        """ORDER BY terms ranking matches within the verified/unverified groups"""
+        return []
+
+    def search_query(self, q: str) -> Select:
+        """SELECT of FoodItem matching q, ordered by is_verified and relevance"""
+        return select(FoodItem).where(self.match_clause(q)).order_by(
+            FoodItem.is_verified.desc(), *self.relevance(q), FoodItem.name
+        )
+
+    def page_query(self, q: str, brand: Optional[str] = None, category: Optional[str] = None,
+                   after: Optional[Tuple[bool, str, int]] = None) -> Select:
+        """Keyset page of matches ordered by (is_verified desc, name, id)"""
+        query = select(FoodItem).where(self.match_clause(q), *_facet_filters(brand, category))
+        if after is not None:
+            is_verified, name, food_id = after
+            same_group = (FoodItem.is_verified == is_verified) & (
+                (FoodItem.name > name) | ((FoodItem.name == name) & (FoodItem.id > food_id))
+            )
+            # Unverified foods come after all verified ones
+            query = query.where(same_group | (FoodItem.is_verified == False) if is_verified else same_group)  # noqa: E712
+        return query.order_by(FoodItem.is_verified.desc(), FoodItem.name, FoodItem.id)
+
+    def facet_query(self, q: str, column, brand: Optional[str] = None, category: Optional[str] = None,
+                    limit: int = FACET_LIMIT) -> Select:
+        """Most common values of column among the matches, with counts.
+
+        The filter on the column itself is left out, so the counts show what
+        choosing another value would return.
+        """
+        filters = _facet_filters(
+            brand if column is not FoodItem.brand else None,
+            category if column is not FoodItem.category else None,
+        )
+        count = func.count(FoodItem.id).label("count")
+        return (
+            select(column.label("value"), count)
+            .where(self.match_clause(q), column.is_not(None), *filters)
+            .group_by(column)
+            .order_by(count.desc(), column)
+            .limit(limit)
+        )
+
+    async def ensure_index(self):
+        """Create the search index for the live catalog if it is missing"""
+
+    async def index_food(self, db: AsyncSession, food: FoodItem):
+        """Add a newly created food to the index (inside the caller's transaction)"""
+
+    async def build_staging(self, staging_table: str):
+        """Index a freshly loaded staging catalog before it is swapped in"""
+
+    async def index_staging_rows(self, conn: AsyncConnection, staging_table: str, ids: Iterable[int]):
+        """Index rows added to the staging catalog during the swap"""
+
+    async def swap(self, conn: AsyncConnection):
+        """Swap the staging index in, inside the catalog swap transaction"""
+
+    async def cleanup(self, conn: AsyncConnection):
+        """Drop leftovers of a previous swap or a failed import"""
+
+
+class SQLiteFTSBackend(FoodSearchBackend):
+    """FTS5 trigram index kept in its own table, keyed by food id.
+
+    The index stores its own copy of the searchable text rather than using
+    external content, so a complete index can be built next to the staging
+    catalog and renamed in together with it.
+    """
+
+    name = "sqlite-fts5"
+
+    def __init__(self, engine: AsyncEngine):
+        super().__init__(engine)
+        self.fts = table(FTS_TABLE, column("rowid"))
+
+    def match_clause(self, q: str):
+        if len(q) < MIN_INDEXED_QUERY_LENGTH:
+            return super().match_clause(q)
+
+        # A quoted phrase matches the trigrams of q as a substring anywhere in
+        # the indexed columns, like the old %q% pattern
+        phrase = '"' + q.replace('"', '""') + '"'
+        return FoodItem.id.in_(
+            select(self.fts.c.rowid).where(literal_column(FTS_TABLE).op("MATCH")(phrase))
+        )
+
+    def relevance(self, q: str) -> list:
+        # bm25() doubles the cost of broad queries (brand names match thousands
+        # of rows); names starting with q, then shorter names, rank about the same
+        return [
+            (func.instr(func.lower(FoodItem.name), q.lower()) == 1).desc(),
+            func.length(FoodItem.name),
+        ]
+
+    @staticmethod
+    def _create_statement(name: str) -> str:
+        return (
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {name} "
+            "USING fts5(name, brand, category, tokenize = 'trigram')"
+        )
+
+    async def ensure_index(self):
+        async with self.engine.connect() as conn:
+            # Every worker runs this at startup; take the write lock before
+            # looking so only one of them builds the index
+            await conn.exec_driver_sql("BEGIN IMMEDIATE")
+            result = await conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {"name": FTS_TABLE},
+            )
+            if result.scalar():
+                await conn.rollback()
+                return
+
+            await conn.execute(text(self._create_statement(FTS_TABLE)))
+            await conn.execute(text(
+                f"INSERT INTO {FTS_TABLE} (rowid, name, brand, category) "
+                "SELECT id, name, brand, category FROM food_items"
+            ))
+            await conn.commit()
+        logger.info("Food search index created")
+
+    async def index_food(self, db: AsyncSession, food: FoodItem):
+        await db.execute(
+            text(f"INSERT INTO {FTS_TABLE} (rowid, name, brand, category) VALUES (:id, :name, :brand, :category)"),
+            {"id": food.id, "name": food.name, "brand": food.brand, "category": food.category},
+        )
+
+    async def build_staging(self, staging_table: str):
+        async with self.engine.begin() as conn:
+            await conn.execute(text(f"DROP TABLE IF EXISTS {FTS_STAGING_TABLE}"))
+            await conn.execute(text(self._create_statement(FTS_STAGING_TABLE)))
+            max_id = (await conn.execute(text(f"SELECT max(id) FROM {staging_table}"))).scalar() or 0
+
+        for start in range(0, max_id, FTS_BUILD_BATCH_SIZE):
+            async with self.engine.begin() as conn:
+                await conn.execute(text(
+                    f"INSERT INTO {FTS_STAGING_TABLE} (rowid, name, brand, category) "
+                    f"SELECT id, name, brand, category FROM {staging_table} "
+                    "WHERE id > :start AND id <= :end"
+                ), {"start": start, "end": start + FTS_BUILD_BATCH_SIZE})
+
+        async with self.engine.begin() as conn:
+            await conn.execute(text(f"INSERT INTO {FTS_STAGING_TABLE} ({FTS_STAGING_TABLE}) VALUES ('optimize')"))
+
+    async def index_staging_rows(self, conn: AsyncConnection, staging_table: str, ids: Iterable[int]):
+        for food_id in ids:
+            await conn.execute(text(
+                f"INSERT INTO {FTS_STAGING_TABLE} (rowid, name, brand, category) "
+                f"SELECT id, name, brand, category FROM {staging_table} WHERE id = :id"
+            ), {"id": food_id})
+
+    async def swap(self, conn: AsyncConnection):
+        await conn.execute(text(f"ALTER TABLE {FTS_TABLE} RENAME TO {FTS_RETIRED_TABLE}"))
+        await conn.execute(text(f"ALTER TABLE {FTS_STAGING_TABLE} RENAME TO {FTS_TABLE}"))
+
+    async def cleanup(self, conn: AsyncConnection):
+        await conn.execute(text(f"DROP TABLE IF EXISTS {FTS_RETIRED_TABLE}"))
+        await conn.execute(text(f"DROP TABLE IF EXISTS {FTS_STAGING_TABLE}"))
+
+
+class PostgresTrigramBackend(FoodSearchBackend):
+    """pg_trgm GIN expression index over name, brand and category.
+
+    The index lives on the food_items table itself, so the importer only has
+    to create it on the staging table before the swap.
+    """
+
+    name = "postgresql-trgm"
+
+    def _document(self):
+        return literal_column(PG_SEARCH_EXPRESSION.format(table=FoodItem.__tablename__))
+
+    def match_clause(self, q: str):
+        if len(q) < MIN_INDEXED_QUERY_LENGTH:
+            return super().match_clause(q)
+        return self._document().ilike(f"%{q}%")
+
+    def relevance(self, q: str) -> list:
+        if len(q) < MIN_INDEXED_QUERY_LENGTH:
+            return []
+        return [func.similarity(self._document(), q).desc()]
+
+    async def _create_index(self, conn: AsyncConnection, table_name: str, prefix: Optional[str] = None):
+        if prefix is None:
+            # Follow the live table's index naming generation, see CatalogStaging
+            result = await conn.execute(text(
+                "SELECT 1 FROM pg_indexes WHERE tablename = :table AND indexname = 'ix_food_items_barcode'"
+            ), {"table": table_name})
+            prefix = "ix_food_items_" if result.scalar() else "ix_food_items_alt_"
+
+        await conn.execute(text(
+            f"CREATE INDEX IF NOT EXISTS {prefix}search_trgm ON {table_name} "
+            f"USING gin ({PG_SEARCH_EXPRESSION.format(table=table_name)} gin_trgm_ops)"
+        ))
+
+    async def ensure_index(self):
+        async with self.engine.begin() as conn:
+            await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            result = await conn.execute(text(
+                "SELECT 1 FROM pg_indexes WHERE tablename = 'food_items' AND indexname LIKE '%search_trgm'"
+            ))
+            if not result.scalar():
+                await self._create_index(conn, "food_items")
+
+    async def build_staging(self, staging_table: str):
+        async with self.engine.begin() as conn:
+            await self._create_index(conn, staging_table)
+
+
+def get_search_backend(engine: AsyncEngine = default_engine) -> FoodSearchBackend:
+    """Pick the search backend for the engine's dialect"""
+    if engine.dialect.name == "sqlite":
+        return SQLiteFTSBackend(engine)
+    if engine.dialect.name == "postgresql":
+        return PostgresTrigramBackend(engine)
+    return FoodSearchBackend(engine)
+
+
+food_search = get_search_backend()
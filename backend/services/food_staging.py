@@ -0,0 +1,222 @@
+import logging
+import time
+from typing import Optional
+
+from sqlalchemy import MetaData, Table, func, insert, inspect, select, text, update
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from database import engine as default_engine, sqlite_writer
+from models.nutrition import FoodItem, NutritionEntry
+from services.food_search import FoodSearchBackend, food_search, get_search_backend
+
+logger = logging.getLogger(__name__)
+
+LIVE_TABLE = FoodItem.__table__.name
+STAGING_TABLE = "food_items_staging"
+RETIRED_TABLE = "food_items_retired"
+
+# Live rows are copied into staging in id ranges of this size, one short
+# transaction each
+COPY_BATCH_SIZE = 50000
+
+
+class CatalogStaging:
+    """Builds a new food catalog next to the live food_items table and swaps it in.
+
+    prepare() creates food_items_staging and copies the live rows into it with
+    their ids, so existing NutritionEntry.food_item_id references stay valid.
+    The importer then writes into the staging table while readers keep using
+    the live one, finalize() builds the secondary indexes, and swap() replaces
+    the live table with a pair of renames in one short transaction.
+
+    Index and primary key names alternate between two sets
+    (ix_food_items_* / ix_food_items_alt_*) because the renamed table keeps
+    the names it was created with.
+    """
+
+    def __init__(self, engine: Optional[AsyncEngine] = None, search: Optional[FoodSearchBackend] = None):
+        self.engine = engine or default_engine
+        self.dialect = self.engine.dialect.name
+        self.search = search or (food_search if engine is None else get_search_backend(self.engine))
+        self.table: Optional[Table] = None
+        self.watermark = 0
+        self._deferred_indexes = []
+
+    async def prepare(self) -> Table:
+        """Create the staging table and copy the live catalog into it"""
+        async with self.engine.begin() as conn:
+            await conn.execute(text(f"DROP TABLE IF EXISTS {STAGING_TABLE}"))
+            await conn.execute(text(f"DROP TABLE IF EXISTS {RETIRED_TABLE}"))
+            await self.search.cleanup(conn)
+            self.table = await conn.run_sync(self._build_staging_table)
+            await conn.run_sync(self.table.create)
+
+            result = await conn.execute(select(func.max(FoodItem.id)))
+            self.watermark = result.scalar() or 0
+
+        await self._copy_live_rows()
+        return self.table
+
+    def _build_staging_table(self, sync_conn) -> Table:
+        inspector = inspect(sync_conn)
+        live_indexes = {index["name"] for index in inspector.get_indexes(LIVE_TABLE)}
+        prefix = "ix_food_items_alt_" if "ix_food_items_barcode" in live_indexes else "ix_food_items_"
+
+        table = FoodItem.__table__.to_metadata(MetaData(), name=STAGING_TABLE)
+        table.primary_key.name = f"{prefix[3:]}pkey"
+
+        # Unique indexes are needed while loading (ON CONFLICT), the rest is
+        # built after the load
+        for index in list(table.indexes):
+            index.name = prefix + "_".join(column.name for column in index.columns)
+            if not index.unique:
+                table.indexes.discard(index)
+                self._deferred_indexes.append(index)
+        return table
+
+    async def _copy_live_rows(self):
+        live = FoodItem.__table__
+        columns = [column.name for column in live.columns]
+        copied = 0
+        started = time.perf_counter()
+
+        for start in range(0, self.watermark, COPY_BATCH_SIZE):
+            async with self.engine.begin() as conn, sqlite_writer(self.engine):
+                result = await conn.execute(
+                    insert(self.table).from_select(
+                        columns,
+                        select(*live.columns).where(
+                            live.c.id > start, live.c.id <= min(start + COPY_BATCH_SIZE, self.watermark)
+                        ),
+                    )
+                )
+                copied += max(result.rowcount, 0)
+
+        if self.dialect == "postgresql":
+            async with self.engine.begin() as conn:
+                await conn.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{STAGING_TABLE}', 'id'), "
+                    f"GREATEST(:watermark, 1))"
+                ), {"watermark": self.watermark})
+
+        logger.info(f"Copied {copied} live food items to staging in {time.perf_counter() - started:.1f}s")
+
+    async def finalize(self):
+        """Build the indexes that were deferred until after the load"""
+        async with self.engine.begin() as conn:
+            for index in self._deferred_indexes:
+                await conn.run_sync(index.create)
+        await self.search.build_staging(STAGING_TABLE)
+
+        if self.dialect == "postgresql":
+            async with self.engine.begin() as conn:
+                await conn.execute(text(f"ANALYZE {STAGING_TABLE}"))
+
+    async def swap(self):
+        """Atomically replace the live catalog with the staging table"""
+        if self.dialect == "postgresql":
+            await self._swap_postgresql()
+        else:
+            await self._swap_sqlite()
+
+        async with self.engine.begin() as conn:
+            await conn.execute(text(f"DROP TABLE IF EXISTS {RETIRED_TABLE}"))
+            await self.search.cleanup(conn)
+        logger.info("Food catalog swapped in")
+
+    async def discard(self):
+        """Drop the staging table after a failed import"""
+        async with self.engine.begin() as conn:
+            await conn.execute(text(f"DROP TABLE IF EXISTS {STAGING_TABLE}"))
+            await self.search.cleanup(conn)
+
+    async def _swap_sqlite(self):
+        async with self.engine.connect() as conn, sqlite_writer(self.engine):
+            # Keep nutrition_entries' REFERENCES food_items pointing at the name,
+            # not at the table being renamed away
+            await conn.exec_driver_sql("PRAGMA legacy_alter_table = ON")
+            try:
+                await conn.exec_driver_sql("BEGIN IMMEDIATE")
+                await self._merge_late_rows(conn)
+                await conn.exec_driver_sql(f"ALTER TABLE {LIVE_TABLE} RENAME TO {RETIRED_TABLE}")
+                await conn.exec_driver_sql(f"ALTER TABLE {STAGING_TABLE} RENAME TO {LIVE_TABLE}")
+                await self.search.swap(conn)
+                await conn.commit()
+            except Exception:
+                await conn.rollback()
+                raise
+            finally:
+                await conn.exec_driver_sql("PRAGMA legacy_alter_table = OFF")
+
+    async def _swap_postgresql(self):
+        async with self.engine.begin() as conn:
+            await conn.execute(text(f"LOCK TABLE {LIVE_TABLE} IN SHARE ROW EXCLUSIVE MODE"))
+            await self._merge_late_rows(conn)
+
+            # Foreign keys follow the table they point at, so re-point them by name
+            result = await conn.execute(text(
+                "SELECT conrelid::regclass::text, conname, pg_get_constraintdef(oid) "
+                "FROM pg_constraint WHERE contype = 'f' AND confrelid = CAST(:table AS regclass)"
+            ), {"table": LIVE_TABLE})
+            foreign_keys = result.all()
+
+            for table_name, name, _ in foreign_keys:
+                await conn.execute(text(f'ALTER TABLE {table_name} DROP CONSTRAINT "{name}"'))
+            await conn.execute(text(f"ALTER TABLE {LIVE_TABLE} RENAME TO {RETIRED_TABLE}"))
+            await conn.execute(text(f"ALTER TABLE {STAGING_TABLE} RENAME TO {LIVE_TABLE}"))
+            for table_name, name, definition in foreign_keys:
+                await conn.execute(text(
+                    f'ALTER TABLE {table_name} ADD CONSTRAINT "{name}" {definition} NOT VALID'
+                ))
+
+        # Validation scans nutrition_entries without blocking reads or writes
+        async with self.engine.begin() as conn:
+            for table_name, name, _ in foreign_keys:
+                await conn.execute(text(f'ALTER TABLE {table_name} VALIDATE CONSTRAINT "{name}"'))
+
+    async def _merge_late_rows(self, conn: AsyncConnection):
+        """Carry over foods created in the live table while staging was built.
+
+        Their ids may already be taken by imported rows, so they get new ids
+        above both tables' maximum and their nutrition entries are re-pointed.
+        """
+        live = FoodItem.__table__
+        result = await conn.execute(select(live).where(live.c.id > self.watermark).order_by(live.c.id))
+        late_rows = result.mappings().all()
+        if not late_rows:
+            return
+
+        next_id = max(
+            (await conn.execute(select(func.max(self.table.c.id)))).scalar() or 0,
+            late_rows[-1]["id"],
+        ) + 1
+
+        inserted_ids = []
+        for row in late_rows:
+            values = dict(row)
+            old_id = values.pop("id")
+
+            new_id = None
+            if values["barcode"]:
+                result = await conn.execute(
+                    select(self.table.c.id).where(self.table.c.barcode == values["barcode"])
+                )
+                new_id = result.scalar()
+            if new_id is None:
+                new_id = next_id
+                next_id += 1
+                await conn.execute(insert(self.table).values(id=new_id, **values))
+                inserted_ids.append(new_id)
+
+            await conn.execute(
+                update(NutritionEntry.__table__)
+                .where(NutritionEntry.__table__.c.food_item_id == old_id)
+                .values(food_item_id=new_id)
+            )
+
+        await self.search.index_staging_rows(conn, STAGING_TABLE, inserted_ids)
+        if self.dialect == "postgresql":
+            await conn.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{STAGING_TABLE}', 'id'), :next_id - 1)"
+            ), {"next_id": next_id})
+        logger.info(f"Merged {len(late_rows)} food items created during the import")
@@ -0,0 +1,221 @@
+import asyncio
+import os
+import sys
+import unicodedata
+from array import array
+from bisect import bisect_left
+from typing import List, Optional
+
+from sqlalchemy import select
+
+from models.nutrition import FoodItem
+from services.food_cache import CatalogVersion
+from services.food_index import CatalogIndex
+
+# Upper bound on index keys (each food adds one for its name and one for its
+# brand); rebuilds fill it to SUGGEST_FILL_RATIO to leave room for new foods
+SUGGEST_MAX_ENTRIES = int(os.getenv("FOOD_SUGGEST_MAX_ENTRIES", "400000"))
+SUGGEST_FILL_RATIO = 0.9
+
+# Keys looked at per request when ranking completions
+SUGGEST_SCAN_LIMIT = 100
+
+SUGGEST_LOAD_BATCH_SIZE = 50000
+
+
+def normalize(value: Optional[str]) -> str:
+    """Lowercase, strip accents and collapse whitespace"""
+    if not value:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", value)
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return " ".join(stripped.casefold().split())
+
+
+class FoodSuggestIndex(CatalogIndex):
+    """In-memory prefix index over normalized food names and brands.
+
+    Keys live in one sorted list searched with bisect; a parallel array maps
+    each key to a food slot, and the display fields of the foods are kept in
+    slot-indexed lists. Rebuilds and updates create fresh lists and swap
+    them in with a single assignment, so lookups never see a half-built index.
+    """
+
+    columns = (FoodItem.id, FoodItem.name, FoodItem.brand, FoodItem.is_verified)
+    name = "suggest"
+
+    def __init__(self, max_entries: int = SUGGEST_MAX_ENTRIES, version: Optional[CatalogVersion] = None):
+        self.max_entries = max_entries
+        super().__init__(version)
+
+    @staticmethod
+    def _empty():
+        return [], array("I"), array("I"), [], [], bytearray()
+
+    @staticmethod
+    def _food_ids(data):
+        return data[2]
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[dict]:
+        """Top completions for prefix: verified foods first, then shorter names"""
+        keys, key_slots, food_ids, names, brands, verified = self._data
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+
+        slots = set()
+        i = bisect_left(keys, prefix)
+        end = min(len(keys), i + SUGGEST_SCAN_LIMIT)
+        while i < end and keys[i].startswith(prefix):
+            slots.add(key_slots[i])
+            i += 1
+
+        ranked = sorted(slots, key=lambda slot: (not verified[slot], len(names[slot]), names[slot]))
+        return [
+            {
+                "id": food_ids[slot],
+                "name": names[slot],
+                "brand": brands[slot],
+                "is_verified": bool(verified[slot]),
+            }
+            for slot in ranked[:limit]
+        ]
+
+    def add(self, food: FoodItem):
+        """Add a newly created food; ignored once the index is full"""
+        if self._lock.locked():
+            # Replayed on top of the rebuilt index
+            self._pending.append(food)
+        keys, key_slots, food_ids, names, brands, verified = self._data
+        food_keys = [key for key in {normalize(food.name), normalize(food.brand)} if key]
+        if not food_keys:
+            return
+        if len(keys) + len(food_keys) > self.max_entries:
+            self.skipped += 1
+            return
+
+        slot = len(food_ids)
+        food_ids.append(food.id)
+        names.append(food.name)
+        brands.append(food.brand)
+        verified.append(bool(food.is_verified))
+        for key in food_keys:
+            position = bisect_left(keys, key)
+            keys.insert(position, key)
+            key_slots.insert(position, slot)
+
+    async def _load(self, db):
+        """All foods up to SUGGEST_FILL_RATIO of the entries, verified foods first"""
+        rows = []
+        capacity = int(self.max_entries * SUGGEST_FILL_RATIO)
+        entries = 0
+
+        for is_verified in (True, False):
+            last_id = 0
+            while entries < capacity:
+                result = await db.execute(
+                    select(*self.columns)
+                    .where(FoodItem.is_verified == is_verified, FoodItem.id > last_id)
+                    .order_by(FoodItem.id)
+                    .limit(SUGGEST_LOAD_BATCH_SIZE)
+                )
+                batch = result.all()
+                if not batch:
+                    break
+                last_id = batch[-1].id
+
+                for row in batch:
+                    food_keys = {normalize(row.name), normalize(row.brand)} - {""}
+                    if not food_keys:
+                        continue
+                    if entries + len(food_keys) > capacity:
+                        continue
+                    entries += len(food_keys)
+                    rows.append((row, food_keys))
+
+        return await asyncio.to_thread(self._build, rows), len(rows)
+
+    @staticmethod
+    def _build(rows):
+        food_ids, names, brands, verified = array("I"), [], [], bytearray()
+        pairs = []
+        for slot, (row, food_keys) in enumerate(rows):
+            food_ids.append(row.id)
+            names.append(row.name)
+            brands.append(row.brand)
+            verified.append(bool(row.is_verified))
+            pairs.extend((key, slot) for key in food_keys)
+
+        pairs.sort()
+        keys = [key for key, _ in pairs]
+        key_slots = array("I", (slot for _, slot in pairs))
+        return keys, key_slots, food_ids, names, brands, verified
+
+    async def _apply(self, rows):
+        # Merged into copies off the event loop; add() keeps writing to the live lists meanwhile
+        keys, key_slots, food_ids, names, brands, verified = self._data
+        copies = (list(keys), array("I", key_slots), array("I", food_ids), list(names), list(brands),
+                  bytearray(verified))
+        data, dropped, skipped = await asyncio.to_thread(self._merge, copies, rows)
+        self._set_data(*data)
+        self.dropped += dropped
+        self.skipped += skipped
+
+    def _merge(self, data, rows):
+        """The data with the slots of the changed foods dropped and the foods added again"""
+        keys, key_slots, food_ids, names, brands, verified = data
+        changed = {row.id for row in rows}
+        dropped = set()
+        for slot, food_id in enumerate(food_ids):
+            if food_id in changed:
+                food_ids[slot], names[slot], brands[slot] = 0, "", None
+                dropped.add(slot)
+
+        pairs = [(key, slot) for key, slot in zip(keys, key_slots) if slot not in dropped]
+        skipped = 0
+        for row in rows:
+            food_keys = {normalize(row.name), normalize(row.brand)} - {""}
+            if not food_keys:
+                continue
+            if len(pairs) + len(food_keys) > self.max_entries:
+                skipped += 1
+                continue
+            slot = len(food_ids)
+            food_ids.append(row.id)
+            names.append(row.name)
+            brands.append(row.brand)
+            verified.append(bool(row.is_verified))
+            pairs.extend((key, slot) for key in food_keys)
+
+        # Mostly two sorted runs, which sort() merges in linear time
+        pairs.sort()
+        keys = [key for key, _ in pairs]
+        key_slots = array("I", (slot for _, slot in pairs))
+        return (keys, key_slots, food_ids, names, brands, verified), len(dropped), skipped
+
+    def memory_bytes(self) -> int:
+        """Approximate size of the index data"""
+        keys, key_slots, food_ids, names, brands, verified = self._data
+        total = sys.getsizeof(keys) + sys.getsizeof(names) + sys.getsizeof(brands)
+        total += key_slots.itemsize * len(key_slots) + food_ids.itemsize * len(food_ids) + len(verified)
+        total += sum(sys.getsizeof(key) for key in keys)
+        total += sum(sys.getsizeof(name) for name in names)
+        total += sum(sys.getsizeof(brand) for brand in brands if brand is not None)
+        return total
+
+    def stats(self) -> dict:
+        keys, *_ = self._data
+        return {
+            "foods": self.foods,
+            "entries": len(keys),
+            "max_entries": self.max_entries,
+            "skipped_foods": self.skipped,
+            "dropped_slots": self.dropped,
+            "memory_bytes": self.memory_bytes(),
+            "build_seconds": round(self.build_seconds, 2),
+            "built_at": self.built_at,
+            "updated_at": self.updated_at,
+        }
+
+
+food_suggest = FoodSuggestIndex()
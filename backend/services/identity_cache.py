@@ -0,0 +1,52 @@
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from models.user import User
+from services.food_cache import CatalogVersion, VersionedLRUCache
+from services.import_progress import DATA_DIR
+
+IDENTITY_CACHE_TTL_SECONDS = float(os.getenv("IDENTITY_CACHE_TTL_SECONDS", "30"))
+IDENTITY_CACHE_MAX_ENTRIES = int(os.getenv("IDENTITY_CACHE_MAX_ENTRIES", "10000"))
+
+
+@dataclass(frozen=True)
+class UserSnapshot:
+    """The fields of a user that request handlers read, detached from any session.
+
+    Handlers that change the user load the row again with get_user_by_id.
+    """
+    id: int
+    email: str
+    is_active: bool
+    is_admin: bool
+    is_2fa_enabled: bool
+    locked_until: Optional[datetime]
+    created_at: datetime
+    last_login: Optional[datetime]
+
+    @classmethod
+    def from_user(cls, user: User) -> "UserSnapshot":
+        return cls(
+            id=user.id,
+            email=user.email,
+            is_active=user.is_active,
+            is_admin=user.is_admin,
+            is_2fa_enabled=user.is_2fa_enabled,
+            locked_until=user.locked_until,
+            created_at=user.created_at,
+            last_login=user.last_login,
+        )
+
+
+# Bumped on every change that affects authentication (lock, deactivation,
+# deletion, password or 2FA change); every worker drops its cached users
+# within a second, and entries expire after the TTL regardless
+identity_version = CatalogVersion(os.path.join(DATA_DIR, "identity.version"))
+identity_cache = VersionedLRUCache(identity_version, IDENTITY_CACHE_MAX_ENTRIES, IDENTITY_CACHE_TTL_SECONDS)
+
+
+def invalidate_identities():
+    """Drop the cached users in all workers, for changes that revoke or restrict access"""
+    identity_version.bump()
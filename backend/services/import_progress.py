@@ -0,0 +1,144 @@
+import enum
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = "data"
+
+
+class ImportState(str, enum.Enum):
+    PENDING = "pending"
+    DOWNLOADING = "downloading"
+    PARSING = "parsing"
+    LOADING = "loading"
+    DONE = "done"
+    FAILED = "failed"
+
+
+class ImportProgress:
+    """Progress of the food database import.
+
+    Every gunicorn worker runs the lifespan, but only the one holding the
+    import lock does the work; it mirrors its state into a small JSON file
+    so the status endpoint reports the same thing on every worker.
+    """
+
+    def __init__(self, status_path: str = os.path.join(DATA_DIR, "food_import_status.json")):
+        self.status_path = status_path
+        self.owner = False
+        self._last_flush = 0.0
+        self._reset(ImportState.PENDING)
+
+    def _reset(self, state: ImportState):
+        self.state = state
+        self.percent = 0.0
+        self.rows = 0
+        self.rows_per_sec = 0.0
+        self.message: Optional[str] = None
+        self.error: Optional[str] = None
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+
+    def start(self):
+        self._reset(ImportState.PENDING)
+        self.owner = True
+        self.started_at = datetime.utcnow()
+        self._flush(force=True)
+
+    def set_state(self, state: ImportState, message: Optional[str] = None):
+        self.state = state
+        self.percent = 100.0 if state == ImportState.DONE else 0.0
+        if message:
+            self.message = message
+        if state in (ImportState.DONE, ImportState.FAILED):
+            self.finished_at = datetime.utcnow()
+        self._flush(force=True)
+        if state in (ImportState.DONE, ImportState.FAILED):
+            # The next import may run in another worker; read its status from the file
+            self.owner = False
+
+    def update(self, percent: Optional[float] = None, rows: Optional[int] = None,
+               rows_per_sec: Optional[float] = None):
+        if percent is not None:
+            self.percent = round(min(100.0, percent), 1)
+        if rows is not None:
+            self.rows = rows
+        if rows_per_sec is not None:
+            self.rows_per_sec = round(rows_per_sec, 1)
+        self._flush()
+
+    def fail(self, error: Exception):
+        self.error = str(error)
+        self.set_state(ImportState.FAILED)
+
+    def snapshot(self) -> dict:
+        """Current status, as written by whichever worker runs the import"""
+        if not self.owner:
+            try:
+                with open(self.status_path) as f:
+                    return json.load(f)
+            except (OSError, ValueError):
+                pass
+        return self._as_dict()
+
+    def _as_dict(self) -> dict:
+        return {
+            "state": self.state.value,
+            "percent": self.percent,
+            "rows": self.rows,
+            "rows_per_sec": self.rows_per_sec,
+            "message": self.message,
+            "error": self.error,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "pid": os.getpid(),
+        }
+
+    def _flush(self, force: bool = False):
+        now = time.monotonic()
+        if not self.owner or (not force and now - self._last_flush < 1.0):
+            return
+        self._last_flush = now
+
+        try:
+            os.makedirs(os.path.dirname(self.status_path) or ".", exist_ok=True)
+            tmp_path = f"{self.status_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self._as_dict(), f)
+            os.replace(tmp_path, self.status_path)
+        except OSError as e:
+            logger.warning(f"Could not write food import status: {e}")
+
+
+@contextmanager
+def import_lock(path: str = os.path.join(DATA_DIR, "food_import.lock")):
+    """Non-blocking cross-process lock; yields False if another worker holds it"""
+    if fcntl is None:
+        yield True
+        return
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+food_import_progress = ImportProgress()
@@ -0,0 +1,90 @@
+import importlib
+import importlib.util
+import time
+from typing import Dict, Optional
+
+
+class DependencyUnavailable(ImportError):
+    pass
+
+
+class OptionalModule:
+    """A module imported on first attribute access instead of at startup.
+
+    Heavy packages that only serve rare features (barcode scanning, 2FA
+    setup, fuzzy search) are wrapped in one of these, so the web workers do
+    not pay their import time and memory until the feature is used.
+    """
+
+    def __init__(self, name: str, feature: str, package: Optional[str] = None):
+        self.name = name
+        self.feature = feature
+        self.package = package or name
+        self.import_seconds: Optional[float] = None
+        self.error: Optional[str] = None
+        self._module = None
+
+    def load(self):
+        if self._module is None:
+            started = time.perf_counter()
+            try:
+                self._module = importlib.import_module(self.name)
+            except ImportError as e:
+                self.error = str(e)
+                raise DependencyUnavailable(
+                    f"{self.feature} requires the '{self.package}' package: {e}"
+                ) from e
+            self.import_seconds = time.perf_counter() - started
+            self.error = None
+        return self._module
+
+    def __getattr__(self, attr: str):
+        # Dunder lookups (copy, pickle, introspection) must not trigger the import
+        if attr.startswith("__"):
+            raise AttributeError(attr)
+        return getattr(self.load(), attr)
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def installed(self) -> bool:
+        """Whether the package can be found, without importing it"""
+        try:
+            return importlib.util.find_spec(self.name) is not None
+        except (ImportError, ValueError):
+            return False
+
+
+class OptionalDependencies:
+    """Registry of the lazily imported modules, reported on the admin stats page"""
+
+    def __init__(self):
+        self.modules: Dict[str, OptionalModule] = {}
+
+    def register(self, name: str, feature: str, package: Optional[str] = None) -> OptionalModule:
+        module = self.modules.get(name)
+        if module is None:
+            module = self.modules[name] = OptionalModule(name, feature, package)
+        elif feature not in module.feature:
+            module.feature = f"{module.feature}, {feature}"
+        return module
+
+    def stats(self) -> dict:
+        return {
+            name: {
+                "feature": module.feature,
+                "installed": module.installed(),
+                "loaded": module.loaded,
+                "import_ms": round(module.import_seconds * 1000, 1) if module.import_seconds is not None else None,
+                "error": module.error,
+            }
+            for name, module in self.modules.items()
+        }
+
+
+optional_dependencies = OptionalDependencies()
+
+
+def optional_module(name: str, feature: str, package: Optional[str] = None) -> OptionalModule:
+    return optional_dependencies.register(name, feature, package)
@@ -0,0 +1,238 @@
+import asyncio
+import bisect
+import json
+import logging
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+from services.import_progress import DATA_DIR
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Hashing threads (0 = one per CPU, at most 4); argon2 releases the GIL
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "0"))
+# Hashes waiting or running before further logins are turned away (0 = 4 per thread)
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", "0"))
+
+# Explicit Argon2 parameters; when unset the time and memory cost are tuned
+# so one hash takes about ARGON2_TARGET_MS on this host
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "0"))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", "0"))  # KiB
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "1"))
+ARGON2_TARGET_MS = float(os.getenv("ARGON2_TARGET_MS", "50"))
+
+# Starting point of the tuning and the floor it never goes below
+# (OWASP: 19 MiB with 2 passes, or 46 MiB with 1 pass)
+TUNE_MAX_MEMORY = 65536
+MIN_MEMORY = 19456
+MIN_MEMORY_SINGLE_PASS = 47104
+MAX_TIME_COST = 10
+
+HISTOGRAM_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+
+class HasherBusy(Exception):
+    pass
+
+
+class LatencyHistogram:
+    """Counts of samples per latency bucket (upper bounds in ms, last bucket open).
+
+    Samples are observed from the hashing threads, so updates and snapshots
+    hold a lock.
+    """
+
+    def __init__(self, buckets_ms=HISTOGRAM_BUCKETS_MS):
+        self.buckets_ms = buckets_ms
+        self.counts = [0] * (len(buckets_ms) + 1)
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        ms = seconds * 1000
+        bucket = bisect.bisect_left(self.buckets_ms, ms)
+        with self._lock:
+            self.counts[bucket] += 1
+            self.total_ms += ms
+            self.max_ms = max(self.max_ms, ms)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts, total_ms, max_ms = list(self.counts), self.total_ms, self.max_ms
+        count = sum(counts)
+        labels = [f"<={bound}" for bound in self.buckets_ms] + [f">{self.buckets_ms[-1]}"]
+        return {
+            "count": count,
+            "mean_ms": round(total_ms / count, 1) if count else None,
+            "max_ms": round(max_ms, 1),
+            "buckets": dict(zip(labels, counts)),
+        }
+
+
+def _context(time_cost: int, memory_cost: int, parallelism: int) -> CryptContext:
+    return CryptContext(
+        schemes=["argon2"], deprecated="auto",
+        argon2__time_cost=time_cost, argon2__memory_cost=memory_cost, argon2__parallelism=parallelism,
+    )
+
+
+def _measure_ms(time_cost: int, memory_cost: int, parallelism: int, rounds: int = 3) -> float:
+    context = _context(time_cost, memory_cost, parallelism)
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        context.hash("tuning-password")
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def tune_parameters(target_ms: float, parallelism: int) -> dict:
+    """Largest time cost at the highest memory cost that still hashes within target_ms"""
+    memory_cost = TUNE_MAX_MEMORY
+    single_pass_ms = _measure_ms(1, memory_cost, parallelism)
+    while single_pass_ms > target_ms and memory_cost > MIN_MEMORY:
+        memory_cost = max(MIN_MEMORY, memory_cost // 2)
+        single_pass_ms = _measure_ms(1, memory_cost, parallelism)
+
+    # Hashing time grows linearly with the number of passes
+    time_cost = max(1, min(MAX_TIME_COST, int(target_ms // single_pass_ms)))
+    if memory_cost < MIN_MEMORY_SINGLE_PASS:
+        time_cost = max(2, time_cost)
+
+    return {
+        "time_cost": time_cost,
+        "memory_cost": memory_cost,
+        "parallelism": parallelism,
+        "target_ms": target_ms,
+        "measured_ms": round(_measure_ms(time_cost, memory_cost, parallelism), 1),
+    }
+
+
+class PasswordHasher:
+    """Argon2 hashing and verification on a small thread pool, off the event loop.
+
+    At most `max_pending` hashes are queued or running; further calls raise
+    HasherBusy right away so a burst of logins is shed instead of making
+    every request on the worker wait (and holding memory_cost KiB each).
+
+    Parameters come from ARGON2_TIME_COST/ARGON2_MEMORY_COST when set,
+    otherwise they are tuned once per host and shared by all workers
+    through data/password_hash.json.
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_pending: int = PASSWORD_HASH_QUEUE,
+                 params_path: str = os.path.join(DATA_DIR, "password_hash.json")):
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self.max_pending = max_pending or self.workers * 4
+        self.params_path = params_path
+        self.params: Optional[dict] = None
+        self._context: Optional[CryptContext] = None
+        self._configure_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="password-hash")
+
+        self.pending = 0
+        self.max_pending_seen = 0
+        self.rejected = 0
+        self.histograms = {"hash": LatencyHistogram(), "verify": LatencyHistogram(), "wait": LatencyHistogram()}
+
+    def configure(self) -> CryptContext:
+        """Build the hashing context, tuning the parameters on first use"""
+        with self._configure_lock:
+            if self._context is None:
+                self.params = self._load_params()
+                self._context = _context(
+                    self.params["time_cost"], self.params["memory_cost"], self.params["parallelism"]
+                )
+                logger.info(f"Argon2 parameters: t={self.params['time_cost']}, m={self.params['memory_cost']} KiB, "
+                      f"p={self.params['parallelism']} ({self.params.get('measured_ms', '?')} ms per hash)")
+        return self._context
+
+    def _load_params(self) -> dict:
+        if ARGON2_TIME_COST and ARGON2_MEMORY_COST:
+            return {"time_cost": ARGON2_TIME_COST, "memory_cost": ARGON2_MEMORY_COST,
+                    "parallelism": ARGON2_PARALLELISM}
+
+        os.makedirs(os.path.dirname(self.params_path) or ".", exist_ok=True)
+        # Workers start together; the first one tunes while the others wait for its result
+        with open(f"{self.params_path}.lock", "w") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                with open(self.params_path) as f:
+                    params = json.load(f)
+                if params.get("target_ms") == ARGON2_TARGET_MS and params.get("parallelism") == ARGON2_PARALLELISM:
+                    return params
+            except (OSError, ValueError):
+                pass
+
+            params = tune_parameters(ARGON2_TARGET_MS, ARGON2_PARALLELISM)
+            try:
+                with open(self.params_path, "w") as f:
+                    json.dump(params, f)
+            except OSError as e:
+                logger.warning(f"Could not save Argon2 parameters: {e}")
+            return params
+
+    async def warm_up(self):
+        await asyncio.get_running_loop().run_in_executor(self._executor, self.configure)
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", lambda context: context.hash(password))
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run("verify", lambda context: context.verify(password, hashed))
+
+    async def verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """(valid, new hash when the stored one uses outdated parameters)"""
+        return await self._run("verify", lambda context: context.verify_and_update(password, hashed))
+
+    async def _run(self, kind: str, operation):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HasherBusy(f"{self.pending} password hashes already queued")
+
+        self.pending += 1
+        self.max_pending_seen = max(self.max_pending_seen, self.pending)
+        queued = time.perf_counter()
+
+        def job():
+            started = time.perf_counter()
+            self.histograms["wait"].observe(started - queued)
+            try:
+                return operation(self.configure())
+            finally:
+                self.histograms[kind].observe(time.perf_counter() - started)
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, job)
+        finally:
+            self.pending -= 1
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queue_depth": self.pending,
+            "max_queue": self.max_pending,
+            "max_queue_seen": self.max_pending_seen,
+            "rejected": self.rejected,
+            "params": self.params,
+            "latency_ms": {kind: histogram.snapshot() for kind, histogram in self.histograms.items()},
+        }
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,303 @@
+"""Rate limiting shared by all workers.
+
+Every worker uses the one `limiter` defined here, and its counters live in
+a store all workers see:
+
+- REDIS_URL when set (one Lua script round trip per check)
+- otherwise a SQLite file in shared memory (/dev/shm), one transaction per
+  check, for single-host deployments without Redis
+
+RATE_LIMIT_STORAGE_URI overrides both, e.g. memory:// for tests.
+Limits use the sliding window counter strategy and are keyed by user on
+authenticated requests and by client IP otherwise. The limits of async
+endpoints are checked in a worker thread, off the event loop.
+"""
+import asyncio
+import functools
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from math import floor
+
+from fastapi import Request
+from limits.errors import StorageError
+from limits.storage import MemoryStorage, Storage
+from limits.storage.base import SlidingWindowCounterSupport, TimestampedSlidingWindow
+from slowapi import Limiter, _rate_limit_exceeded_handler
+from slowapi.errors import RateLimitExceeded
+from slowapi.util import get_remote_address
+from slowapi.wrappers import LimitGroup
+
+from services.auth_service import AuthService
+from services.import_progress import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+SHARED_MEMORY_DIR = "/dev/shm"
+# Expired counters are purged every this many writes
+PURGE_INTERVAL = 1000
+# How long counting stays in memory after the shared store failed
+STORAGE_RETRY_SECONDS = 30
+
+
+def default_storage_uri() -> str:
+    if os.getenv("RATE_LIMIT_STORAGE_URI"):
+        return os.getenv("RATE_LIMIT_STORAGE_URI")
+    if os.getenv("REDIS_URL"):
+        return os.getenv("REDIS_URL")
+    directory = SHARED_MEMORY_DIR if os.path.isdir(SHARED_MEMORY_DIR) else DATA_DIR
+    return f"sqlite:///{os.path.abspath(os.path.join(directory, 'mybiotracker-rate-limits.db'))}"
+
+
+class SQLiteStorage(Storage, SlidingWindowCounterSupport, TimestampedSlidingWindow):
+    """limits storage in a SQLite file, shared by the processes that open it (sqlite:///path)"""
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    def __init__(self, uri: str, wrap_exceptions: bool = False, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        # sqlite:////abs/path or sqlite:///relative/path
+        self.path = uri[len("sqlite:///"):]
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._connection = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=OFF")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limits (key TEXT PRIMARY KEY, count INTEGER NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _get(self, key: str, now: float) -> int:
+        row = self._connection.execute(
+            "SELECT count FROM rate_limits WHERE key = ? AND expires_at > ?", (key, now)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def _incr(self, key: str, expiry: float, amount: int, now: float) -> int:
+        # An expired counter starts over with a new expiry
+        self._connection.execute(
+            "INSERT INTO rate_limits (key, count, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET "
+            "count = CASE WHEN expires_at > ? THEN count + excluded.count ELSE excluded.count END, "
+            "expires_at = CASE WHEN expires_at > ? THEN expires_at ELSE excluded.expires_at END",
+            (key, amount, now + expiry, now, now),
+        )
+        self._writes += 1
+        if self._writes % PURGE_INTERVAL == 0:
+            self._connection.execute("DELETE FROM rate_limits WHERE expires_at <= ?", (now,))
+        return self._get(key, now)
+
+    def _transaction(self, operation):
+        with self._lock:
+            self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                result = operation(time.time())
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+            return result
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        return self._transaction(lambda now: self._incr(key, expiry, amount, now))
+
+    def get(self, key: str) -> int:
+        with self._lock:
+            return self._get(key, time.time())
+
+    def get_expiry(self, key: str) -> float:
+        with self._lock:
+            row = self._connection.execute("SELECT expires_at FROM rate_limits WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else time.time()
+
+    def check(self) -> bool:
+        try:
+            with self._lock:
+                self._connection.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self) -> int:
+        with self._lock:
+            return self._connection.execute("DELETE FROM rate_limits").rowcount
+
+    def clear(self, key: str) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM rate_limits WHERE key = ?", (key,))
+
+    def _window(self, key: str, expiry: int, now: float):
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        previous_count = self._get(previous_key, now)
+        current_count = self._get(current_key, now)
+        previous_ttl = (1 - (((now - expiry) / expiry) % 1)) * expiry if previous_count else 0.0
+        current_ttl = (1 - ((now / expiry) % 1)) * expiry + expiry
+        return current_key, previous_count, previous_ttl, current_count, current_ttl
+
+    def acquire_sliding_window_entry(self, key: str, limit: int, expiry: int, amount: int = 1) -> bool:
+        if amount > limit:
+            return False
+
+        def acquire(now: float) -> bool:
+            # Read and increment in one transaction, so concurrent workers cannot both take the last slot
+            current_key, previous_count, previous_ttl, current_count, _ = self._window(key, expiry, now)
+            if floor(previous_count * previous_ttl / expiry + current_count) + amount > limit:
+                return False
+            self._incr(current_key, 2 * expiry, amount, now)
+            return True
+
+        return self._transaction(acquire)
+
+    def get_sliding_window(self, key: str, expiry: int):
+        with self._lock:
+            _, previous_count, previous_ttl, current_count, current_ttl = self._window(key, expiry, time.time())
+        return previous_count, previous_ttl, current_count, current_ttl
+
+    def clear_sliding_window(self, key: str, expiry: int) -> None:
+        for window_key in self.sliding_window_keys(key, expiry, time.time()):
+            self.clear(window_key)
+
+
+_auth_service = AuthService()
+
+
+def rate_limit_key(request: Request) -> str:
+    """user:<id> for requests with a valid access token, ip:<address> otherwise.
+
+    Worked out on first use and kept on the request, so the token is decoded
+    at most once however many callers ask.
+    """
+    key = getattr(request.state, "rate_limit_key", None)
+    if key is None:
+        key = f"ip:{get_remote_address(request)}"
+        authorization = request.headers.get("authorization", "")
+        if authorization.lower().startswith("bearer "):
+            payload = _auth_service.verify_token(authorization[7:])
+            if payload and payload.get("user_id") is not None:
+                key = f"user:{payload['user_id']}"
+        request.state.rate_limit_key = key
+    return key
+
+
+class RateLimitMetrics:
+    def __init__(self):
+        self.rejections = Counter()
+
+    def record_rejection(self, request: Request, exc: RateLimitExceeded):
+        kind = rate_limit_key(request).split(":", 1)[0]
+        self.rejections[(request.url.path, str(exc.limit.limit), kind)] += 1
+
+    def stats(self) -> dict:
+        return {
+            "storage": type(limiter.limiter.storage).__name__,
+            "storage_dead": limiter.storage_down,
+            "storage_errors": limiter.storage_errors,
+            "rejected": sum(self.rejections.values()),
+            "rejections": [
+                {"path": path, "limit": limit, "key": kind, "count": count}
+                for (path, limit, kind), count in self.rejections.most_common()
+            ],
+        }
+
+
+rate_limit_metrics = RateLimitMetrics()
+
+
+class ThreadedLimiter(Limiter):
+    """slowapi's Limiter, checking the limits of async endpoints in a worker thread.
+
+    slowapi checks limits synchronously inside the endpoint; with a shared
+    store every check is a round trip to it (on SQLite possibly a wait for
+    another worker's transaction) that would hold up the event loop. The
+    limits of async endpoints are counted in a thread instead, through the
+    public RateLimiter.hit(), and the request is marked as checked so
+    slowapi's own wrapper skips it. While the shared store fails, counting
+    moves to this worker's memory for STORAGE_RETRY_SECONDS.
+    """
+
+    def __init__(self, key_func, key_prefix: str = "", **kwargs):
+        super().__init__(key_func=key_func, key_prefix=key_prefix, **kwargs)
+        self.key_func = key_func
+        self.key_prefix = key_prefix
+        self.fallback = type(self.limiter)(MemoryStorage())
+        self.storage_errors = 0
+        self._retry_storage_at = 0.0
+
+    @property
+    def storage_down(self) -> bool:
+        return time.monotonic() < self._retry_storage_at
+
+    def limit(self, limit_value, **kwargs):
+        decorator = super().limit(limit_value, **kwargs)
+
+        def wrap(func):
+            limited = decorator(func)
+            # Limits computed per request or with options are left to slowapi
+            if not asyncio.iscoroutinefunction(func) or callable(limit_value) or kwargs:
+                return limited
+            limits = list(LimitGroup(limit_value, self.key_func, None, False, None, None, None, 1, True))
+
+            @functools.wraps(func)
+            async def check_in_thread(*func_args, **func_kwargs):
+                request = func_kwargs.get("request")
+                if request is None:
+                    request = next((arg for arg in func_args if isinstance(arg, Request)), None)
+                if self.enabled and isinstance(request, Request) \
+                        and not getattr(request.state, "_rate_limiting_complete", False):
+                    await asyncio.to_thread(self.hit, request, limits)
+                    request.state._rate_limiting_complete = True
+                return await limited(*func_args, **func_kwargs)
+
+            return check_in_thread
+
+        return wrap
+
+    def hit(self, request: Request, limits: list):
+        """Count the request against limits; RateLimitExceeded for the first one it exceeds"""
+        # Keyed like slowapi's own checks (key_style "url"), so both count alike
+        identifiers = [self.key_func(request), request["path"]]
+        if self.key_prefix:
+            identifiers.insert(0, self.key_prefix)
+
+        request.state.view_rate_limit = None
+        for limit in limits:
+            if not self._hit(limit.limit, identifiers):
+                logger.warning(f"Rate limit {limit.limit} exceeded by {identifiers[-2]} at {identifiers[-1]}")
+                request.state.view_rate_limit = (limit.limit, identifiers)
+                raise RateLimitExceeded(limit)
+
+    def _hit(self, item, identifiers: list) -> bool:
+        if not self.storage_down:
+            try:
+                return self.limiter.hit(item, *identifiers)
+            except StorageError as e:
+                self.storage_errors += 1
+                self._retry_storage_at = time.monotonic() + STORAGE_RETRY_SECONDS
+                logger.warning(f"Rate limit storage unreachable, counting in memory for "
+                               f"{STORAGE_RETRY_SECONDS}s: {e}")
+        return self.fallback.hit(item, *identifiers)
+
+
+limiter = ThreadedLimiter(
+    key_func=rate_limit_key,
+    storage_uri=default_storage_uri(),
+    strategy="sliding-window-counter",
+    key_prefix="mybiotracker",
+    # Storage failures surface as limits' StorageError
+    storage_options={"wrap_exceptions": True},
+    # Counters move to this worker's memory while the shared store is unreachable
+    in_memory_fallback_enabled=True,
+)
+
+
+def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded):
+    rate_limit_metrics.record_rejection(request, exc)
+    return _rate_limit_exceeded_handler(request, exc)
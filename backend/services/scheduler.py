@@ -1,42 +1,61 @@
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 from datetime import datetime
 import asyncio
+import logging
 import os
+from database import refresh_statistics
 from services.food_db_service import FoodDatabaseService
+from services.food_fuzzy import food_fuzzy
+from services.food_suggest import food_suggest
+from services.token_revocation import token_revocations
+
+logger = logging.getLogger(__name__)
 
 scheduler = AsyncIOScheduler()
 
+# How often each worker checks the catalog version for changes made by others
+FOOD_INDEX_UPDATE_SECONDS = 5
+
 async def update_food_database():
-    """Update food database from OpenFoodFacts"""
+    """Apply changes from the latest OpenFoodFacts dump to the food database"""
     try:
-        print("Starting scheduled food database update...")
+        logger.info("Starting scheduled food database update...")
         food_service = FoodDatabaseService()
-        await food_service.download_and_import_food_data()
-        print("Food database update completed successfully")
+        stats = await food_service.refresh_food_database()
+        if stats:
+            logger.info("Food database update completed successfully")
+    except Exception as e:
+        logger.exception(f"Error updating food database: {e}")
+
+async def update_food_indexes():
+    """Bring this worker's in-memory food indexes up to date with the catalog"""
+    try:
+        await food_suggest.update()
+        await food_fuzzy.update()
     except Exception as e:
-        print(f"Error updating food database: {e}")
+        logger.exception(f"Error updating food indexes: {e}")
 
 async def cleanup_old_sessions():
     """Clean up expired sessions and tokens"""
     try:
-        print("Starting session cleanup...")
-        # TODO: Implement session cleanup logic
-        # This would involve removing expired tokens from a blacklist
-        # or cleaning up expired session data from Redis
-        print("Session cleanup completed")
+        logger.info("Starting session cleanup...")
+        removed = await token_revocations.cleanup()
+        logger.info(f"Session cleanup completed, {removed} expired token revocations removed")
+        await refresh_statistics()
     except Exception as e:
-        print(f"Error during session cleanup: {e}")
+        logger.exception(f"Error during session cleanup: {e}")
 
 async def generate_daily_health_facts():
     """Generate daily health facts for users"""
     try:
-        print("Generating daily health facts...")
+        logger.info("Generating daily health facts...")
         # Implement health facts generation
         # This could involve creating daily tips, reminders, or insights
-        print("Daily health facts generated")
+        logger.info("Daily health facts generated")
     except Exception as e:
-        print(f"Error generating health facts: {e}")
+        logger.exception(f"Error generating health facts: {e}")
 
 def start_scheduler():
     """Start the background scheduler"""
@@ -50,6 +69,16 @@ def start_scheduler():
                 replace_existing=True
             )
 
+        # Every worker keeps its own food indexes; follow imports and new foods from the others
+        scheduler.add_job(
+            update_food_indexes,
+            IntervalTrigger(seconds=FOOD_INDEX_UPDATE_SECONDS),
+            id="update_food_indexes",
+            replace_existing=True,
+            coalesce=True,
+            max_instances=1
+        )
+
         # Clean up sessions daily at 3 AM
         scheduler.add_job(
             cleanup_old_sessions,
@@ -67,13 +96,13 @@ def start_scheduler():
         )
 
         scheduler.start()
-        print("Background scheduler started successfully")
+        logger.info("Background scheduler started successfully")
         
     except Exception as e:
-        print(f"Error starting scheduler: {e}")
+        logger.exception(f"Error starting scheduler: {e}")
 
 def stop_scheduler():
     """Stop the background scheduler"""
     if scheduler.running:
         scheduler.shutdown()
-        print("Background scheduler stopped")
+        logger.info("Background scheduler stopped")
@@ -0,0 +1,200 @@
+"""Per-request SQL statistics, switched on with SQL_INSTRUMENTATION=true.
+
+For every request the statements, database time and rows returned by its
+queries (not the RETURNING rows of ORM flushes) are counted and reported
+
+- in a Server-Timing header (shown next to the request in browser dev tools)
+- in one JSON line on the mybiotracker.sql logger
+
+The same SQL running SQL_N_PLUS_ONE_THRESHOLD times or more within one
+request is flagged as a likely N+1 query: the log line is a warning then
+and lists the statements. Switched off, neither the engine events nor the
+middleware are installed, so requests pay nothing for it.
+"""
+import json
+import logging
+import os
+import sys
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import CursorResult, Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import TextClause
+
+SQL_INSTRUMENTATION = os.getenv("SQL_INSTRUMENTATION", "false").lower() == "true"
+SQL_N_PLUS_ONE_THRESHOLD = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", "5"))
+# Flagged statements kept for the admin stats
+MAX_FLAGGED_STATEMENTS = 50
+
+logger = logging.getLogger("mybiotracker.sql")
+
+
+class RequestQueries:
+    """SQL statistics of one request"""
+
+    def __init__(self):
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.rows = 0
+        self.sql = Counter()
+
+    def record(self, statement: str, seconds: float, rows: int):
+        self.statements += 1
+        self.db_seconds += seconds
+        self.rows += rows
+        self.sql[statement] += 1
+
+    def repeated(self, threshold: int = SQL_N_PLUS_ONE_THRESHOLD) -> list:
+        return [(statement, count) for statement, count in self.sql.most_common() if count >= threshold]
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.db_seconds * 1000:.1f};desc="{self.statements} queries, {self.rows} rows"'
+
+
+current_queries: ContextVar[Optional[RequestQueries]] = ContextVar("current_queries", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_queries.get() is not None and context is not None:
+        context._sql_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    queries = current_queries.get()
+    started = getattr(context, "_sql_started", None)
+    if queries is None or started is None:
+        return
+    # Rows returned are counted by _count_rows; rowcount is -1 for a SQLite SELECT
+    queries.record(statement, time.perf_counter() - started, 0)
+
+
+def _count_rows(orm_execute_state):
+    """Count the rows a session statement returns (requests query through sessions)"""
+    queries = current_queries.get()
+    statement = orm_execute_state.statement
+    if queries is None or not (orm_execute_state.is_select or isinstance(statement, TextClause)):
+        return None
+    options = orm_execute_state.execution_options
+    if options.get("yield_per") or options.get("stream_results"):
+        return None
+
+    result = orm_execute_state.invoke_statement()
+    if isinstance(result, CursorResult) and not result.returns_rows:
+        return result
+    # The async drivers have fetched the rows already; buffering them again costs no query
+    frozen = result.freeze()
+    queries.rows += len(frozen.data)
+    return frozen()
+
+
+class SQLInstrumentation:
+    def __init__(self, threshold: int = SQL_N_PLUS_ONE_THRESHOLD):
+        self.threshold = threshold
+        self.enabled = False
+        self.requests = 0
+        self.statements = 0
+        self.db_seconds = 0.0
+        self.flagged_requests = 0
+        self.flagged = Counter()
+
+    def install(self):
+        """Listen to every engine; they only record while a request is measured"""
+        if self.enabled:
+            return
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Session, "do_orm_execute", _count_rows)
+        if not logger.handlers:
+            handler = logging.StreamHandler(sys.stdout)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+        self.enabled = True
+
+    def report(self, method: str, endpoint: str, status: int, duration: float, queries: RequestQueries):
+        repeated = queries.repeated(self.threshold)
+        self.requests += 1
+        self.statements += queries.statements
+        self.db_seconds += queries.db_seconds
+        if repeated:
+            self.flagged_requests += 1
+            for statement, count in repeated:
+                if (endpoint, statement) in self.flagged or len(self.flagged) < MAX_FLAGGED_STATEMENTS:
+                    self.flagged[(endpoint, statement)] += 1
+
+        line = {
+            "method": method,
+            "endpoint": endpoint,
+            "status": status,
+            "duration_ms": round(duration * 1000, 1),
+            "statements": queries.statements,
+            "db_ms": round(queries.db_seconds * 1000, 1),
+            "rows": queries.rows,
+        }
+        if repeated:
+            line["n_plus_one"] = [{"count": count, "statement": " ".join(statement.split())[:300]}
+                                  for statement, count in repeated]
+            logger.warning(json.dumps(line))
+        else:
+            logger.info(json.dumps(line))
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "n_plus_one_threshold": self.threshold,
+            "requests": self.requests,
+            "mean_statements": round(self.statements / self.requests, 2) if self.requests else None,
+            "mean_db_ms": round(self.db_seconds / self.requests * 1000, 2) if self.requests else None,
+            "flagged_requests": self.flagged_requests,
+            "flagged": [
+                {"endpoint": endpoint, "statement": " ".join(statement.split())[:300], "requests": count}
+                for (endpoint, statement), count in self.flagged.most_common()
+            ],
+        }
+
+
+sql_instrumentation = SQLInstrumentation()
+
+
+def _endpoint_name(scope) -> str:
+    endpoint = scope.get("endpoint")
+    if endpoint is None:
+        return scope.get("path", "")
+    return f"{endpoint.__module__}.{endpoint.__name__}"
+
+
+class SQLInstrumentationMiddleware:
+    """ASGI middleware measuring the SQL of each HTTP request"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        queries = RequestQueries()
+        token = current_queries.set(queries)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", queries.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_queries.reset(token)
+            sql_instrumentation.report(scope["method"], _endpoint_name(scope), status,
+                                       time.perf_counter() - started, queries)
@@ -0,0 +1,95 @@
+import os
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.caffeine import CaffeineEntry
+from models.nutrition import Meal
+from models.profile import UserProfile
+from services.food_cache import CatalogVersion, VersionedLRUCache
+from services.import_progress import DATA_DIR
+
+# Timestamps are stored as naive UTC; days are the user's calendar days in
+# the timezone of their profile (UTC without one)
+USER_TIMEZONE_CACHE_TTL_SECONDS = 300
+USER_TIMEZONE_CACHE_MAX_ENTRIES = 10000
+# Rows whose local_date is recomputed per statement after a timezone change
+LOCAL_DATE_BATCH_SIZE = 5000
+
+UTC = ZoneInfo("UTC")
+
+# Bumped when a profile's timezone changes; every worker drops its cached zones
+timezone_version = CatalogVersion(os.path.join(DATA_DIR, "timezones.version"))
+timezone_cache = VersionedLRUCache(timezone_version, USER_TIMEZONE_CACHE_MAX_ENTRIES, USER_TIMEZONE_CACHE_TTL_SECONDS)
+
+
+def zone(name: Optional[str]) -> ZoneInfo:
+    """ZoneInfo for an IANA name, UTC for empty or unknown names"""
+    if not name:
+        return UTC
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return UTC
+
+
+async def user_timezone(db: AsyncSession, user_id: int) -> ZoneInfo:
+    version = timezone_version.current()
+    found, tz = timezone_cache.get(user_id, version)
+    if not found:
+        name = await db.scalar(select(UserProfile.timezone).where(UserProfile.user_id == user_id))
+        tz = zone(name)
+        timezone_cache.set(user_id, tz, version)
+    return tz
+
+
+def invalidate_user_timezones():
+    timezone_version.bump()
+
+
+async def relocalize_user_days(db: AsyncSession, user_id: int, tz: ZoneInfo):
+    """Recompute the stored local_date of a user's meals and caffeine entries for a
+    new timezone, in batches; part of the caller's transaction"""
+    for model, moment in ((Meal, Meal.eaten_at), (CaffeineEntry, CaffeineEntry.consumed_at)):
+        last_id = 0
+        while True:
+            rows = (await db.execute(
+                select(model.id, moment).where(model.user_id == user_id, model.id > last_id)
+                .order_by(model.id).limit(LOCAL_DATE_BATCH_SIZE)
+            )).all()
+            if not rows:
+                break
+            await db.execute(update(model), [{"id": row_id, "local_date": local_date(at, tz)} for row_id, at in rows])
+            last_id = rows[-1].id
+
+
+def to_utc(moment: datetime) -> datetime:
+    """Naive UTC for storage; naive input is taken to be UTC already"""
+    if moment.tzinfo is None:
+        return moment
+    return moment.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def local_date(moment: datetime, tz: ZoneInfo) -> date:
+    """The user's calendar day of a stored (naive UTC) timestamp"""
+    return moment.replace(tzinfo=timezone.utc).astimezone(tz).date()
+
+
+def local_today(tz: ZoneInfo) -> date:
+    return datetime.now(tz).date()
+
+
+def day_range(first: date, last: date, tz: ZoneInfo) -> Tuple[datetime, datetime]:
+    """[start, end) in naive UTC covering the local days first..last.
+
+    Compared against the bare timestamp column, so the (user_id, time)
+    indexes answer it with a range scan; wrapping the column in date()
+    would not. Days are not always 24 hours long, so each boundary is
+    the local midnight converted on its own.
+    """
+    start = datetime.combine(first, time.min, tzinfo=tz)
+    end = datetime.combine(last + timedelta(days=1), time.min, tzinfo=tz)
+    return to_utc(start), to_utc(end)
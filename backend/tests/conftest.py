@@ -0,0 +1,246 @@
+"""The API test harness.
+
+The app runs against a temporary SQLite file that is seeded once and
+restored before every test. Requests go through an httpx AsyncClient over
+ASGI, without a server or the lifespan (no food import, no scheduler).
+`api.measure()` also reports the statements a request ran and the rows
+it scanned, for the query budgets in test_query_budgets.py.
+"""
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+from contextlib import closing
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+# The modules below read their settings at import time
+WORK_DIR = tempfile.mkdtemp(prefix="mybiotracker-tests-")
+DATABASE_FILE = os.path.join(WORK_DIR, "api.db")
+TEMPLATE_FILE = os.path.join(WORK_DIR, "api-seeded.db")
+os.environ.update({
+    "DATABASE_URL": f"sqlite+aiosqlite:///{DATABASE_FILE}",
+    "DATABASE_READ_URL": "",
+    "ENVIRONMENT": "development",
+    "RATE_LIMIT_STORAGE_URI": "memory://",
+    # The harness measures requests itself
+    "SQL_INSTRUMENTATION": "false",
+    # Fast hashes; the login tests are about queries, not Argon2
+    "ARGON2_TIME_COST": "1",
+    "ARGON2_MEMORY_COST": "1024",
+})
+
+import asyncio  # noqa: E402
+
+import httpx  # noqa: E402
+import pytest  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+from sqlalchemy.engine import Engine  # noqa: E402
+
+import database  # noqa: E402
+from main import app  # noqa: E402
+from models.caffeine import CaffeineEntry, CaffeineProduct  # noqa: E402
+from models.nutrition import FoodItem, Meal, NutritionEntry  # noqa: E402
+from models.profile import UserProfile  # noqa: E402
+from models.user import User  # noqa: E402
+from services.auth_service import AuthService  # noqa: E402
+from services.food_cache import food_cache  # noqa: E402
+from services.food_search import food_search  # noqa: E402
+from services.identity_cache import identity_cache  # noqa: E402
+from services.password_hasher import password_hasher  # noqa: E402
+from services.rate_limit import limiter  # noqa: E402
+from services.sql_instrumentation import RequestQueries, current_queries, sql_instrumentation  # noqa: E402
+from services.token_revocation import token_revocations  # noqa: E402
+from services.user_time import local_date, timezone_cache, zone  # noqa: E402
+
+PASSWORD = "correct horse battery"
+NOW = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+
+# Seeded users: the admin, Alice (the user most tests act as), Bob with 2FA
+# enabled, and OTHER_USERS more users with the same amount of data as Alice
+ADMIN_ID, ALICE_ID, BOB_ID = 1, 2, 3
+OTHER_USERS = 20
+FOODS = 300
+# Alice and every other user log a meal every 6 hours and a coffee every 8 hours
+SEEDED_DAYS = 30
+
+
+@dataclass
+class MeasuredRequest:
+    response: httpx.Response
+    statements: int = 0
+    rows_returned: int = 0
+    rows_scanned: int = 0
+    sql: list = field(default_factory=list)
+
+    def report(self) -> str:
+        lines = [f"{self.statements} statements, {self.rows_returned} rows returned, {self.rows_scanned} rows scanned"]
+        lines += [f"  {' '.join(statement.split())[:200]}" for statement, _ in self.sql]
+        return "\n".join(lines)
+
+
+_captured = None
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _capture_statement(conn, cursor, statement, parameters, context, executemany):
+    if _captured is not None and not executemany:
+        _captured.append((statement, parameters))
+
+
+def rows_scanned(statements: list, rows_returned: int) -> int:
+    """Rows returned plus every row of each table a statement's plan walks in full.
+
+    SQLite does not count the rows it reads, so a full table or index scan
+    is charged the table's size; searches through an index are covered by
+    the rows they return.
+    """
+    with closing(sqlite3.connect(DATABASE_FILE)) as conn:
+        tables = [name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        table_rows = {name: conn.execute(f'SELECT count(*) FROM "{name}"').fetchone()[0] for name in tables}
+        scanned = rows_returned
+        for statement, parameters in statements:
+            if not re.match(r"\s*(SELECT|WITH|UPDATE|DELETE)\b", statement, re.IGNORECASE):
+                continue
+            for *_, detail in conn.execute(f"EXPLAIN QUERY PLAN {statement}", parameters or ()):
+                match = re.match(r"SCAN (\w+)", detail)
+                if match and "VIRTUAL TABLE" not in detail:
+                    scanned += table_rows.get(match.group(1), 0)
+    return scanned
+
+
+async def _seed():
+    hashed_password = await password_hasher.hash(PASSWORD)
+    berlin = zone("Europe/Berlin")
+    user_ids = [ADMIN_ID, ALICE_ID, BOB_ID] + list(range(BOB_ID + 1, BOB_ID + 1 + OTHER_USERS))
+    meal_times = [NOW - timedelta(hours=6 * i) for i in range(SEEDED_DAYS * 4)]
+    coffee_times = [NOW - timedelta(hours=8 * i) for i in range(SEEDED_DAYS * 3)]
+
+    async with database.engine.begin() as conn:
+        await conn.execute(User.__table__.insert(), [
+            {"id": user_id, "email": f"user{user_id}@example.com", "hashed_password": hashed_password,
+             "is_active": True, "is_admin": user_id == ADMIN_ID, "is_2fa_enabled": user_id == BOB_ID,
+             "totp_secret": "JBSWY3DPEHPK3PXP" if user_id == BOB_ID else None, "failed_login_attempts": 0}
+            for user_id in user_ids
+        ])
+        await conn.execute(UserProfile.__table__.insert(), [
+            {"user_id": user_id, "timezone": "Europe/Berlin"} for user_id in user_ids
+        ])
+        await conn.execute(FoodItem.__table__.insert(), [
+            {"id": food_id, "barcode": f"40000000{food_id:05d}", "name": f"Oat flakes {food_id}",
+             "brand": f"Brand {food_id % 10}", "category": "cereals", "calories_per_100g": 370,
+             "protein_per_100g": 13, "carbs_per_100g": 59, "fat_per_100g": 7, "is_verified": food_id % 2 == 0}
+            for food_id in range(1, FOODS + 1)
+        ])
+        await conn.execute(CaffeineProduct.__table__.insert(), [
+            {"id": product_id, "name": f"Coffee {product_id}", "category": "coffee",
+             "caffeine_mg_per_serving": 60 + product_id, "half_life_hours": 5.0}
+            for product_id in range(1, 21)
+        ])
+
+        meals, entries, coffees = [], [], []
+        for user_id in user_ids:
+            for eaten_at in meal_times:
+                meal_id = len(meals) + 1
+                meals.append({"id": meal_id, "user_id": user_id, "name": "Meal", "meal_type": "lunch",
+                              "eaten_at": eaten_at, "local_date": local_date(eaten_at, berlin)})
+                entries += [{"user_id": user_id, "meal_id": meal_id, "food_item_id": (meal_id + n) % FOODS + 1,
+                             "amount_grams": 80} for n in range(2)]
+            coffees += [{"user_id": user_id, "product_id": user_id % 20 + 1, "consumed_at": consumed_at,
+                         "local_date": local_date(consumed_at, berlin), "amount_servings": 1.0}
+                        for consumed_at in coffee_times]
+        await conn.execute(Meal.__table__.insert(), meals)
+        await conn.execute(NutritionEntry.__table__.insert(), entries)
+        await conn.execute(CaffeineEntry.__table__.insert(), coffees)
+
+    await food_search.ensure_index()
+    await database.refresh_statistics()
+    await _dispose_engines()
+
+
+async def _dispose_engines():
+    # Pooled connections belong to the event loop of the test that opened them
+    await database.engine.dispose()
+    if database.read_engine is not database.engine:
+        await database.read_engine.dispose()
+
+
+def _copy_database(source: str, target: str):
+    with closing(sqlite3.connect(source)) as src, closing(sqlite3.connect(target)) as dst:
+        src.backup(dst)
+
+
+class ApiClient:
+    """Sends requests to the app, each test in an event loop of its own"""
+
+    def __init__(self):
+        self.auth_service = AuthService()
+
+    def token(self, user_id: int) -> str:
+        data = {"sub": f"user{user_id}@example.com", "user_id": user_id}
+        return self.auth_service.create_access_token(data=data, family=self.auth_service.new_token_family())
+
+    def refresh_token(self, user_id: int) -> str:
+        data = {"sub": f"user{user_id}@example.com", "user_id": user_id}
+        return self.auth_service.create_refresh_token(data=data, family=self.auth_service.new_token_family())
+
+    def headers(self, user_id: int = None, token: str = None) -> dict:
+        token = token or (self.token(user_id) if user_id is not None else None)
+        return {"Authorization": f"Bearer {token}"} if token else {}
+
+    def measure(self, method: str, path: str, user: int = None, token: str = None, **kwargs) -> MeasuredRequest:
+        """One request with cold per-worker caches, and the SQL it ran"""
+        return asyncio.run(self._measure(method, path, self.headers(user, token), kwargs))
+
+    async def _measure(self, method: str, path: str, headers: dict, kwargs: dict) -> MeasuredRequest:
+        global _captured
+
+        for cache in (identity_cache, food_cache, timezone_cache):
+            cache._entries.clear()
+        await token_revocations.load()
+
+        queries, statements = RequestQueries(), []
+        transport = httpx.ASGITransport(app=app)
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+                context = current_queries.set(queries)
+                _captured = statements
+                try:
+                    response = await client.request(method, path, headers=headers, **kwargs)
+                finally:
+                    _captured = None
+                    current_queries.reset(context)
+        finally:
+            await _dispose_engines()
+
+        return MeasuredRequest(
+            response=response,
+            statements=queries.statements,
+            rows_returned=queries.rows,
+            rows_scanned=rows_scanned(statements, queries.rows),
+            sql=statements,
+        )
+
+
+@pytest.fixture(scope="session")
+def seeded_database():
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        # Version files and locks live under data/ in the working directory
+        monkeypatch.chdir(WORK_DIR)
+        monkeypatch.setattr(limiter, "enabled", False)
+        sql_instrumentation.install()
+        database.upgrade_database()
+        asyncio.run(_seed())
+        _copy_database(DATABASE_FILE, TEMPLATE_FILE)
+        yield TEMPLATE_FILE
+    password_hasher.shutdown()
+    shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def api(seeded_database, monkeypatch):
+    """A client for the app over a freshly restored copy of the seeded database"""
+    monkeypatch.chdir(WORK_DIR)
+    _copy_database(seeded_database, DATABASE_FILE)
+    return ApiClient()
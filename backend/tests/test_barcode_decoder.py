@@ -0,0 +1,60 @@
+"""The decode timeout counts decoding only, and a stuck decoder fails only its own scan"""
+import asyncio
+import time
+
+import pytest
+
+from services import barcode_decoder
+from services.barcode_decoder import BarcodeDecoderPool, DecodeTimeout
+
+
+def sleeping_decoder(contents: bytes):
+    # Stands in for decode_image in the decoder processes: sleeps for the seconds it is sent
+    seconds = float(contents.decode())
+    time.sleep(seconds)
+    return [contents.decode()], None, seconds
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(barcode_decoder, "decode_image", sleeping_decoder)
+    return BarcodeDecoderPool(workers=2, max_pending=10, timeout=1.5)
+
+
+def test_waiting_for_a_decoder_is_not_timed(pool):
+    async def scan():
+        # Start the processes, spawning them is not what is measured here
+        await asyncio.gather(pool.decode(b"0.1"), pool.decode(b"0.1"))
+        started = time.perf_counter()
+        results = await asyncio.gather(*[pool.decode(b"0.8") for _ in range(6)])
+        return results, time.perf_counter() - started
+
+    try:
+        results, seconds = asyncio.run(scan())
+    finally:
+        pool.shutdown()
+    # The last scans waited longer than the timeout before a process was free
+    assert seconds > pool.timeout
+    assert results == [["0.8"]] * 6 and pool.timeouts == 0
+
+
+def test_stuck_decoder_does_not_fail_other_scans(pool):
+    async def scan():
+        await asyncio.gather(pool.decode(b"0.1"), pool.decode(b"0.1"))
+        stuck = asyncio.ensure_future(pool.decode(b"30"))
+        await asyncio.sleep(1.0)
+        # Still running in the pool of the stuck scan when that one times out
+        other = await pool.decode(b"1.2")
+        with pytest.raises(DecodeTimeout):
+            await stuck
+        retired = pool.stats()["retired_pools"]
+        return other, retired, await pool.decode(b"0.1")
+
+    try:
+        other, retired, after = asyncio.run(scan())
+    finally:
+        pool.shutdown()
+    assert other == ["1.2"] and after == ["0.1"]
+    assert pool.timeouts == 1 and pool.failed == 0
+    # The old pool was stopped once the other scan was done
+    assert retired == 0 and len(pool._running) == 0
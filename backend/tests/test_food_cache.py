@@ -0,0 +1,46 @@
+"""Cached lookups and catalog version bumps that land while a lookup runs"""
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from conftest import ALICE_ID
+from services.food_cache import CatalogVersion, VersionedLRUCache, catalog_version, food_cache
+
+
+@pytest.fixture
+def bump_during_catalog_query():
+    """Bumps the catalog version as the first food_items query reaches the database"""
+    bumped = []
+
+    def bump(conn, cursor, statement, parameters, context, executemany):
+        if "food_items" in statement and not bumped:
+            bumped.append(catalog_version.bump())
+
+    event.listen(Engine, "before_cursor_execute", bump)
+    yield bumped
+    event.remove(Engine, "before_cursor_execute", bump)
+
+
+def test_value_loaded_before_a_bump_is_not_cached_under_the_new_version(tmp_path):
+    version = CatalogVersion(str(tmp_path / "catalog.version"))
+    cache = VersionedLRUCache(version)
+
+    read = version.current()
+    assert cache.get("key", read) == (False, None)
+    version.bump()
+    cache.set("key", "loaded from the old catalog", read)
+
+    assert cache.get("key") == (False, None)
+
+
+@pytest.mark.parametrize("path, params, key", [
+    ("/api/nutrition/foods/barcode/4000000000012", None, ("barcode", "4000000000012")),
+    ("/api/nutrition/foods/search", {"q": "oat flakes 12"}, ("search", False, "oat flakes 12", 20)),
+])
+def test_lookup_during_a_bump_is_not_served_from_the_cache(api, bump_during_catalog_query, path, params, key):
+    response = api.measure("GET", path, user=ALICE_ID, params=params).response
+    assert response.status_code == 200, response.text
+    assert bump_during_catalog_query
+
+    # The result may predate the bump, so the next request loads it again
+    assert food_cache.get(key) == (False, None)
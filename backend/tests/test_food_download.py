@@ -0,0 +1,116 @@
+"""The dump downloader against a local stand-in for the OpenFoodFacts server"""
+import asyncio
+import hashlib
+import json
+
+import httpx
+import pytest
+
+from services.food_download import DownloadError, FoodDumpDownloader
+
+DUMP = bytes(range(256)) * 40
+ETAG = '"dump-v1"'
+URL = "https://static.example.org/products.jsonl.gz"
+
+
+class DumpServer:
+    """Serves DUMP with an ETag, honouring If-None-Match, Range and If-Range"""
+
+    def __init__(self, ranges: bool = True):
+        self.ranges = ranges
+        self.requests = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        headers = {"etag": ETAG}
+        if request.headers.get("if-none-match") == ETAG:
+            return httpx.Response(304, headers=headers)
+        byte_range = request.headers.get("range")
+        if self.ranges and byte_range and request.headers.get("if-range") == ETAG:
+            start = int(byte_range[len("bytes="):].rstrip("-"))
+            if start >= len(DUMP):
+                return httpx.Response(416, headers={**headers, "content-range": f"bytes */{len(DUMP)}"})
+            return httpx.Response(206, content=DUMP[start:], headers={
+                **headers, "content-range": f"bytes {start}-{len(DUMP) - 1}/{len(DUMP)}"})
+        return httpx.Response(200, content=DUMP, headers={**headers, "content-length": str(len(DUMP))})
+
+
+@pytest.fixture
+def dest(tmp_path):
+    return str(tmp_path / "dump.jsonl.gz")
+
+
+def download(dest: str, server: DumpServer, **options):
+    downloader = FoodDumpDownloader(URL, dest, transport=httpx.MockTransport(server), buffer_size=1000, **options)
+    return asyncio.run(downloader.download())
+
+
+def interrupted(dest: str, data: bytes):
+    """A partial download left behind by a stopped process"""
+    with open(f"{dest}.part", "wb") as f:
+        f.write(data)
+    with open(f"{dest}.part.json", "w") as f:
+        json.dump({"etag": ETAG, "last_modified": None}, f)
+
+
+def downloaded(dest: str) -> bytes:
+    with open(dest, "rb") as f:
+        return f.read()
+
+
+def test_interrupted_download_resumes(dest):
+    interrupted(dest, DUMP[:3000])
+    server = DumpServer()
+
+    result = download(dest, server, expected_sha256=hashlib.sha256(DUMP).hexdigest())
+
+    assert server.requests[0].headers["range"] == "bytes=3000-"
+    assert result.resumed_from == 3000 and downloaded(dest) == DUMP
+
+
+def test_unchanged_dump_is_not_fetched_again(dest):
+    server = DumpServer()
+    download(dest, server)
+
+    result = download(dest, server)
+
+    assert result.not_modified and result.size == len(DUMP)
+    assert server.requests[-1].headers["if-none-match"] == ETAG
+
+
+def test_checksum_mismatch_drops_the_partial_file(dest, tmp_path):
+    with pytest.raises(DownloadError, match="Checksum mismatch"):
+        download(dest, DumpServer(), expected_sha256="0" * 64)
+
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_server_ignoring_the_range_starts_over(dest):
+    interrupted(dest, b"stale bytes from another dump")
+
+    result = download(dest, DumpServer(ranges=False))
+
+    assert result.resumed_from == 0 and downloaded(dest) == DUMP
+
+
+def test_complete_partial_file_is_moved_into_place(dest):
+    # Stopped after the last byte, before the rename
+    interrupted(dest, DUMP)
+    server = DumpServer()
+
+    result = download(dest, server, expected_sha256=hashlib.sha256(DUMP).hexdigest())
+
+    assert len(server.requests) == 1
+    assert not result.not_modified and downloaded(dest) == DUMP
+    # The next run asks whether the dump changed, not for more bytes
+    assert download(dest, server).not_modified
+
+
+def test_unusable_partial_file_is_fetched_again(dest):
+    interrupted(dest, b"x" * len(DUMP))
+    server = DumpServer()
+
+    result = download(dest, server, expected_sha256=hashlib.sha256(DUMP).hexdigest())
+
+    assert [request.headers.get("range") for request in server.requests] == [f"bytes={len(DUMP)}-", None]
+    assert result.resumed_from == 0 and downloaded(dest) == DUMP
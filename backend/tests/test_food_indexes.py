@@ -0,0 +1,108 @@
+"""The per-worker food indexes follow catalog changes made by other workers"""
+import asyncio
+import sqlite3
+from contextlib import closing
+
+import pytest
+
+import database
+from conftest import DATABASE_FILE
+from services import food_cache
+from services.food_cache import CatalogVersion
+from services.food_fuzzy import FoodFuzzyIndex
+from services.food_suggest import FoodSuggestIndex
+
+
+def run(coroutine):
+    async def wrapper():
+        try:
+            return await coroutine
+        finally:
+            await database.engine.dispose()
+    return asyncio.run(wrapper())
+
+
+def change_catalog(*statements):
+    """Change food_items the way another worker would, outside this one's indexes"""
+    with closing(sqlite3.connect(DATABASE_FILE)) as conn:
+        for statement in statements:
+            conn.execute(statement)
+        conn.commit()
+
+
+@pytest.fixture
+def versions(api, tmp_path, monkeypatch):
+    monkeypatch.setattr(food_cache, "VERSION_CHECK_INTERVAL", 0)
+    # The seeded foods were updated long ago, changes made by the tests are new
+    change_catalog("UPDATE food_items SET updated_at = datetime('now', '-1 day')")
+    path = str(tmp_path / "catalog.version")
+    # This worker's view of the catalog version and another worker's
+    return CatalogVersion(path), CatalogVersion(path)
+
+
+def test_suggest_index_follows_other_workers(versions):
+    version, other_worker = versions
+    index = FoodSuggestIndex(version=version)
+    run(index.update())
+    assert index.ready and index.foods == 300
+
+    change_catalog(
+        "INSERT INTO food_items (name, brand, calories_per_100g, protein_per_100g, carbs_per_100g, fat_per_100g, "
+        "is_verified, updated_at) VALUES ('Quinoa pops', 'Brand 1', 380, 14, 64, 6, 1, datetime('now'))",
+        "UPDATE food_items SET name = 'Zucchini chips', updated_at = datetime('now') WHERE id = 5",
+    )
+    run(index.update())
+    # Nothing happens until a worker announces the change
+    assert index.suggest("quinoa") == []
+
+    other_worker.bump()
+    built_at = index.built_at
+    run(index.update())
+
+    assert [food["name"] for food in index.suggest("quinoa")] == ["Quinoa pops"]
+    assert [food["id"] for food in index.suggest("zucchini")] == [5]
+    assert 5 not in {food["id"] for food in index.suggest("oat flakes 5", limit=20)}
+    assert index.foods == 301 and index.dropped == 1
+    # Patched, not rebuilt
+    assert index.built_at == built_at
+
+
+def test_index_of_an_empty_catalog_is_not_used(versions):
+    version, other_worker = versions
+    change_catalog("DELETE FROM nutrition_entries", "DELETE FROM food_items")
+    index = FoodSuggestIndex(version=version)
+    run(index.update())
+    assert not index.ready
+
+    # The import of another worker finishes
+    change_catalog(
+        "INSERT INTO food_items (name, calories_per_100g, protein_per_100g, carbs_per_100g, fat_per_100g, "
+        "is_verified) VALUES ('Quinoa pops', 380, 14, 64, 6, 1)",
+    )
+    other_worker.bump()
+    run(index.update())
+
+    assert index.ready
+    assert [food["name"] for food in index.suggest("quin")] == ["Quinoa pops"]
+
+
+def test_fuzzy_index_follows_other_workers(versions):
+    version, other_worker = versions
+    index = FoodFuzzyIndex(version=version)
+    run(index.update())
+    assert index.ready and index.foods == 300
+
+    change_catalog(
+        "INSERT INTO food_items (name, calories_per_100g, protein_per_100g, carbs_per_100g, fat_per_100g, "
+        "is_verified, updated_at) VALUES ('Quinoa pops', 380, 14, 64, 6, 1, datetime('now'))",
+        "UPDATE food_items SET name = 'Zucchini chips', updated_at = datetime('now') WHERE id = 5",
+    )
+    other_worker.bump()
+    built_at = index.built_at
+    run(index.update())
+
+    assert [food_id for food_id, _ in index.search("qinoa pops")] == [301]
+    assert [food_id for food_id, _ in index.search("zuchini chips")] == [5]
+    assert 5 not in {food_id for food_id, _ in index.search("oat flakes 5", limit=100)}
+    assert index.foods == 301 and index.dropped == 1
+    assert index.built_at == built_at
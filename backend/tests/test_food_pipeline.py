@@ -0,0 +1,101 @@
+"""The parallel dump parser: file order, failing workers and cancellation.
+
+The parsers swapped in below run in the spawned worker processes, which
+import them from this module by name.
+"""
+import asyncio
+import gzip
+import json
+import multiprocessing
+import time
+
+import pytest
+
+from services import food_pipeline
+from services.food_import import BARCODE_INDEX
+from services.food_pipeline import FoodParsePipeline, parse_chunk
+
+FIRST_CODE = "4000000000001"
+
+
+def slow_first_chunk(data: bytes):
+    # The first block finishes last, so completion order differs from file order
+    if FIRST_CODE.encode() in data:
+        time.sleep(0.5)
+    return parse_chunk(data)
+
+
+def failing_chunk(data: bytes):
+    raise RuntimeError("parser crashed")
+
+
+def stuck_chunk(data: bytes):
+    time.sleep(2)
+    return parse_chunk(data)
+
+
+@pytest.fixture
+def dump(tmp_path):
+    path = tmp_path / "products.jsonl.gz"
+    with gzip.open(path, "wt") as f:
+        for i in range(1, 201):
+            f.write(json.dumps({"code": f"40000000{i:05d}", "product_name": f"Food {i}",
+                                "nutriments": {"energy-kcal_100g": 100 + i}}) + "\n")
+            if i % 50 == 0:
+                f.write("not json\n")
+    return str(path)
+
+
+async def barcodes(pipeline: FoodParsePipeline) -> list:
+    return [row[BARCODE_INDEX] async for batch in pipeline.batches() for row in batch]
+
+
+def collect(pipeline: FoodParsePipeline) -> list:
+    return asyncio.run(barcodes(pipeline))
+
+
+def test_rows_come_out_in_file_order(dump, monkeypatch):
+    monkeypatch.setattr(food_pipeline, "parse_chunk", slow_first_chunk)
+    pipeline = FoodParsePipeline(dump, workers=3, chunk_bytes=1000)
+
+    assert collect(pipeline) == [f"40000000{i:05d}" for i in range(1, 201)]
+    assert pipeline.stats.chunks > 6
+    assert (pipeline.stats.lines, pipeline.stats.rows) == (204, 200)
+    assert pipeline.progress == 1.0
+
+
+def test_limit_stops_after_the_first_rows(dump):
+    assert collect(FoodParsePipeline(dump, workers=2, chunk_bytes=1000, limit=30)) == \
+        [f"40000000{i:05d}" for i in range(1, 31)]
+
+
+def test_worker_error_reaches_the_writer(dump, monkeypatch):
+    monkeypatch.setattr(food_pipeline, "parse_chunk", failing_chunk)
+
+    with pytest.raises(RuntimeError, match="parser crashed"):
+        collect(FoodParsePipeline(dump, workers=2, chunk_bytes=1000))
+
+
+def test_cancelled_import_stops_the_workers(dump, monkeypatch):
+    monkeypatch.setattr(food_pipeline, "parse_chunk", stuck_chunk)
+    pipeline = FoodParsePipeline(dump, workers=2, chunk_bytes=1000)
+
+    async def cancel_while_parsing():
+        task = asyncio.create_task(barcodes(pipeline))
+        while pipeline.stats.decompressed_bytes == 0:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        started = time.perf_counter()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return time.perf_counter() - started
+
+    # The writer does not wait for the blocks in flight
+    assert asyncio.run(cancel_while_parsing()) < 1
+    assert pipeline.stats.chunks == 0
+
+    # Queued blocks were dropped: the workers exit after the block they were on
+    deadline = time.monotonic() + 10
+    while multiprocessing.active_children() and time.monotonic() < deadline:
+        time.sleep(0.1)
+    assert not multiprocessing.active_children()
@@ -0,0 +1,61 @@
+"""Delta refreshes bring new and changed products into the catalog"""
+import asyncio
+import sqlite3
+from contextlib import closing
+
+import pytest
+
+import database
+from conftest import ALICE_ID, DATABASE_FILE
+from services import food_db_service
+from services.food_db_service import FoodDatabaseService
+from services.food_fuzzy import FoodFuzzyIndex
+from services.food_import import food_row
+from services.food_suggest import FoodSuggestIndex
+
+
+def product(barcode: str, name: str) -> tuple:
+    return food_row({"barcode": barcode, "name": name, "brand": "Brand 2", "category": "cereals",
+                     "calories_per_100g": 370, "protein_per_100g": 13, "carbs_per_100g": 59, "fat_per_100g": 7})
+
+
+@pytest.fixture
+def service(api, monkeypatch):
+    # Indexes of their own, the app's stay as the other tests expect them
+    monkeypatch.setattr(food_db_service, "food_suggest", FoodSuggestIndex())
+    monkeypatch.setattr(food_db_service, "food_fuzzy", FoodFuzzyIndex())
+    return FoodDatabaseService()
+
+
+def refresh(service: FoodDatabaseService, rows: list):
+    async def run():
+        try:
+            return await service._load_catalog([rows], upsert=True)
+        finally:
+            await database.engine.dispose()
+    return asyncio.run(run())
+
+
+def test_delta_refresh_updates_the_catalog(api, service):
+    with closing(sqlite3.connect(DATABASE_FILE)) as conn:
+        tables_before = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+    first = refresh(service, [product("4000000000012", "Spelt flakes"), product("4000000099999", "Rye crispbread")])
+    assert (first.inserted, first.updated) == (1, 1)
+    # The same products again are skipped by their source hash
+    second = refresh(service, [product("4000000000012", "Spelt flakes"), product("4000000099999", "Rye crispbread")])
+    assert (second.inserted, second.updated, second.unchanged) == (0, 0, 2)
+
+    with closing(sqlite3.connect(DATABASE_FILE)) as conn:
+        tables_after = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        # Updated, keeping the id nutrition entries refer to
+        assert conn.execute("SELECT id FROM food_items WHERE barcode = '4000000000012'").fetchone() == (12,)
+        assert conn.execute("SELECT count(*) FROM food_items").fetchone() == (301,)
+    assert tables_after == tables_before
+
+    # The search index follows the changed rows
+    for q, name in (("spelt flakes", "Spelt flakes"), ("crispbread", "Rye crispbread")):
+        response = api.measure("GET", "/api/nutrition/foods/search", user=ALICE_ID, params={"q": q}).response
+        assert [food["name"] for food in response.json()] == [name]
+    response = api.measure("GET", "/api/nutrition/foods/search", user=ALICE_ID, params={"q": "oat flakes 12"}).response
+    assert 12 not in {food["id"] for food in response.json()}
@@ -0,0 +1,26 @@
+"""Search text is checked after its whitespace is collapsed"""
+import pytest
+
+from conftest import ALICE_ID
+
+
+@pytest.mark.parametrize("path, q", [
+    ("/api/nutrition/foods/search", "   "),
+    ("/api/nutrition/foods/search", " a  "),
+    ("/api/nutrition/foods/search/page", "\t\t"),
+    ("/api/nutrition/foods/suggest", "  "),
+])
+def test_blank_search_text_is_rejected(api, path, q):
+    measured = api.measure("GET", path, user=ALICE_ID, params={"q": q})
+
+    assert measured.response.status_code == 422, measured.response.text
+    # Rejected before it becomes a LIKE '%%' over the whole catalog
+    assert not any("food_items" in statement for statement, _ in measured.sql)
+
+
+def test_surrounding_whitespace_is_ignored(api):
+    padded = api.measure("GET", "/api/nutrition/foods/search", user=ALICE_ID, params={"q": "  oat   flakes 12 "})
+    plain = api.measure("GET", "/api/nutrition/foods/search", user=ALICE_ID, params={"q": "oat flakes 12"})
+
+    assert padded.response.status_code == 200
+    assert padded.response.json() == plain.response.json() != []
@@ -0,0 +1,42 @@
+"""Paging through search results returns every match exactly once, in order"""
+import sqlite3
+from contextlib import closing
+
+import pytest
+
+from conftest import ALICE_ID, DATABASE_FILE
+
+
+def expected_ids() -> list:
+    with closing(sqlite3.connect(DATABASE_FILE)) as conn:
+        return [food_id for (food_id,) in conn.execute(
+            "SELECT id FROM food_items WHERE name LIKE '%oa%' OR brand LIKE '%oa%' OR category LIKE '%oa%' "
+            "ORDER BY is_verified DESC, name, id")]
+
+
+def paged_ids(api, limit: int) -> list:
+    ids, cursor = [], None
+    while True:
+        params = {"q": "oa", "limit": limit, **({"cursor": cursor} if cursor else {})}
+        response = api.measure("GET", "/api/nutrition/foods/search/page", user=ALICE_ID, params=params).response
+        assert response.status_code == 200, response.text
+        page = response.json()
+        ids += [food["id"] for food in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return ids
+
+
+# 150 of the 300 seeded foods are verified: 7 splits a page at the boundary,
+# 10 and 75 end a page on the last verified food
+@pytest.mark.parametrize("limit", [7, 10, 75])
+def test_pages_have_no_duplicates_or_gaps(api, limit):
+    with closing(sqlite3.connect(DATABASE_FILE)) as conn:
+        # Equal names on both sides of the boundary, ordered by id
+        conn.execute("UPDATE food_items SET name = 'Oat flakes' WHERE id BETWEEN 141 AND 160")
+        conn.commit()
+
+    ids = paged_ids(api, limit)
+
+    assert len(ids) == len(set(ids)) == 300
+    assert ids == expected_ids()
@@ -0,0 +1,122 @@
+"""Imports are loaded next to the live catalog and swapped in as a whole"""
+import asyncio
+import os
+import sqlite3
+from contextlib import closing
+
+import pytest
+from alembic import command
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+import database
+from conftest import ALICE_ID, DATABASE_FILE
+from database import alembic_config, upgrade_database
+from services.food_import import FoodBulkLoader, food_row
+from services.food_staging import CatalogStaging
+
+
+def product(barcode: str, name: str) -> tuple:
+    return food_row({"barcode": barcode, "name": name, "calories_per_100g": 370,
+                     "protein_per_100g": 13, "carbs_per_100g": 59, "fat_per_100g": 7})
+
+
+def query(sql: str, *params) -> list:
+    with closing(sqlite3.connect(DATABASE_FILE)) as conn:
+        return conn.execute(sql, params).fetchall()
+
+
+def execute(sql: str, *params) -> int:
+    with closing(sqlite3.connect(DATABASE_FILE)) as conn:
+        cursor = conn.execute(sql, params)
+        conn.commit()
+        return cursor.lastrowid
+
+
+def run(coroutine_function):
+    async def wrapper():
+        try:
+            return await coroutine_function()
+        finally:
+            await database.engine.dispose()
+    return asyncio.run(wrapper())
+
+
+def test_full_import_updates_existing_products_and_swaps_in_at_once(api):
+    rows = [product("4000000000012", "Spelt flakes"), product("4000000099999", "Rye crispbread")]
+
+    async def load():
+        staging = CatalogStaging()
+        table = await staging.prepare()
+        # Another worker creates a food and logs it while staging is built
+        late_id = execute(
+            "INSERT INTO food_items (name, calories_per_100g, protein_per_100g, carbs_per_100g, fat_per_100g, "
+            "is_verified) VALUES ('Homemade granola', 450, 10, 60, 18, 0)")
+        execute("INSERT INTO nutrition_entries (user_id, meal_id, food_item_id, amount_grams) VALUES (?, 121, ?, 40)",
+                ALICE_ID, late_id)
+
+        stats = await FoodBulkLoader(table=table).load_batches([rows])
+        await staging.finalize()
+        # Readers still see the live catalog as it was
+        assert query("SELECT name FROM food_items WHERE id = 12") == [("Oat flakes 12",)]
+        assert query("SELECT count(*) FROM food_items WHERE barcode = '4000000099999'") == [(0,)]
+
+        await staging.swap()
+        return stats
+
+    stats = run(load)
+
+    assert stats.inserted == 2
+    # The existing product is updated under its id, the new one added
+    assert query("SELECT id, name FROM food_items WHERE barcode = '4000000000012'") == [(12, "Spelt flakes")]
+    assert query("SELECT name FROM food_items WHERE barcode = '4000000099999'") == [("Rye crispbread",)]
+    # The late food moved to a new id and its entry followed it
+    (granola_id,), = query("SELECT id FROM food_items WHERE name = 'Homemade granola'")
+    assert query("SELECT count(*) FROM nutrition_entries WHERE food_item_id = ?", granola_id) == [(1,)]
+    assert query("SELECT count(*) FROM food_items") == [(302,)]
+    assert {name for (name,) in query("SELECT name FROM sqlite_master WHERE type = 'table'")}.isdisjoint(
+        {"food_items_staging", "food_items_retired"})
+
+
+def test_import_of_unchanged_products_leaves_them_alone(api):
+    rows = [product("4000000000012", "Spelt flakes")]
+
+    async def load():
+        staging = CatalogStaging()
+        stats = await FoodBulkLoader(table=await staging.prepare()).load_batches([rows])
+        await staging.finalize()
+        await staging.swap()
+        return stats
+
+    run(load)
+    execute("UPDATE food_items SET updated_at = '2020-01-01 00:00:00' WHERE id = 12")
+    stats = run(load)
+
+    assert stats.inserted == 0
+    assert query("SELECT name, updated_at FROM food_items WHERE id = 12") == [("Spelt flakes", "2020-01-01 00:00:00")]
+
+
+@pytest.mark.skipif(not os.getenv("TEST_POSTGRES_URL"), reason="TEST_POSTGRES_URL not set")
+def test_copy_import_draws_one_id_per_new_row(tmp_path, monkeypatch):
+    # upgrade_database keeps its lock file under data/ in the working directory
+    monkeypatch.chdir(tmp_path)
+    url = os.getenv("TEST_POSTGRES_URL")
+    upgrade_database(url)
+
+    async def load():
+        engine = create_async_engine(url, poolclass=NullPool)
+        try:
+            rows = [product(f"40000000{i:05d}", f"Food {i}") for i in range(1, 101)]
+            await FoodBulkLoader(engine=engine).load_batches([rows])
+            async with engine.connect() as conn:
+                return (await conn.execute(text(
+                    "SELECT max(id), nextval(pg_get_serial_sequence('food_items', 'id')) FROM food_items"
+                ))).one()
+        finally:
+            await engine.dispose()
+
+    try:
+        assert tuple(asyncio.run(load())) == (100, 101)
+    finally:
+        command.downgrade(alembic_config(url), "base")
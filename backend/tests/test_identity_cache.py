@@ -0,0 +1,35 @@
+"""Changes to a user's credentials reach the cached identities of every worker"""
+from conftest import ALICE_ID, BOB_ID, PASSWORD
+from services.identity_cache import identity_cache, identity_version
+
+
+def test_password_change_drops_the_cached_identity(api):
+    version = identity_version.current()
+
+    response = api.measure("POST", "/api/auth/change-password", user=ALICE_ID,
+                           json={"old_password": PASSWORD, "new_password": "a new long password"}).response
+    assert response.status_code == 200, response.text
+
+    # The request cached Alice on its way in; the bump makes that entry unreachable
+    assert identity_version.current() != version
+    assert identity_cache.get(ALICE_ID) == (False, None)
+
+
+def test_profile_change_keeps_the_identity_current(api):
+    version = identity_version.current()
+
+    response = api.measure("PUT", "/api/profile", user=ALICE_ID, json={"weight_kg": 71}).response
+    assert response.status_code == 200, response.text
+
+    # Profile fields are not part of the snapshot: the cached identity stays valid
+    assert identity_version.current() == version
+    found, user = identity_cache.get(ALICE_ID)
+    assert found and user.id == ALICE_ID
+
+
+def test_disabling_2fa_drops_the_cached_identity(api):
+    response = api.measure("POST", "/api/auth/disable-2fa", user=BOB_ID).response
+    assert response.status_code == 200, response.text
+
+    assert identity_cache.get(BOB_ID) == (False, None)
+    assert api.measure("GET", "/api/auth/me", user=BOB_ID).response.json()["is_2fa_enabled"] is False
@@ -0,0 +1,49 @@
+"""Every worker reports the state of the import that is running now"""
+import asyncio
+
+import database
+from services import food_db_service
+from services.food_db_service import FoodDatabaseService
+from services.food_fuzzy import FoodFuzzyIndex
+from services.food_import import food_row
+from services.food_suggest import FoodSuggestIndex
+from services.import_progress import ImportProgress, ImportState
+
+
+def test_finished_import_hands_the_status_to_the_next_worker(tmp_path):
+    path = str(tmp_path / "status.json")
+    first, second = ImportProgress(path), ImportProgress(path)
+
+    first.start()
+    first.set_state(ImportState.DONE)
+    assert not first.owner
+
+    # A later refresh runs in the other worker; the first one reports it too
+    second.start()
+    second.set_state(ImportState.DOWNLOADING)
+    assert first.snapshot()["state"] == "downloading"
+    second.fail(RuntimeError("connection reset"))
+    assert first.snapshot()["error"] == "connection reset"
+
+
+def test_state_is_loading_once_the_first_batch_is_written(api, tmp_path, monkeypatch):
+    progress = ImportProgress(str(tmp_path / "status.json"))
+    monkeypatch.setattr(food_db_service, "food_import_progress", progress)
+    monkeypatch.setattr(food_db_service, "food_suggest", FoodSuggestIndex())
+    monkeypatch.setattr(food_db_service, "food_fuzzy", FoodFuzzyIndex())
+    rows = [food_row({"barcode": f"40000000990{i:02d}", "name": f"Rye crispbread {i}", "calories_per_100g": 350,
+                      "protein_per_100g": 9, "carbs_per_100g": 66, "fat_per_100g": 2}) for i in range(4)]
+    states = []
+
+    async def refresh():
+        progress.start()
+        progress.set_state(ImportState.PARSING)
+        try:
+            await FoodDatabaseService()._load_catalog(
+                [rows[:2], rows[2:]], upsert=True, on_batch=lambda stats: states.append(progress.state)
+            )
+        finally:
+            await database.engine.dispose()
+
+    asyncio.run(refresh())
+    assert states == [ImportState.LOADING, ImportState.LOADING]
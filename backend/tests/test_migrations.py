@@ -0,0 +1,91 @@
+"""The migrations bring both a new database and one created by create_all()
+before migrations existed to the schema of the models."""
+import sqlite3
+from contextlib import closing
+
+import pytest
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine
+
+from database import Base, upgrade_database
+
+
+def schema_differences(path: str) -> list:
+    def include_name(name, type_, parent_names):
+        # The food search tables are managed by services.food_search
+        return type_ != "table" or name in Base.metadata.tables
+
+    engine = create_engine(f"sqlite:///{path}")
+    try:
+        with engine.connect() as conn:
+            context = MigrationContext.configure(conn, opts={"include_name": include_name})
+            return compare_metadata(context, Base.metadata)
+    finally:
+        engine.dispose()
+
+
+@pytest.fixture
+def database_file(tmp_path, monkeypatch):
+    # The migration lock lives under data/ in the working directory
+    monkeypatch.chdir(tmp_path)
+    return str(tmp_path / "migrated.db")
+
+
+def test_new_database_matches_the_models(database_file):
+    upgrade_database(f"sqlite+aiosqlite:///{database_file}")
+
+    assert schema_differences(database_file) == []
+
+
+def test_legacy_database_is_stamped_and_upgraded(database_file):
+    # The baseline revision is the schema create_all() made, without a version table
+    upgrade_database(f"sqlite+aiosqlite:///{database_file}", "0001")
+    with closing(sqlite3.connect(database_file)) as conn:
+        # Later schema changes have migrations of their own; a stamped database never runs 0001
+        tables = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        assert "revoked_tokens" not in tables
+        assert "source_hash" not in {row[1] for row in conn.execute("PRAGMA table_info(food_items)")}
+        conn.execute("DROP TABLE alembic_version")
+        conn.execute("INSERT INTO users (email, hashed_password, is_active, is_admin, is_2fa_enabled, "
+                     "failed_login_attempts) VALUES ('legacy@example.com', 'x', 1, 0, 0, 0)")
+        conn.execute("INSERT INTO food_items (barcode, name, calories_per_100g, protein_per_100g, carbs_per_100g, "
+                     "fat_per_100g) VALUES ('4000000000012', 'Oat flakes', 370, 13, 59, 7)")
+        conn.commit()
+
+    upgrade_database(f"sqlite+aiosqlite:///{database_file}")
+
+    assert schema_differences(database_file) == []
+    with closing(sqlite3.connect(database_file)) as conn:
+        assert conn.execute("SELECT email FROM users").fetchall() == [("legacy@example.com",)]
+        assert conn.execute("SELECT name, source_hash FROM food_items").fetchall() == [("Oat flakes", None)]
+        assert conn.execute("SELECT count(*) FROM revoked_tokens").fetchone() == (0,)
+
+
+def test_stored_barcodes_are_normalized(database_file):
+    upgrade_database(f"sqlite+aiosqlite:///{database_file}", "0005")
+    with closing(sqlite3.connect(database_file)) as conn:
+        conn.executemany(
+            "INSERT INTO food_items (id, barcode, name, calories_per_100g, protein_per_100g, carbs_per_100g, "
+            "fat_per_100g) VALUES (?, ?, ?, 100, 1, 1, 1)",
+            [
+                (1, "0012345678905", "Canonical"),
+                (2, "012345678905", "Same product as UPC-A"),
+                (3, "40123455", "EAN-8"),
+                (4, "04000000000012", "GTIN-14"),
+                (5, "00000040123455", "GTIN-14 of the EAN-8"),
+                (6, "QR 1234", "Internal code"),
+            ],
+        )
+        conn.executemany("INSERT INTO nutrition_entries (user_id, meal_id, food_item_id, amount_grams) "
+                         "VALUES (1, 1, ?, 50)", [(2,), (5,)])
+        conn.commit()
+
+    upgrade_database(f"sqlite+aiosqlite:///{database_file}")
+
+    with closing(sqlite3.connect(database_file)) as conn:
+        assert conn.execute("SELECT id, barcode FROM food_items ORDER BY id").fetchall() == [
+            (1, "0012345678905"), (3, "0000040123455"), (4, "4000000000012"), (6, "QR1234"),
+        ]
+        # Entries of a duplicate now point at the product that was kept
+        assert conn.execute("SELECT food_item_id FROM nutrition_entries ORDER BY id").fetchall() == [(1,), (3,)]
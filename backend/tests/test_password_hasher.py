@@ -0,0 +1,77 @@
+"""Load shedding of the password hashing pool"""
+import asyncio
+import json
+import threading
+
+import pytest
+
+from conftest import ALICE_ID, PASSWORD
+from services import password_hasher as password_hasher_module
+from services.password_hasher import ARGON2_PARALLELISM, ARGON2_TARGET_MS, MIN_MEMORY, HasherBusy, \
+    LatencyHistogram, PasswordHasher, password_hasher
+
+
+@pytest.fixture
+def hasher(tmp_path):
+    # Cheap parameters, as if an earlier worker had tuned them
+    params_path = tmp_path / "password_hash.json"
+    params_path.write_text(json.dumps({"time_cost": 2, "memory_cost": MIN_MEMORY, "parallelism": ARGON2_PARALLELISM,
+                                       "target_ms": ARGON2_TARGET_MS}))
+    hasher = PasswordHasher(workers=1, max_pending=2, params_path=str(params_path))
+    yield hasher
+    hasher.shutdown()
+
+
+def test_full_queue_turns_hashes_away(hasher):
+    release = threading.Event()
+
+    async def burst():
+        blocked = [asyncio.ensure_future(hasher._run("hash", lambda context: release.wait(5))) for _ in range(2)]
+        while hasher.pending < 2:
+            await asyncio.sleep(0)
+
+        with pytest.raises(HasherBusy):
+            await hasher.hash(PASSWORD)
+
+        release.set()
+        assert await asyncio.gather(*blocked) == [True, True]
+        # Room again once the queue drains
+        return await hasher.verify(PASSWORD, await hasher.hash(PASSWORD))
+
+    assert asyncio.run(burst())
+    stats = hasher.stats()
+    assert stats["rejected"] == 1 and stats["queue_depth"] == 0 and stats["max_queue_seen"] == 2
+    assert stats["latency_ms"]["hash"]["count"] == 3 and stats["latency_ms"]["verify"]["count"] == 1
+
+
+def test_login_is_shed_with_503_when_the_hasher_is_busy(api, monkeypatch):
+    monkeypatch.setattr(password_hasher, "max_pending", 0)
+    rejected = password_hasher.rejected
+
+    response = api.measure("POST", "/api/auth/login", json={"email": f"user{ALICE_ID}@example.com",
+                                                          "password": PASSWORD}).response
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+    assert password_hasher.rejected == rejected + 1
+
+
+def test_histogram_counts_samples_from_all_threads():
+    histogram = LatencyHistogram()
+    threads = [threading.Thread(target=lambda: [histogram.observe(0.003) for _ in range(5000)]) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    snapshot = histogram.snapshot()
+    assert snapshot["count"] == 40000 and snapshot["buckets"]["<=5"] == 40000
+
+
+def test_parameters_load_without_fcntl(hasher, monkeypatch):
+    monkeypatch.setattr(password_hasher_module, "fcntl", None)
+    # Read the shared parameters file instead of the explicit test parameters
+    monkeypatch.setattr(password_hasher_module, "ARGON2_TIME_COST", 0)
+
+    assert hasher.configure() is not None
+    assert hasher.params["time_cost"] == 2
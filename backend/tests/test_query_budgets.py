@@ -0,0 +1,170 @@
+"""Every API endpoint has a query budget: the most statements it may run and
+rows it may scan for one request against the seeded database (conftest.py),
+with cold per-worker caches.
+
+A change that adds a query per row (N+1) or loses an index goes over its
+endpoint's budget and fails here. When a change needs more on purpose,
+raise the budget in the same commit and say why.
+"""
+import io
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Optional
+
+import pytest
+from PIL import Image
+
+from conftest import ADMIN_ID, ALICE_ID, BOB_ID, PASSWORD
+from main import app
+from services.barcode_preprocess import cv2, pyzbar
+from services.optional_deps import DependencyUnavailable
+
+# Ids from the seed: Alice's first meal and caffeine entry, and a user to modify
+ALICE_MEAL_ID = 121
+ALICE_CAFFEINE_ENTRY_ID = 91
+OTHER_USER_ID = 5
+
+
+def _blank_png() -> bytes:
+    image = io.BytesIO()
+    Image.new("RGB", (64, 64), "white").save(image, format="PNG")
+    return image.getvalue()
+
+
+def _barcode_decoder_missing() -> Optional[str]:
+    for module in (cv2, pyzbar):
+        try:
+            module.load()
+        except DependencyUnavailable as e:
+            return str(e)
+    return None
+
+
+@dataclass
+class Budget:
+    method: str
+    route: str
+    statements: int
+    rows: int
+    user: Optional[int] = ALICE_ID
+    status: tuple = (200,)
+    # Authenticate with the user's refresh token instead of an access token
+    refresh: bool = False
+    # The route with its parameters filled in, when it has any
+    path: Optional[str] = None
+    options: dict = field(default_factory=dict)
+    # Decodes an image, which needs OpenCV and the zbar library
+    decodes: bool = False
+
+    @property
+    def id(self) -> str:
+        return f"{self.method} {self.path or self.route}"
+
+
+TODAY = date.today().isoformat()
+
+BUDGETS = [
+    # api/auth.py
+    Budget("POST", "/api/auth/register", 3, 5, user=None,
+           options={"json": {"email": "new@example.com", "password": PASSWORD}}),
+    Budget("POST", "/api/auth/login", 2, 5, user=None,
+           options={"json": {"email": f"user{ALICE_ID}@example.com", "password": PASSWORD}}),
+    Budget("POST", "/api/auth/refresh", 2, 5, refresh=True),
+    Budget("GET", "/api/auth/me", 1, 5),
+    Budget("POST", "/api/auth/setup-2fa", 1, 5),
+    Budget("POST", "/api/auth/verify-2fa", 1, 5, status=(501,), options={"json": {"totp_code": "123456"}}),
+    Budget("POST", "/api/auth/disable-2fa", 4, 5, user=BOB_ID),
+    Budget("POST", "/api/auth/change-password", 3, 5,
+           options={"json": {"old_password": PASSWORD, "new_password": "a new long password"}}),
+    Budget("POST", "/api/auth/logout", 2, 5),
+    Budget("GET", "/api/auth/admin/users", 2, 50, user=ADMIN_ID),
+    Budget("POST", "/api/auth/admin/users/{user_id}/toggle-active", 4, 5, user=ADMIN_ID,
+           path=f"/api/auth/admin/users/{OTHER_USER_ID}/toggle-active"),
+    Budget("DELETE", "/api/auth/admin/users/{user_id}", 3, 5, user=ADMIN_ID,
+           path=f"/api/auth/admin/users/{OTHER_USER_ID}"),
+
+    # api/nutrition.py
+    Budget("GET", "/api/nutrition/foods/search", 2, 20, options={"params": {"q": "oat flakes 12"}}),
+    Budget("GET", "/api/nutrition/foods/search/page", 2, 20, options={"params": {"q": "oat flakes 12"}}),
+    Budget("GET", "/api/nutrition/foods/suggest", 2, 15, options={"params": {"q": "oat"}}),
+    Budget("GET", "/api/nutrition/foods/barcode/{barcode}", 2, 5,
+           path="/api/nutrition/foods/barcode/4000000000012"),
+    # No barcode in a blank image
+    Budget("POST", "/api/nutrition/foods/scan-barcode", 1, 5, status=(404,), decodes=True,
+           options={"files": {"file": ("blank.png", _blank_png(), "image/png")}}),
+    Budget("POST", "/api/nutrition/foods/scan-barcodes", 2, 5,
+           options={"data": {"codes": ["4000000000012", "4000000000013", "4000000099999"]}}),
+    Budget("POST", "/api/nutrition/foods", 5, 5,
+           options={"json": {"name": "Rye bread", "barcode": "4000000099999", "calories_per_100g": 220}}),
+    Budget("POST", "/api/nutrition/meals", 4, 5,
+           options={"json": {"name": "Lunch", "meal_type": "lunch", "eaten_at": f"{TODAY}T12:00"}}),
+    Budget("GET", "/api/nutrition/meals", 2, 125),
+    Budget("POST", "/api/nutrition/entries", 5, 5,
+           options={"json": {"meal_id": ALICE_MEAL_ID, "food_item_id": 12, "amount_grams": 60}}),
+    Budget("GET", "/api/nutrition/summary/{target_date}", 3, 12, path=f"/api/nutrition/summary/{TODAY}"),
+
+    # api/caffeine.py
+    Budget("GET", "/api/caffeine/products", 2, 45),
+    Budget("POST", "/api/caffeine/products", 3, 5,
+           options={"json": {"name": "Green tea", "category": "tea", "caffeine_mg_per_serving": 30}}),
+    Budget("POST", "/api/caffeine/entries", 5, 5,
+           options={"json": {"product_id": 3, "consumed_at": f"{TODAY}T08:00"}}),
+    Budget("GET", "/api/caffeine/entries", 2, 6),
+    Budget("GET", "/api/caffeine/current-level", 2, 6),
+    Budget("GET", "/api/caffeine/curve", 2, 10),
+    Budget("DELETE", "/api/caffeine/entries/{entry_id}", 3, 5,
+           path=f"/api/caffeine/entries/{ALICE_CAFFEINE_ENTRY_ID}"),
+
+    # api/reports.py
+    Budget("GET", "/api/reports/nutrition/weekly", 3, 40),
+    Budget("GET", "/api/reports/caffeine/trends", 3, 40),
+    Budget("GET", "/api/reports/export/nutrition", 2, 260),
+
+    # api/profile.py (mounted with and without the trailing slash)
+    Budget("GET", "/api/profile", 2, 5),
+    Budget("GET", "/api/profile/", 2, 5),
+    Budget("POST", "/api/profile", 4, 5, options={"json": {"weight_kg": 70, "timezone": "Europe/Berlin"}}),
+    Budget("POST", "/api/profile/", 4, 5, options={"json": {"weight_kg": 70, "timezone": "Europe/Berlin"}}),
+    Budget("PUT", "/api/profile", 4, 5, options={"json": {"weight_kg": 71}}),
+    Budget("PUT", "/api/profile/", 4, 5, options={"json": {"weight_kg": 71}}),
+
+    # api/admin.py
+    Budget("GET", "/api/admin/users", 2, 50, user=ADMIN_ID),
+    Budget("POST", "/api/admin/users/{user_id}/toggle-active", 4, 5, user=ADMIN_ID,
+           path=f"/api/admin/users/{OTHER_USER_ID}/toggle-active"),
+    Budget("DELETE", "/api/admin/users/{user_id}", 3, 5, user=ADMIN_ID,
+           path=f"/api/admin/users/{OTHER_USER_ID}"),
+    Budget("GET", "/api/admin/stats", 5, 5200, user=ADMIN_ID),
+    Budget("GET", "/api/admin/food-database/status", 1, 5, user=ADMIN_ID),
+]
+
+
+def api_routes() -> set:
+    return {
+        (method, route.path)
+        for route in app.routes
+        if getattr(route, "endpoint", None) and route.endpoint.__module__.startswith("api.")
+        for method in getattr(route, "methods", ())
+    }
+
+
+def test_every_endpoint_has_a_budget():
+    budgeted = {(budget.method, budget.route) for budget in BUDGETS}
+    missing = sorted(api_routes() - budgeted)
+    assert not missing, f"endpoints without a query budget: {missing}"
+    assert not budgeted - api_routes(), f"budgets for unknown endpoints: {sorted(budgeted - api_routes())}"
+
+
+@pytest.mark.parametrize("budget", BUDGETS, ids=lambda budget: budget.id)
+def test_endpoint_stays_within_budget(api, budget):
+    missing = budget.decodes and _barcode_decoder_missing()
+    if missing:
+        pytest.skip(missing)
+    token = api.refresh_token(budget.user) if budget.refresh else None
+    measured = api.measure(budget.method, budget.path or budget.route, user=budget.user, token=token, **budget.options)
+
+    assert measured.response.status_code in budget.status, measured.response.text
+    assert measured.statements <= budget.statements, \
+        f"{budget.id} ran more statements than its budget of {budget.statements}:\n{measured.report()}"
+    assert measured.rows_scanned <= budget.rows, \
+        f"{budget.id} scanned more rows than its budget of {budget.rows}:\n{measured.report()}"
@@ -0,0 +1,178 @@
+"""The hot per-user queries must be answered from the indexes added in
+alembic/versions/0002 (and search pages from the one added in 0007), not by
+scanning the tables.
+
+The schema is built by running the migration chain, so these also check
+that the migrations produce the indexes. Runs against SQLite; set
+TEST_POSTGRES_URL (an empty scratch database, asyncpg URL) to check the
+PostgreSQL plans too.
+"""
+import asyncio
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from alembic import command
+from sqlalchemy import and_, desc, func, select
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from database import alembic_config, upgrade_database
+from models.caffeine import CaffeineEntry, CaffeineProduct
+from models.nutrition import FoodItem, Meal, NutritionEntry
+from models.user import User
+from services.food_search import food_search
+from services.user_time import day_range, zone
+
+USER_ID = 1
+NOW = datetime(2026, 1, 15, 12, 0)
+
+
+def hot_queries():
+    """The queries the endpoints run, built the same way (name, statement, index)"""
+    day_start, day_end = day_range(NOW.date(), NOW.date(), zone("Europe/Berlin"))
+    week_start, _ = day_range(NOW.date() - timedelta(weeks=1), NOW.date(), zone("Europe/Berlin"))
+    return [
+        ("caffeine entries", select(CaffeineEntry).where(
+            and_(CaffeineEntry.user_id == USER_ID, CaffeineEntry.consumed_at >= NOW - timedelta(hours=24))
+        ).order_by(desc(CaffeineEntry.consumed_at)), "ix_caffeine_entries_user_consumed"),
+        ("caffeine level", select(CaffeineEntry, CaffeineProduct).join(
+            CaffeineProduct, CaffeineEntry.product_id == CaffeineProduct.id
+        ).where(
+            and_(CaffeineEntry.user_id == USER_ID, CaffeineEntry.consumed_at >= NOW - timedelta(hours=24))
+        ), "ix_caffeine_entries_user_consumed"),
+        ("meals", select(Meal).where(Meal.user_id == USER_ID).order_by(desc(Meal.eaten_at)),
+         "ix_meals_user_eaten"),
+        ("meal entries", select(NutritionEntry).where(NutritionEntry.meal_id == 7), "ix_nutrition_entries_meal_id"),
+        ("meals by day", select(Meal).where(
+            Meal.user_id == USER_ID, Meal.eaten_at >= day_start, Meal.eaten_at < day_end
+        ).order_by(desc(Meal.eaten_at)), "ix_meals_user_eaten"),
+        ("daily summary", select(NutritionEntry, FoodItem).join(
+            FoodItem, NutritionEntry.food_item_id == FoodItem.id
+        ).join(
+            Meal, NutritionEntry.meal_id == Meal.id
+        ).where(
+            and_(NutritionEntry.user_id == USER_ID, Meal.user_id == USER_ID,
+                 Meal.eaten_at >= day_start, Meal.eaten_at < day_end)
+        ), "ix_meals_user_eaten"),
+        ("weekly report", select(
+            Meal.local_date, func.sum(FoodItem.calories_per_100g * NutritionEntry.amount_grams / 100)
+        ).select_from(
+            NutritionEntry.__table__.join(FoodItem).join(Meal)
+        ).where(
+            and_(NutritionEntry.user_id == USER_ID, Meal.user_id == USER_ID,
+                 Meal.eaten_at >= week_start, Meal.eaten_at < day_end)
+        ).group_by(Meal.local_date), "ix_meals_user_eaten"),
+        ("caffeine trends", select(
+            CaffeineEntry.local_date, func.count(CaffeineEntry.id)
+        ).select_from(
+            CaffeineEntry.__table__.join(CaffeineProduct)
+        ).where(
+            and_(CaffeineEntry.user_id == USER_ID,
+                 CaffeineEntry.consumed_at >= week_start, CaffeineEntry.consumed_at < day_end)
+        ).group_by(CaffeineEntry.local_date), "ix_caffeine_entries_user_consumed"),
+        # A two-letter query is a substring match on every backend
+        ("search page", food_search.page_query("oa", after=(True, "Oats 7", 7)).limit(21),
+         "ix_food_items_is_verified_name_id"),
+    ]
+
+
+def database_urls():
+    urls = [pytest.param("sqlite", id="sqlite")]
+    urls.append(pytest.param("postgresql", id="postgresql", marks=pytest.mark.skipif(
+        not os.getenv("TEST_POSTGRES_URL"), reason="TEST_POSTGRES_URL not set"
+    )))
+    return urls
+
+
+@pytest.fixture(params=database_urls())
+def database_url(request, tmp_path, monkeypatch):
+    # upgrade_database keeps its lock file under data/ in the working directory
+    monkeypatch.chdir(tmp_path)
+    url = f"sqlite+aiosqlite:///{tmp_path / 'plans.db'}" if request.param == "sqlite" else os.getenv("TEST_POSTGRES_URL")
+    upgrade_database(url)
+    yield url
+    if request.param == "postgresql":
+        command.downgrade(alembic_config(url), "base")
+
+
+async def _seed(engine):
+    async with engine.begin() as conn:
+        await conn.execute(User.__table__.insert(), [
+            {"id": user_id, "email": f"user{user_id}@example.com", "hashed_password": "-",
+             "is_active": True, "is_admin": False, "is_2fa_enabled": False, "failed_login_attempts": 0}
+            for user_id in range(1, 21)
+        ])
+        await conn.execute(CaffeineProduct.__table__.insert(), [
+            {"id": 1, "name": "Espresso", "category": "coffee", "caffeine_mg_per_serving": 63},
+        ])
+        await conn.execute(FoodItem.__table__.insert(), [
+            {"id": food_id, "name": f"Oats {food_id}", "calories_per_100g": 389, "is_verified": food_id % 2 == 0}
+            for food_id in range(1, 401)
+        ])
+        await conn.execute(Meal.__table__.insert(), [
+            {"id": meal_id, "user_id": meal_id % 20 + 1, "name": "Meal", "meal_type": "lunch",
+             "eaten_at": NOW - timedelta(hours=meal_id)}
+            for meal_id in range(1, 401)
+        ])
+        await conn.execute(NutritionEntry.__table__.insert(), [
+            {"user_id": meal_id % 20 + 1, "meal_id": meal_id, "food_item_id": 1, "amount_grams": 50}
+            for meal_id in range(1, 401)
+        ])
+        await conn.execute(CaffeineEntry.__table__.insert(), [
+            {"user_id": entry_id % 20 + 1, "product_id": 1, "consumed_at": NOW - timedelta(hours=entry_id)}
+            for entry_id in range(1, 401)
+        ])
+
+
+async def _explain(conn, statement) -> list:
+    if conn.dialect.name == "sqlite":
+        compiled = statement.compile(dialect=conn.dialect)
+        parameters = tuple(compiled.params[key] for key in compiled.positiontup)
+        rows = await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled.string}", parameters)
+        return [row[-1] for row in rows]
+    compiled = statement.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True})
+    rows = await conn.exec_driver_sql(f"EXPLAIN {compiled}")
+    return [row[0] for row in rows]
+
+
+async def _plans(url: str) -> dict:
+    engine = create_async_engine(url, poolclass=NullPool)
+    await _seed(engine)
+    plans = {}
+    async with engine.connect() as conn:
+        # Planner statistics, as PRAGMA optimize / autovacuum keep them in production
+        await conn.exec_driver_sql("ANALYZE")
+        if engine.dialect.name == "postgresql":
+            # A few hundred rows fit in a page or two, where a scan is cheaper than any index
+            await conn.exec_driver_sql("SET enable_seqscan = off")
+        for name, statement, _ in hot_queries():
+            plans[name] = await _explain(conn, statement)
+    await engine.dispose()
+    return plans
+
+
+def test_hot_queries_use_indexes(database_url):
+    plans = asyncio.run(_plans(database_url))
+    for name, _, index in hot_queries():
+        plan = "\n".join(plans[name])
+        assert index in plan, f"{name} does not use {index}:\n{plan}"
+
+
+def test_time_range_queries_need_no_sort(database_url):
+    if not database_url.startswith("sqlite"):
+        pytest.skip("SQLite reports sorts as USE TEMP B-TREE")
+    plans = asyncio.run(_plans(database_url))
+    for name in ("caffeine entries", "meals", "meals by day", "search page"):
+        plan = "\n".join(plans[name])
+        assert "TEMP B-TREE" not in plan, f"{name} sorts instead of reading the index in order:\n{plan}"
+
+
+def test_day_queries_are_range_scans(database_url):
+    if not database_url.startswith("sqlite"):
+        pytest.skip("checks SQLite's plan wording")
+    plans = asyncio.run(_plans(database_url))
+    for name, column in (("meals by day", "eaten_at"), ("daily summary", "eaten_at"),
+                         ("weekly report", "eaten_at"), ("caffeine trends", "consumed_at")):
+        plan = "\n".join(plans[name])
+        assert f"{column}>? AND {column}<?" in plan, f"{name} does not scan a {column} range:\n{plan}"
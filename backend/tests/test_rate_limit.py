@@ -0,0 +1,60 @@
+"""Rate limits of async endpoints are checked off the event loop"""
+import threading
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from slowapi.errors import RateLimitExceeded
+
+from services.rate_limit import ThreadedLimiter, rate_limit_exceeded_handler
+
+
+def test_limits_are_checked_in_a_worker_thread(tmp_path):
+    checked_in = []
+
+    def key(request: Request) -> str:
+        checked_in.append(threading.current_thread())
+        return "ip:testclient"
+
+    limiter = ThreadedLimiter(key_func=key, storage_uri=f"sqlite:///{tmp_path / 'limits.db'}",
+                              strategy="sliding-window-counter")
+    app = FastAPI()
+    app.state.limiter = limiter
+    app.add_exception_handler(RateLimitExceeded, rate_limit_exceeded_handler)
+
+    @app.post("/login")
+    @limiter.limit("2/minute")
+    async def login(request: Request):
+        return {"loop_thread": threading.current_thread().name}
+
+    with TestClient(app) as client:
+        responses = [client.post("/login") for _ in range(3)]
+
+    assert [response.status_code for response in responses] == [200, 200, 429]
+    loop_thread = responses[0].json()["loop_thread"]
+    # Once per request, never on the thread running the endpoint
+    assert len(checked_in) == 3
+    assert loop_thread not in {thread.name for thread in checked_in}
+
+
+def test_limits_count_in_memory_while_the_store_fails(tmp_path):
+    limiter = ThreadedLimiter(key_func=lambda request: "ip:testclient",
+                              storage_uri=f"sqlite:///{tmp_path / 'limits.db'}",
+                              strategy="sliding-window-counter", storage_options={"wrap_exceptions": True})
+    app = FastAPI()
+    app.state.limiter = limiter
+    app.add_exception_handler(RateLimitExceeded, rate_limit_exceeded_handler)
+
+    @app.post("/login")
+    @limiter.limit("2/minute")
+    async def login(request: Request):
+        return {}
+
+    with TestClient(app) as client:
+        statuses = [client.post("/login").status_code]
+        # The shared store goes away
+        limiter.limiter.storage._connection.close()
+        statuses += [client.post("/login").status_code for _ in range(3)]
+
+    # This worker's own counters start over and still enforce the limit
+    assert statuses == [200, 200, 200, 429]
+    assert limiter.storage_down and limiter.storage_errors == 1
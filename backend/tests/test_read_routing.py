@@ -0,0 +1,100 @@
+"""With a lagging replica, a client that wrote reads from the primary for a while"""
+import asyncio
+
+import httpx
+import pytest
+from fastapi import Depends, FastAPI
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import database
+from api import deps
+from api.deps import ReadYourWritesMiddleware, get_read_session, get_write_session
+from conftest import ALICE_ID, BOB_ID
+from database import ReadRouting
+from models.user import User
+from services import rate_limit
+from services.rate_limit import SQLiteStorage
+
+
+@pytest.fixture
+def routing(api, tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "replica_lags", True)
+    routing = ReadRouting(SQLiteStorage(f"sqlite:///{tmp_path / 'marks.db'}"))
+    monkeypatch.setattr(deps, "read_routing", routing)
+    return routing
+
+
+def routed_app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(ReadYourWritesMiddleware)
+
+    @app.post("/write")
+    async def write(db: AsyncSession = Depends(get_write_session)):
+        await db.execute(update(User).where(User.id == ALICE_ID).values(failed_login_attempts=0))
+        await db.commit()
+        return {}
+
+    @app.post("/no-write")
+    async def no_write(db: AsyncSession = Depends(get_write_session)):
+        await db.execute(select(User.id).where(User.id == ALICE_ID))
+        await db.commit()
+        return {}
+
+    @app.get("/read")
+    async def read(db: AsyncSession = Depends(get_read_session)):
+        return {"primary": db.bind is database.engine}
+
+    return app
+
+
+def send(api, requests: list) -> list:
+    async def run():
+        transport = httpx.ASGITransport(app=routed_app())
+        try:
+            async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+                return [(await client.request(method, path, headers=api.headers(user))).json()
+                        for method, path, user in requests]
+        finally:
+            await database.engine.dispose()
+            await database.read_engine.dispose()
+    return asyncio.run(run())
+
+
+def test_reads_follow_the_clients_writes(api, routing):
+    responses = send(api, [
+        ("POST", "/no-write", ALICE_ID),
+        ("GET", "/read", ALICE_ID),
+        ("POST", "/write", ALICE_ID),
+        ("GET", "/read", ALICE_ID),
+        ("GET", "/read", BOB_ID),
+    ])
+
+    assert [responses[i]["primary"] for i in (1, 3, 4)] == [False, True, False]
+    assert routing.pinned_writes == 1 and routing.mark_errors == 0
+
+
+@pytest.fixture
+def token_decodes(monkeypatch):
+    decoded = []
+    verify_token = rate_limit._auth_service.verify_token
+
+    def counting(token, *args, **kwargs):
+        decoded.append(token)
+        return verify_token(token, *args, **kwargs)
+
+    monkeypatch.setattr(rate_limit._auth_service, "verify_token", counting)
+    return decoded
+
+
+def test_reads_without_a_lagging_replica_skip_the_client_key(api, token_decodes):
+    assert send(api, [("GET", "/read", ALICE_ID)]) == [{"primary": False}]
+
+    assert token_decodes == []
+
+
+def test_client_key_is_worked_out_once_per_request(api, routing, token_decodes):
+    assert send(api, [("POST", "/write", ALICE_ID), ("GET", "/read", ALICE_ID)]) == [{}, {"primary": True}]
+
+    # The write marks its client, the read looks the mark up
+    assert len(token_decodes) == 2
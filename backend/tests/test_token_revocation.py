@@ -0,0 +1,68 @@
+"""Refresh token rotation, reuse detection and the revocation sync between workers"""
+import asyncio
+from datetime import datetime, timedelta
+
+import database
+from conftest import ALICE_ID
+from models.user import RevokedToken
+from services import food_cache
+from services.food_cache import CatalogVersion
+from services.token_revocation import TokenRevocationStore
+
+
+def test_refresh_rotates_the_token(api):
+    first = api.refresh_token(ALICE_ID)
+
+    response = api.measure("POST", "/api/auth/refresh", token=first).response
+    assert response.status_code == 200, response.text
+    tokens = response.json()
+    assert tokens["refresh_token"] != first
+
+    assert api.measure("GET", "/api/auth/me", token=tokens["access_token"]).response.status_code == 200
+    assert api.measure("POST", "/api/auth/refresh", token=tokens["refresh_token"]).response.status_code == 200
+
+
+def test_reused_refresh_token_revokes_the_login(api):
+    first = api.refresh_token(ALICE_ID)
+    tokens = api.measure("POST", "/api/auth/refresh", token=first).response.json()
+
+    # The used token is presented again, e.g. by whoever copied it
+    assert api.measure("POST", "/api/auth/refresh", token=first).response.status_code == 401
+
+    # Every token of that login is revoked with it, the legitimate user's too
+    assert api.measure("POST", "/api/auth/refresh", token=tokens["refresh_token"]).response.status_code == 401
+    assert api.measure("GET", "/api/auth/me", token=tokens["access_token"]).response.status_code == 401
+
+    # Other logins are not affected
+    assert api.measure("POST", "/api/auth/refresh", token=api.refresh_token(ALICE_ID)).response.status_code == 200
+
+
+def test_sync_loads_revocations_committed_out_of_order(api, tmp_path, monkeypatch):
+    monkeypatch.setattr(food_cache, "VERSION_CHECK_INTERVAL", 0)
+    version_path = str(tmp_path / "revocations.version")
+    store = TokenRevocationStore(version=CatalogVersion(version_path))
+    other_worker = CatalogVersion(version_path)
+    now = datetime.utcnow().replace(microsecond=0)
+    expires_at = now + timedelta(days=1)
+
+    async def run():
+        try:
+            async with database.SessionLocal() as db:
+                db.add(RevokedToken(id=11, token_id="committed-first", kind="token", reason="logout",
+                                    expires_at=expires_at, revoked_at=now))
+                await db.commit()
+                await store.load(db)
+
+                # A transaction that started earlier commits now, with a lower id and revoked_at
+                db.add(RevokedToken(id=10, token_id="committed-late", kind="token", reason="logout",
+                                    expires_at=expires_at, revoked_at=now - timedelta(seconds=10)))
+                await db.commit()
+                other_worker.bump()
+
+                assert await store.is_revoked(db, {"jti": "committed-late"})
+                assert await store.is_revoked(db, {"jti": "committed-first"})
+                assert not await store.is_revoked(db, {"jti": "never-revoked"})
+        finally:
+            await database.engine.dispose()
+
+    asyncio.run(run())
@@ -0,0 +1,33 @@
+"""Reports bucket a user's rows by the days of their current timezone"""
+import sqlite3
+from collections import Counter
+from contextlib import closing
+from datetime import datetime, timedelta
+
+from conftest import ALICE_ID, DATABASE_FILE
+from services.user_time import local_date, local_today, zone
+
+
+def stored_days(table: str, column: str) -> list:
+    with closing(sqlite3.connect(DATABASE_FILE)) as conn:
+        return [(datetime.fromisoformat(at), day) for at, day in
+                conn.execute(f"SELECT {column}, local_date FROM {table} WHERE user_id = ?", (ALICE_ID,))]
+
+
+def test_timezone_change_moves_rows_to_the_new_days(api):
+    kiritimati = zone("Pacific/Kiritimati")
+    response = api.measure("PUT", "/api/profile", user=ALICE_ID, json={"timezone": "Pacific/Kiritimati"}).response
+    assert response.status_code == 200
+
+    for table, column in (("meals", "eaten_at"), ("caffeine_entries", "consumed_at")):
+        rows = stored_days(table, column)
+        assert rows and all(day == local_date(at, kiritimati).isoformat() for at, day in rows)
+
+    trends = api.measure("GET", "/api/reports/caffeine/trends", user=ALICE_ID, params={"days_back": 7}).response.json()
+    today = local_today(kiritimati)
+    first = today - timedelta(days=7)
+    expected = Counter(
+        local_date(at, kiritimati).isoformat() for at, _ in stored_days("caffeine_entries", "consumed_at")
+        if first <= local_date(at, kiritimati) <= today
+    )
+    assert {day["date"]: day["entries"] for day in trends} == dict(expected)
@@ -3,8 +3,25 @@ import axios from 'axios'
 const API_BASE = '/api/nutrition'
 
 class NutritionService {
-  async searchFoods(query, limit = 20) {
+  async searchFoods(query, limit = 20, mode = 'substring') {
     const response = await axios.get(`${API_BASE}/foods/search`, {
+      params: { q: query, limit, mode }
+    })
+    return response.data
+  }
+
+  async searchFoodsPage(query, { cursor = null, brand = null, category = null, facets = false, limit = 20 } = {}) {
+    const params = { q: query, limit, facets }
+    if (cursor) params.cursor = cursor
+    if (brand) params.brand = brand
+    if (category) params.category = category
+
+    const response = await axios.get(`${API_BASE}/foods/search/page`, { params })
+    return response.data
+  }
+
+  async suggestFoods(query, limit = 10) {
+    const response = await axios.get(`${API_BASE}/foods/suggest`, {
       params: { q: query, limit }
     })
     return response.data
@@ -27,6 +44,19 @@ class NutritionService {
     return response.data
   }
 
+  async scanAndLookupBarcodes(imageFiles = [], codes = []) {
+    const formData = new FormData()
+    imageFiles.forEach(file => formData.append('files', file))
+    codes.forEach(code => formData.append('codes', code))
+
+    const response = await axios.post(`${API_BASE}/foods/scan-barcodes`, formData, {
+      headers: {
+        'Content-Type': 'multipart/form-data'
+      }
+    })
+    return response.data
+  }
+
   async createFood(foodData) {
     const response = await axios.post(`${API_BASE}/foods`, foodData)
     return response.data